@@ -0,0 +1,361 @@
+"""End-to-end load test: synthetic webhook updates and API reads against the app in-process.
+
+The app runs with its real startup and shutdown hooks. The bot talks to
+benchmarks.fake_bot_api and the LLM client to benchmarks.mock_llm_server,
+both on localhost. Mongo is a throwaway database on MONGO_URL, or with
+--mongo memory a temporary mongod from pymongo-inmemory. Updates and API
+reads are fired open-loop at fixed rates, so a slow app builds up a
+backlog instead of slowing the load down.
+
+Reports throughput, latency percentiles, event-loop lag and memory per
+simulated user. --save writes the report as JSON, and --compare exits
+non-zero when a p95 latency regresses beyond --tolerance against a saved
+report.
+
+Run from the backend directory:
+    python -m benchmarks.bench_load --users 200 --rate 50 --duration 30
+    python -m benchmarks.bench_load --save baseline.json
+    python -m benchmarks.bench_load --compare baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fake_bot_api import start_fake_bot_api
+from benchmarks.mock_llm_server import start_mock_llm_server
+
+FIRST_USER_ID = 10_000_000
+# Share of each update kind in the synthetic traffic
+UPDATE_MIX = {"question": 0.6, "get_reading": 0.25, "start": 0.1, "birth_data": 0.05}
+QUESTIONS = [
+    "Что меня ждет в любви?",
+    "Стоит ли менять работу в этом году?",
+    "Какой сегодня день для новых начинаний?",
+    "Как наладить отношения с семьей?",
+    "Что говорят звезды о моих финансах?",
+]
+# Latencies closer than this to the baseline are noise, whatever the tolerance
+REGRESSION_FLOOR_MS = 5.0
+
+
+class UpdateFactory:
+    """Telegram Update payloads from a fixed pool of simulated users"""
+
+    def __init__(self, users: int):
+        self.user_ids = [FIRST_USER_ID + i for i in range(users)]
+        self.update_id = 0
+        self.message_id = 0
+
+    def _user(self, telegram_id: int) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": f"Bench{telegram_id}", "language_code": "ru"}
+
+    def _message(self, telegram_id: int, text: str, entities=None) -> dict:
+        self.message_id += 1
+        message = {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self._user(telegram_id),
+            "text": text,
+        }
+        if entities:
+            message["entities"] = entities
+        return message
+
+    def make(self, kind: str, telegram_id: int) -> dict:
+        self.update_id += 1
+        update = {"update_id": self.update_id}
+        if kind == "start":
+            update["message"] = self._message(telegram_id, "/start", [{"type": "bot_command", "offset": 0, "length": 6}])
+        elif kind == "get_reading":
+            update["callback_query"] = {
+                "id": str(self.update_id),
+                "from": self._user(telegram_id),
+                "chat_instance": str(telegram_id),
+                "data": "get_reading",
+                "message": self._message(telegram_id, "🌙"),
+            }
+        elif kind == "birth_data":
+            update["message"] = self._message(telegram_id, "1995-08-15 14:30 Москва")
+        else:
+            update["message"] = self._message(telegram_id, random.choice(QUESTIONS))
+        return update
+
+    def random(self) -> tuple:
+        kind = random.choices(list(UPDATE_MIX), weights=list(UPDATE_MIX.values()))[0]
+        return kind, self.make(kind, random.choice(self.user_ids))
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def sample_process(lag: list, rss: list, interval: float = 0.05):
+    """Event-loop lag is how late a sleep of `interval` wakes up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag.append(max(0.0, loop.time() - started - interval))
+        rss.append(rss_bytes())
+
+
+async def open_loop(rate: float, duration: float, fire, tasks: set):
+    """Start fire() `rate` times a second without waiting for earlier calls"""
+    if rate <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    interval = 1 / rate
+    next_at = loop.time()
+    end = next_at + duration
+    while next_at < end:
+        task = asyncio.create_task(fire())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+
+async def seed_users(server, user_ids):
+    """Premium users with birth data, so quota never cuts the load short"""
+    subscription_end = datetime.now(timezone.utc) + timedelta(days=30)
+    docs = [
+        server.User(telegram_id=telegram_id, first_name=f"Bench{telegram_id}", birth_date="1995-08-15",
+                    birth_time="14:30", birth_place="Москва", subscription_active=True,
+                    subscription_end=subscription_end).dict()
+        for telegram_id in user_ids
+    ]
+    await server.db.users.insert_many(docs)
+
+
+async def run(args, mongo_url: str) -> dict:
+    bot_api, bot_api_url, bot_api_runner = await start_fake_bot_api(
+        chat_limit=args.bot_chat_limit, global_limit=args.bot_global_limit, latency=args.bot_latency
+    )
+    llm_server, llm_url, llm_runner = await start_mock_llm_server(
+        latency=args.llm_latency, tokens_per_second=args.llm_tps, error_rate=args.llm_error_rate
+    )
+    db_name = f"astral_bench_{uuid.uuid4().hex[:8]}"
+    os.environ.update({
+        "MONGO_URL": mongo_url,
+        "DB_NAME": db_name,
+        "BOT_TOKEN": "42:bench",
+        "TELEGRAM_API_URL": bot_api_url,
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": llm_url,
+        "BROADCAST_ENABLED": "false",
+    })
+    for override in args.env:
+        key, _, value = override.partition("=")
+        os.environ[key] = value
+    server = importlib.import_module("server")
+
+    factory = UpdateFactory(args.users)
+    latencies = {}
+    statuses = Counter()
+    sent_at = {}
+    lag, rss = [], []
+    tasks = set()
+
+    def observe(name: str, seconds: float):
+        latencies.setdefault(name, []).append(seconds)
+
+    # End-to-end: from posting the webhook until a worker finished the update
+    handler = server.update_workers.handler
+
+    async def timed_handler(update):
+        try:
+            await handler(update)
+        finally:
+            kind, started = sent_at.pop(update.update_id, (None, None))
+            if started is not None:
+                observe(f"update.{kind}", time.perf_counter() - started)
+
+    server.update_workers.handler = timed_handler
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+        async def post_update():
+            kind, update = factory.random()
+            started = time.perf_counter()
+            sent_at[update["update_id"]] = (kind, started)
+            response = await client.post("/api/webhook/telegram", json=update)
+            observe("webhook", time.perf_counter() - started)
+            statuses[f"webhook {response.status_code}"] += 1
+            if response.status_code != 200:
+                sent_at.pop(update["update_id"], None)
+
+        async def read_api():
+            telegram_id = random.choice(factory.user_ids)
+            for name, path, params in (("api.readings", f"/api/readings/{telegram_id}", {"limit": 20}),
+                                       ("api.user", f"/api/user/{telegram_id}", None)):
+                started = time.perf_counter()
+                response = await client.get(path, params=params)
+                observe(name, time.perf_counter() - started)
+                statuses[f"{name} {response.status_code}"] += 1
+
+        await server.app.router.startup()
+        try:
+            await seed_users(server, factory.user_ids)
+            sampler = asyncio.create_task(sample_process(lag, rss))
+            await asyncio.sleep(0.2)
+            baseline_rss = rss_bytes()
+            started = time.perf_counter()
+            await asyncio.gather(open_loop(args.rate, args.duration, post_update, tasks),
+                                 open_loop(args.api_rate, args.duration, read_api, tasks))
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await asyncio.wait_for(server.update_workers.queue.join(), args.drain)
+            except asyncio.TimeoutError:
+                statuses["undrained"] = server.update_workers.queue.qsize()
+            elapsed = time.perf_counter() - started
+            sampler.cancel()
+            app_stats = {
+                "queue": server.update_workers.stats(),
+                "send": server.send_scheduler.stats(),
+                "llm": server.llm.stats(),
+                "cache": server.reading_cache.stats(),
+                "rate_limit": server.rate_limiter.stats(),
+            }
+            await server.client.drop_database(db_name)
+        finally:
+            await server.app.router.shutdown()
+            await bot_api_runner.cleanup()
+            await llm_runner.cleanup()
+
+    processed = app_stats["queue"]["processed"]
+    api_reads = sum(count for key, count in statuses.items() if key.startswith("api."))
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+        "elapsed_s": round(elapsed, 2),
+        "throughput": {
+            "updates_sent": factory.update_id,
+            "updates_processed": processed,
+            "updates_per_s": round(processed / elapsed, 2),
+            "api_requests_per_s": round(api_reads / elapsed, 2),
+        },
+        "latency": {name: percentiles(samples) for name, samples in sorted(latencies.items())},
+        "loop_lag": percentiles(lag),
+        "memory": {
+            "baseline_mb": round(baseline_rss / 2 ** 20, 1),
+            "peak_mb": round(max(rss, default=baseline_rss) / 2 ** 20, 1),
+            "per_user_kb": round(max(0, max(rss, default=baseline_rss) - baseline_rss) / args.users / 1024, 2),
+        },
+        "statuses": dict(statuses),
+        "fakes": {
+            "bot_api": {"calls": dict(bot_api.calls), "flood_errors": bot_api.flood_errors},
+            "llm": {"calls": dict(llm_server.calls), "max_in_flight": llm_server.max_in_flight},
+        },
+        "app": app_stats,
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    current = {**report["latency"], "loop_lag": report["loop_lag"]}
+    previous = {**baseline.get("latency", {}), "loop_lag": baseline.get("loop_lag", {})}
+    for name, stats in current.items():
+        before, after = previous.get(name, {}).get("p95_ms"), stats.get("p95_ms")
+        if before is None or after is None:
+            continue
+        if after > before * (1 + tolerance) and after - before > REGRESSION_FLOOR_MS:
+            found.append(f"{name}: p95 {before:.1f} ms -> {after:.1f} ms")
+    return found
+
+
+def print_report(report: dict):
+    throughput = report["throughput"]
+    print(f"{report['elapsed_s']:.1f}s  updates sent {throughput['updates_sent']}  "
+          f"processed {throughput['updates_processed']} ({throughput['updates_per_s']}/s)  "
+          f"api {throughput['api_requests_per_s']}/s")
+    rows = {**report["latency"], "loop_lag": report["loop_lag"]}
+    for name, stats in rows.items():
+        if stats["count"]:
+            print(f"  {name:22s} n {stats['count']:6d}  p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  "
+                  f"p99 {stats['p99_ms']:8.1f}  max {stats['max_ms']:8.1f} ms")
+    memory = report["memory"]
+    print(f"  memory baseline {memory['baseline_mb']} MB  peak {memory['peak_mb']} MB  "
+          f"per user {memory['per_user_kb']} KB")
+    print(f"  statuses {report['statuses']}")
+    print(f"  bot api {report['fakes']['bot_api']}  llm {report['fakes']['llm']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="webhook updates per second")
+    parser.add_argument("--api-rate", type=float, default=20.0, help="API read rounds per second")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--drain", type=float, default=120.0, help="seconds to wait for queued updates")
+    parser.add_argument("--mongo", default=os.environ.get("MONGO_URL", "memory"),
+                        help="Mongo URL for a throwaway database, or 'memory' for a temporary mongod")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tps", type=float, default=200.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--bot-latency", type=float, default=0.02)
+    # Real limits are 1 msg/s per chat and ~30/s overall; the defaults let the app's own pacing show
+    parser.add_argument("--bot-chat-limit", type=int, default=1000)
+    parser.add_argument("--bot-global-limit", type=int, default=100000)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="app configuration override, e.g. UPDATE_QUEUE_WORKERS=64")
+    parser.add_argument("--save", type=Path, help="write the report as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with contextlib.ExitStack() as stack:
+        mongo_url = args.mongo
+        if mongo_url == "memory":
+            try:
+                from pymongo_inmemory import Mongod
+            except ImportError:
+                parser.error("--mongo memory needs pymongo-inmemory (pip install pymongo-inmemory)")
+            mongo_url = stack.enter_context(Mongod()).connection_string
+        report = asyncio.run(run(args, mongo_url))
+
+    print_report(report)
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+    if args.compare:
+        found = regressions(report, json.loads(args.compare.read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Outbound send burst against the fake Bot API, with and without the scheduler.
+
+Run from the backend directory:
+    python -m benchmarks.bench_send_scheduler
+"""
+import asyncio
+import statistics
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from benchmarks.fake_bot_api import start_fake_bot_api
+from send_scheduler import LANE_PAYMENT, LANE_READING, SendScheduler, SendSchedulerMiddleware, send_lane
+
+TOKEN = "42:fake"
+CHATS = 40
+READINGS_PER_CHAT = 4
+
+
+async def burst(bot: Bot) -> dict:
+    latencies = {"payment": [], "reading": []}
+    failed = 0
+
+    async def send(chat_id: int, lane: int, name: str):
+        nonlocal failed
+        started = time.perf_counter()
+        with send_lane(lane):
+            try:
+                await bot.send_message(chat_id, f"{name} for {chat_id}")
+            except TelegramRetryAfter:
+                failed += 1
+                return
+        latencies[name].append(time.perf_counter() - started)
+
+    sends = [send(chat_id, LANE_READING, "reading") for _ in range(READINGS_PER_CHAT) for chat_id in range(1, CHATS + 1)]
+    # Payment confirmations arrive while the reading burst is queued
+    sends += [send(chat_id, LANE_PAYMENT, "payment") for chat_id in range(CHATS + 1, CHATS + 11)]
+    started = time.perf_counter()
+    await asyncio.gather(*sends)
+    return {"elapsed": time.perf_counter() - started, "failed": failed, "latencies": latencies}
+
+
+async def run(scheduled: bool):
+    api, base_url, runner = await start_fake_bot_api()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+    scheduler = SendScheduler()
+    if scheduled:
+        bot.session.middleware(SendSchedulerMiddleware(scheduler))
+    try:
+        result = await burst(bot)
+    finally:
+        await scheduler.close()
+        await bot.session.close()
+        await runner.cleanup()
+
+    label = "scheduler" if scheduled else "direct"
+    print(f"{label:10s} elapsed {result['elapsed']:6.2f}s  429s {api.flood_errors:4d}  failed sends {result['failed']:4d}")
+    for name, values in result["latencies"].items():
+        if values:
+            print(f"{'':10s} {name:8s} median {statistics.median(values) * 1000:8.1f} ms  max {max(values) * 1000:8.1f} ms")
+
+
+async def main():
+    print(f"{CHATS} chats x {READINGS_PER_CHAT} readings + 10 payment confirmations")
+    await run(scheduled=False)
+    await run(scheduled=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Allocations per update: inline keyboard/prompt construction vs the asset registry.
+
+Run from the backend directory:
+    python -m benchmarks.bench_templates
+"""
+import time
+import tracemalloc
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
+
+from bot_assets import BIRTH_INFO, WELCOME_TEXT, build_keyboards, reading_messages
+
+WEBAPP_URL = "https://example.com"
+ITERATIONS = 2000
+USER = {"first_name": "Анна", "birth_date": "1995-08-15", "birth_time": "14:30", "birth_place": "Москва, Россия"}
+QUESTION = "Что меня ждет в любви?"
+
+keyboards = build_keyboards(WEBAPP_URL)
+
+
+def legacy_update():
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🌟 Открыть приложение LunaAura", web_app=WebAppInfo(url=WEBAPP_URL))],
+        [
+            InlineKeyboardButton(text="🔮 Получить чтение", callback_data="get_reading"),
+            InlineKeyboardButton(text="💫 Подписка", callback_data="subscription")
+        ],
+        [InlineKeyboardButton(text="🌙 Указать данные рождения", callback_data="set_birth_data")]
+    ])
+    welcome = f"""🌙 Добро пожаловать в LunaAura, {USER['first_name']}!
+
+Я твой персональный ИИ-астролог, готовый дать тебе космические советы и озарения.
+
+✨ Что я могу для тебя сделать:
+• Персонализированные астрологические чтения
+• Ежедневные космические советы
+• Ответы на вопросы о любви, карьере и жизни
+• Связь с мудростью звезд
+
+✨ Осталось бесплатных чтений: 3
+
+🌟 С чего начнем твое космическое путешествие?"""
+    birth_info = f"""
+Дата рождения: {USER['birth_date']}
+Время рождения: {USER['birth_time']}
+Место рождения: {USER['birth_place']}
+"""
+    prompt = f"""Ты LunaAura - мудрый и сочувствующий астролог, который предоставляет персонализированные чтения для женщин.
+Ты сочетаешь древнюю астрологическую мудрость с современными психологическими инсайтами.
+
+Информация о пользователе:
+Имя: {USER['first_name']}
+{birth_info}
+
+Вопрос пользователя: {QUESTION}
+
+Предоставь теплое, проницательное астрологическое чтение, которое:
+1. Отвечает на конкретный вопрос с эмпатией и мудростью
+2. Включает соответствующие астрологические концепции, если данные о рождении доступны
+3. Предлагает практические советы и поддержку
+4. Использует поддерживающий, женственно-вдохновляющий тон
+5. Содержит 150-300 слов
+6. Использует подходящие эмодзи для магической атмосферы
+
+Если данные о рождении не предоставлены, сосредоточься на общих советах и поощри их поделиться информацией о рождении для более персонализированных чтений.
+Отвечай только на русском языке.
+"""
+    return keyboard, welcome, [{"role": "user", "content": prompt}]
+
+
+def registry_update():
+    welcome = WELCOME_TEXT.render(name=USER['first_name'], subscription_status="✨ Осталось бесплатных чтений: 3")
+    birth_info = BIRTH_INFO.render(birth_date=USER['birth_date'], birth_time=USER['birth_time'],
+                                   birth_place=USER['birth_place'])
+    return keyboards.start, welcome, reading_messages(USER['first_name'], birth_info, QUESTION)
+
+
+def time_per_update(fn) -> float:
+    """Mean microseconds per call"""
+    fn()
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    return (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+def peak_bytes(fn) -> int:
+    """Peak memory allocated during one call"""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    for name, fn in (("legacy", legacy_update), ("registry", registry_update)):
+        print(f"{name:>8}: {time_per_update(fn):8.2f} us/update, {peak_bytes(fn):7d} bytes peak allocation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Local stand-in for the Telegram Bot API that enforces flood limits.
+
+Answers every method with a plausible result and replies 429 with
+retry_after once a chat, or the bot as a whole, sends too fast.
+
+Run from the backend directory and point the bot at it:
+    python -m benchmarks.fake_bot_api --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 uvicorn server:app
+"""
+import argparse
+import asyncio
+import math
+import time
+from collections import Counter, defaultdict, deque
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LunaAura", "username": "lunaaura_fake_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, chat_limit: int = 3, chat_period: float = 3.0, global_limit: int = 30,
+                 global_period: float = 1.0, latency: float = 0.0):
+        self.chat_limit = chat_limit
+        self.chat_period = chat_period
+        self.global_limit = global_limit
+        self.global_period = global_period
+        self.latency = latency
+        self.chat_sends = defaultdict(deque)
+        self.global_sends = deque()
+        self.calls = Counter()
+        self.flood_errors = 0
+        self.log = []
+        self.message_id = 0
+
+    def _over(self, sends: deque, limit: int, period: float, now: float) -> float:
+        while sends and sends[0] <= now - period:
+            sends.popleft()
+        if len(sends) >= limit:
+            return sends[0] + period - now
+        sends.append(now)
+        return 0.0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = params.get("chat_id")
+        now = time.monotonic()
+        if chat_id is not None:
+            wait = self._over(self.chat_sends[str(chat_id)], self.chat_limit, self.chat_period, now)
+            if not wait:
+                wait = self._over(self.global_sends, self.global_limit, self.global_period, now)
+            if wait:
+                self.flood_errors += 1
+                retry_after = max(1, math.ceil(wait))
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+            self.log.append((now, method, str(chat_id), params.get("text")))
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText", "sendInvoice"):
+            self.message_id += 1
+            chat_id = int(params["chat_id"])
+            message = {
+                "message_id": int(params.get("message_id", self.message_id)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "from": BOT_USER,
+            }
+            if "text" in params:
+                message["text"] = params["text"]
+            return message
+        return True
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls), "flood_errors": self.flood_errors})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+async def start_fake_bot_api(host: str = "127.0.0.1", port: int = 0, **limits):
+    """Start the fake API in the running loop; returns (api, base_url, runner)"""
+    api = FakeBotAPI(**limits)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return api, f"http://{host}:{port}", runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-limit", type=int, default=3)
+    parser.add_argument("--chat-period", type=float, default=3.0)
+    parser.add_argument("--global-limit", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    api = FakeBotAPI(args.chat_limit, args.chat_period, args.global_limit, latency=args.latency)
+    web.run_app(api.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
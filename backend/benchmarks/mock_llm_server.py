@@ -0,0 +1,228 @@
+"""Local stand-in for the OpenAI API: chat completions, files and batches.
+
+Completions are deterministic canned text after a configurable latency;
+streaming, n > 1 and the Batch API (processed right after creation) work
+like the real endpoints as far as the openai SDK is concerned. Errors,
+hangs and broken models can be injected to exercise the resilience layer.
+
+Run from the backend directory and point the SDK at it:
+    python -m benchmarks.mock_llm_server --port 8082
+    OPENAI_BASE_URL=http://127.0.0.1:8082/v1 OPENAI_API_KEY=mock uvicorn server:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+READING_TEXT = ("🌙 Звезды сегодня благосклонны к вам. Луна в гармоничном аспекте с Венерой "
+                "открывает путь к искренним разговорам и новым начинаниям. ✨ ")
+
+
+class MockLLMServer:
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 200.0, words: int = 60,
+                 error_rate: float = 0.0, error_status: int = 500, hang_rate: float = 0.0,
+                 hang_seconds: float = 300.0, failing_models=()):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.words = words
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.failing_models = set(failing_models)
+        self.calls = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.files = {}
+        self.batches = {}
+
+    def _text(self, body: dict, index: int) -> str:
+        question = body["messages"][-1]["content"].splitlines()[-1][:60]
+        words = (READING_TEXT * (self.words // 20 + 1)).split()[:self.words]
+        return f"[{index}] {question}\n" + " ".join(words)
+
+    def _usage(self, body: dict, texts) -> dict:
+        prompt = sum(len(message["content"]) // 4 for message in body["messages"])
+        completion = sum(len(text) // 4 for text in texts)
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    def _completion(self, body: dict) -> dict:
+        texts = [self._text(body, index) for index in range(body.get("n", 1))]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {"index": index, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                for index, text in enumerate(texts)
+            ],
+            "usage": self._usage(body, texts),
+        }
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.calls["chat.completions"] += 1
+        self.calls[body["model"]] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if random.random() < self.hang_rate:
+                await asyncio.sleep(self.hang_seconds)
+            await asyncio.sleep(self.latency)
+            if body["model"] in self.failing_models or random.random() < self.error_rate:
+                self.calls["errors"] += 1
+                return web.json_response(
+                    {"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+                    status=self.error_status,
+                )
+            if body.get("stream"):
+                return await self._stream(request, body)
+            return web.json_response(self._completion(body))
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, request: web.Request, body: dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = self._text(body, 0).split(" ")
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for position, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": word if not position else f" {word}"},
+                             "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            if delay:
+                await asyncio.sleep(delay)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body["model"], "choices": [], "usage": self._usage(body, [" ".join(words)])}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def upload_file(self, request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        content, purpose, filename = b"", "batch", "input.jsonl"
+        async for part in reader:
+            if part.name == "file":
+                filename = part.filename or filename
+                content = await part.read()
+            elif part.name == "purpose":
+                purpose = (await part.read()).decode()
+        return web.json_response(self._file(content, purpose, filename))
+
+    def _file(self, content: bytes, purpose: str, filename: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose}
+
+    async def file_content(self, request: web.Request) -> web.Response:
+        content = self.files.get(request.match_info["file_id"])
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content, content_type="application/jsonl")
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.calls["batches"] += 1
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        asyncio.get_running_loop().create_task(self._run_batch(batch_id))
+        return web.json_response(self.batches[batch_id])
+
+    async def _run_batch(self, batch_id: str):
+        batch = self.batches[batch_id]
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]].decode().splitlines() if line.strip()]
+        await asyncio.sleep(self.latency)
+        output = []
+        for line in lines:
+            output.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": self._completion(line["body"])},
+                "error": None,
+            }, ensure_ascii=False))
+        output_file = self._file("\n".join(output).encode() + b"\n", "batch_output", f"{batch_id}_output.jsonl")
+        batch.update({
+            "status": "completed",
+            "completed_at": int(time.time()),
+            "output_file_id": output_file["id"],
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+        })
+
+    async def retrieve_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            raise web.HTTPNotFound()
+        return web.json_response(batch)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls), "in_flight": self.in_flight,
+                                  "max_in_flight": self.max_in_flight})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/files", self.upload_file)
+        app.router.add_get("/v1/files/{file_id}/content", self.file_content)
+        app.router.add_post("/v1/batches", self.create_batch)
+        app.router.add_get("/v1/batches/{batch_id}", self.retrieve_batch)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+async def start_mock_llm_server(host: str = "127.0.0.1", port: int = 0, **options):
+    """Start the mock in the running loop; returns (server, base_url, runner)"""
+    server = MockLLMServer(**options)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}/v1", runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--failing-model", action="append", default=[])
+    args = parser.parse_args()
+    server = MockLLMServer(args.latency, args.tokens_per_second, error_rate=args.error_rate,
+                           error_status=args.error_status, hang_rate=args.hang_rate,
+                           failing_models=args.failing_model)
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
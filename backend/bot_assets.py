@@ -0,0 +1,262 @@
+import os
+import re
+from types import SimpleNamespace
+from typing import List
+
+from pydantic import ConfigDict
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
+
+PROMPT_VERSION = os.environ.get('PROMPT_VERSION', 'v1')
+
+
+class CompiledTemplate:
+    """Text with {field} placeholders, split into literal and field parts once"""
+
+    _FIELD = re.compile(r"\{(\w+)\}")
+
+    def __init__(self, source: str):
+        self.parts = self._FIELD.split(source)
+        self.fields = frozenset(self.parts[1::2])
+
+    def render(self, **values) -> str:
+        parts = self.parts.copy()
+        parts[1::2] = [str(values[name]) for name in self.parts[1::2]]
+        return "".join(parts)
+
+
+class FrozenKeyboard(InlineKeyboardMarkup):
+    """Inline keyboard that cannot be reassigned after it is built"""
+
+    model_config = ConfigDict(frozen=True)
+
+
+# System prompts are versioned and contain no per-user data, so every
+# request shares the same prefix and the provider can cache it
+SYSTEM_PROMPTS = {
+    "v1": """Ты LunaAura - мудрый и сочувствующий астролог, который предоставляет персонализированные чтения для женщин.
+Ты сочетаешь древнюю астрологическую мудрость с современными психологическими инсайтами.
+
+Предоставь теплое, проницательное астрологическое чтение, которое:
+1. Отвечает на конкретный вопрос с эмпатией и мудростью
+2. Включает соответствующие астрологические концепции, если данные о рождении доступны
+3. Предлагает практические советы и поддержку
+4. Использует поддерживающий, женственно-вдохновляющий тон
+5. Содержит 150-300 слов
+6. Использует подходящие эмодзи для магической атмосферы
+
+Если данные о рождении не предоставлены, сосредоточься на общих советах и поощри их поделиться информацией о рождении для более персонализированных чтений.
+Отвечай только на русском языке.""",
+}
+
+READING_USER_PROMPT = CompiledTemplate("""Информация о пользователе:
+Имя: {name}
+{birth_info}
+
+Вопрос пользователя: {question}""")
+
+BIRTH_INFO = CompiledTemplate("""Дата рождения: {birth_date}
+Время рождения: {birth_time}
+Место рождения: {birth_place}""")
+
+CHART_INFO = CompiledTemplate("""
+Натальная карта (уже рассчитана, используй эти положения и не пересчитывай):
+{chart}""")
+
+NO_BIRTH_INFO = "Данные о рождении пока не предоставлены."
+
+
+DAILY_HOROSCOPE_SYSTEM_PROMPT = """Ты LunaAura - мудрый и сочувствующий астролог.
+Напиши ежедневный космический совет для знака зодиака на указанную дату:
+1. Общая энергия дня
+2. Любовь и отношения
+3. Работа и финансы
+4. Короткий практический совет
+Не обращайся к читателю по имени. Используй поддерживающий тон и подходящие эмодзи, 80-120 слов.
+Отвечай только на русском языке."""
+
+DAILY_HOROSCOPE_PROMPT = CompiledTemplate("Знак зодиака: {sign}\nДата: {date}")
+
+SIGN_NAMES = {
+    "aries": "Овен",
+    "taurus": "Телец",
+    "gemini": "Близнецы",
+    "cancer": "Рак",
+    "leo": "Лев",
+    "virgo": "Дева",
+    "libra": "Весы",
+    "scorpio": "Скорпион",
+    "sagittarius": "Стрелец",
+    "capricorn": "Козерог",
+    "aquarius": "Водолей",
+    "pisces": "Рыбы",
+}
+
+
+def reading_messages(name: str, birth_info: str, question: str, version: str = PROMPT_VERSION) -> List[dict]:
+    """Chat messages for a reading: static system prompt, then per-user variables"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPTS[version]},
+        {"role": "user", "content": READING_USER_PROMPT.render(name=name, birth_info=birth_info, question=question)},
+    ]
+
+
+def daily_horoscope_messages(sign: str, date: str) -> List[dict]:
+    """Chat messages for one sign's daily horoscope; sign is a SIGN_NAMES key or 'general'"""
+    sign_name = SIGN_NAMES.get(sign, "все знаки")
+    return [
+        {"role": "system", "content": DAILY_HOROSCOPE_SYSTEM_PROMPT},
+        {"role": "user", "content": DAILY_HOROSCOPE_PROMPT.render(sign=sign_name, date=date)},
+    ]
+
+
+# Bot texts
+WELCOME_TEXT = CompiledTemplate("""🌙 Добро пожаловать в LunaAura, {name}!
+
+Я твой персональный ИИ-астролог, готовый дать тебе космические советы и озарения.
+
+✨ Что я могу для тебя сделать:
+• Персонализированные астрологические чтения
+• Ежедневные космические советы
+• Ответы на вопросы о любви, карьере и жизни
+• Связь с мудростью звезд
+
+{subscription_status}
+
+🌟 С чего начнем твое космическое путешествие?""")
+
+SUBSCRIPTION_ACTIVE_STATUS = "💎 Премиум подписка активна"
+FREE_READINGS_STATUS = CompiledTemplate("✨ Осталось бесплатных чтений: {count}")
+
+SUBSCRIPTION_ALREADY_ACTIVE_TEXT = CompiledTemplate(
+    "💎 У вас уже есть активная премиум подписка!\n\n"
+    "⏰ Действует до: {until}\n\n"
+    "✨ Наслаждайтесь безлимитными астрологическими чтениями!"
+)
+
+SUBSCRIPTION_OFFER_TEXT = CompiledTemplate("""💫 **Премиум подписка LunaAura**
+
+🌟 **Что включает:**
+• Безлимитные астрологические чтения
+• Персонализированные ответы на любые вопросы
+• Доступ к расширенным функциям приложения
+• Приоритетная поддержка
+
+💎 **Цена:** 100 Telegram Stars (≈ $2)
+⏰ **Период:** 30 дней
+
+✨ Без подписки доступно {count} бесплатных чтения.""")
+
+INVOICE_ERROR_TEXT = "😔 Произошла ошибка при создании счета. Попробуйте позже или обратитесь в поддержку."
+
+PAYMENT_SUCCESS_TEXT = (
+    "🎉 **Поздравляем!** Премиум подписка активирована!\n\n"
+    "💎 Теперь у вас есть доступ к:\n"
+    "• Безлимитным астрологическим чтениям\n"
+    "• Персонализированным советам\n"
+    "• Всем функциям приложения\n\n"
+    "✨ Подписка активна на 30 дней. Наслаждайтесь магией звезд!"
+)
+
+SUBSCRIPTION_REMINDER_TEXT = CompiledTemplate(
+    "⏰ Ваша премиум подписка LunaAura заканчивается {until}.\n\n"
+    "💫 Продлите ее, чтобы и дальше получать безлимитные чтения. Оставшиеся дни сохранятся!"
+)
+
+PAYMENT_ERROR_TEXT = "Спасибо за оплату! Если у вас возникли проблемы с активацией подписки, обратитесь в поддержку."
+
+USER_NOT_FOUND_TEXT = "Ошибка: пользователь не найден. Попробуйте /start"
+START_FIRST_TEXT = "Пожалуйста, начните с команды /start"
+
+NO_READINGS_TEXT = (
+    "😔 У вас закончились бесплатные чтения.\n\n"
+    "💫 Оформите премиум подписку для безлимитного доступа к мудрости звезд!"
+)
+NO_READINGS_SHORT_TEXT = (
+    "😔 У вас закончились бесплатные чтения.\n\n"
+    "💫 Оформите премиум подписку для безлимитного доступа!"
+)
+
+BIRTH_DATA_INSTRUCTIONS = """🌙 **Укажите ваши данные рождения**
+
+Для самых точных и персонализированных чтений мне нужна ваша информация о рождении.
+
+Пожалуйста, отправьте данные в таком формате:
+`ГГГГ-ММ-ДД ЧЧ:ММ Город, Страна`
+
+Пример:
+`1995-08-15 14:30 Москва, Россия`
+
+Это поможет мне рассчитать вашу натальную карту и дать глубоко персонализированные космические озарения! ✨"""
+
+BIRTH_DATA_SAVED_TEXT = CompiledTemplate(
+    "🌙 Прекрасно! Я сохранила ваши данные рождения:\n"
+    "📅 Дата: {birth_date}\n"
+    "⏰ Время: {birth_time}\n"
+    "📍 Место: {birth_place}\n\n"
+    "Теперь я могу дать вам глубоко персонализированные чтения! ✨"
+)
+
+BIRTH_PLACE_UNKNOWN_TEXT = CompiledTemplate(
+    "🗺 Я не нашла «{birth_place}» на карте, поэтому пока не могу рассчитать асцендент и дома.\n\n"
+    "Отправьте данные еще раз, указав ближайший крупный город и страну, например:\n"
+    "1995-08-15 14:30 Анталья, Турция"
+)
+
+READING_IN_PROGRESS_TEXT = "⏳ Я еще готовлю ваше предыдущее чтение. Пожалуйста, дождитесь ответа."
+
+READING_TITLE = "🌟 **Ваше чтение от LunaAura** ✨"
+PERSONAL_READING_TITLE = "✨ **Ваше персональное чтение** 🌟"
+
+
+DAILY_HOROSCOPE_TEXT = CompiledTemplate("🌙 {name}, ваш космический совет на {date} ({sign})\n\n{horoscope}")
+DAILY_GENERAL_TEXT = CompiledTemplate(
+    "🌙 {name}, ваш космический совет на {date}\n\n{horoscope}\n\n"
+    "✨ Укажите данные рождения, чтобы получать советы для вашего знака."
+)
+
+
+def build_keyboards(webapp_url: str) -> SimpleNamespace:
+    """Build every bot keyboard once; handlers share the same objects"""
+
+    def keyboard(*rows) -> FrozenKeyboard:
+        return FrozenKeyboard(inline_keyboard=[list(row) for row in rows])
+
+    open_app = InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=webapp_url))
+    get_reading = InlineKeyboardButton(text="🔮 Получить чтение", callback_data="get_reading")
+    buy = InlineKeyboardButton(text="⭐ Купить подписку", callback_data="buy_subscription")
+
+    return SimpleNamespace(
+        start=keyboard(
+            [InlineKeyboardButton(text="🌟 Открыть приложение LunaAura", web_app=WebAppInfo(url=webapp_url))],
+            [get_reading, InlineKeyboardButton(text="💫 Подписка", callback_data="subscription")],
+            [InlineKeyboardButton(text="🌙 Указать данные рождения", callback_data="set_birth_data")],
+        ),
+        subscription_active=keyboard([open_app], [get_reading]),
+        subscription_offer=keyboard(
+            [InlineKeyboardButton(text="⭐ Купить подписку (100 Stars)", callback_data="buy_subscription")],
+            [InlineKeyboardButton(text="🔮 Получить бесплатное чтение", callback_data="get_reading")],
+            [open_app],
+        ),
+        payment_success=keyboard(
+            [InlineKeyboardButton(text="🔮 Получить первое премиум чтение", callback_data="get_reading")],
+            [open_app],
+        ),
+        no_readings=keyboard([buy], [open_app]),
+        no_readings_short=keyboard([buy]),
+        subscription_renewal=keyboard(
+            [InlineKeyboardButton(text="⭐ Продлить подписку (100 Stars)", callback_data="buy_subscription")],
+        ),
+        after_reading=keyboard(
+            [open_app],
+            [InlineKeyboardButton(text="🔮 Еще одно чтение", callback_data="get_reading")],
+        ),
+        after_question=keyboard(
+            [open_app],
+            [InlineKeyboardButton(text="🔮 Задать другой вопрос", callback_data="get_reading")],
+        ),
+        daily_horoscope=keyboard([get_reading], [open_app]),
+        birth_data_saved=keyboard(
+            [InlineKeyboardButton(text="🔮 Получить персональное чтение", callback_data="get_reading")],
+            [open_app],
+        ),
+    )
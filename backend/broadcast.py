@@ -0,0 +1,273 @@
+import os
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from pymongo import ReturnDocument
+
+from bot_assets import (
+    DAILY_GENERAL_TEXT, DAILY_HOROSCOPE_TEXT, SIGN_NAMES, daily_horoscope_messages
+)
+from llm_batch import batch_request, fetch_batch_results, submit_batch, write_batch_file
+from reading_cache import sun_sign
+from send_scheduler import LANE_BROADCAST, SendScheduler, SendSchedulerMiddleware, send_lane
+
+logger = logging.getLogger(__name__)
+
+# Daily broadcast configuration
+BROADCAST_ENABLED = os.environ.get('BROADCAST_ENABLED', 'false').lower() == 'true'
+BROADCAST_TIME = os.environ.get('BROADCAST_TIME', '09:00')
+BROADCAST_TZ = os.environ.get('BROADCAST_TZ', 'Europe/Moscow')
+BROADCAST_BATCH_SIZE = int(os.environ.get('BROADCAST_BATCH_SIZE', '500'))
+# Horoscopes go to the Batch API this long before the send time; unfinished ones are generated directly
+BROADCAST_BATCH_API = os.environ.get('BROADCAST_BATCH_API', 'true').lower() == 'true'
+BROADCAST_BATCH_LEAD = float(os.environ.get('BROADCAST_BATCH_LEAD', str(4 * 60 * 60)))
+
+# Users without a usable birth date share one general horoscope
+GENERAL_GROUP = "general"
+GROUPS = (*SIGN_NAMES, GENERAL_GROUP)
+
+USER_PROJECTION = {"_id": 1, "telegram_id": 1, "first_name": 1, "birth_date": 1}
+
+
+def horoscope_group(user_doc: dict) -> str:
+    return sun_sign(user_doc.get("birth_date")) or GENERAL_GROUP
+
+
+class DailyBroadcast:
+    """Send one daily horoscope per sun sign to every subscribed user.
+
+    Progress is checkpointed per batch in db.broadcast_runs, and users are
+    marked with the run id before their batch is sent, so a restarted run
+    resumes where it stopped and never messages a user twice. A crash
+    between marking and sending skips that batch for the day instead.
+    Sends go through the bot's scheduler in the lowest priority lane, so
+    interactive traffic keeps flowing during a run. With `batch_api`,
+    prepare() submits the day's horoscopes as one Batch API job ahead of
+    the run, at the batch discount; groups the job has not delivered by
+    then are generated directly.
+    """
+
+    def __init__(self, db, bot, llm, keyboard=None, batch_size: int = BROADCAST_BATCH_SIZE,
+                 batch_api: bool = BROADCAST_BATCH_API):
+        self.db = db
+        self.bot = bot
+        self.llm = llm
+        self.keyboard = keyboard
+        self.batch_size = batch_size
+        self.batch_api = batch_api
+
+    def _recipients(self, run_id: str, last_id=None) -> dict:
+        query = {"daily_horoscope": {"$ne": False}, "last_broadcast": {"$ne": run_id}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        return query
+
+    async def _fetch(self, run_id: str, last_id) -> List[dict]:
+        cursor = self.db.users.find(self._recipients(run_id, last_id), USER_PROJECTION)
+        return await cursor.sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+
+    async def prepare(self, date: str):
+        """Submit the date's horoscopes as a Batch API job for run() to pick up"""
+        run_id = f"daily-{date}"
+        if await self.db.broadcast_runs.find_one({"_id": run_id}, {"_id": 1}):
+            # Already prepared, or already running
+            return
+        requests = [batch_request(group, daily_horoscope_messages(group, date), max_tokens=300) for group in GROUPS]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / f"{run_id}.jsonl"
+            write_batch_file(path, requests)
+            batch_id = await submit_batch(self.llm, path)
+        await self.db.broadcast_runs.update_one(
+            {"_id": run_id},
+            {"$set": {"batch_id": batch_id}, "$setOnInsert": {"date": date, "status": "preparing"}},
+            upsert=True,
+        )
+
+    async def _batch_horoscopes(self, batch_id: str) -> Dict[str, str]:
+        """Texts from the prepared job if it has finished; an unfinished job is cancelled"""
+        batch = await self.llm.api.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            logger.warning(f"Broadcast batch {batch_id} is {batch.status}; generating horoscopes directly")
+            if batch.status in ("validating", "in_progress", "finalizing"):
+                await self.llm.api.batches.cancel(batch_id)
+            return {}
+        results = await fetch_batch_results(self.llm, batch)
+        return {group: text for group, text in results.items() if group in GROUPS and text}
+
+    async def _horoscopes(self, run: dict, date: str) -> Dict[str, str]:
+        """One generation per group; texts already stored by an earlier attempt are reused"""
+        stored = dict(run.get("horoscopes") or {})
+        horoscopes = dict(stored)
+        if run.get("batch_id") and any(group not in horoscopes for group in GROUPS):
+            try:
+                horoscopes = {**await self._batch_horoscopes(run["batch_id"]), **horoscopes}
+            except Exception as e:
+                logger.warning(f"Broadcast batch {run['batch_id']} unusable: {e}")
+        missing = [group for group in GROUPS if group not in horoscopes]
+        if missing:
+            texts = await asyncio.gather(*(
+                self.llm.complete(daily_horoscope_messages(group, date), max_tokens=300) for group in missing
+            ))
+            horoscopes.update(zip(missing, texts))
+        fresh = {group: text for group, text in horoscopes.items() if group not in stored}
+        if fresh:
+            await self.db.broadcast_runs.update_one(
+                {"_id": run["_id"]},
+                {"$set": {f"horoscopes.{group}": text for group, text in fresh.items()}}
+            )
+        return horoscopes
+
+    def _text(self, user_doc: dict, group: str, horoscope: str, date: str) -> str:
+        name = user_doc.get("first_name") or "Дорогая"
+        if group == GENERAL_GROUP:
+            return DAILY_GENERAL_TEXT.render(name=name, date=date, horoscope=horoscope)
+        return DAILY_HOROSCOPE_TEXT.render(name=name, date=date, sign=SIGN_NAMES[group], horoscope=horoscope)
+
+    async def _send(self, user_doc: dict, horoscopes: Dict[str, str], date: str) -> str:
+        group = horoscope_group(user_doc)
+        try:
+            await self.bot.send_message(
+                user_doc["telegram_id"],
+                self._text(user_doc, group, horoscopes[group], date),
+                reply_markup=self.keyboard,
+            )
+            return "sent"
+        except TelegramForbiddenError as e:
+            # Blocked the bot or deactivated; stop broadcasting to them
+            logger.info(f"Broadcast unreachable for {user_doc['telegram_id']}: {e}")
+            return "blocked"
+        except TelegramAPIError as e:
+            logger.warning(f"Broadcast failed for {user_doc['telegram_id']}: {e}")
+            return "failed"
+
+    async def run(self, date: str) -> dict:
+        """Run (or resume) the broadcast for a local date, YYYY-MM-DD"""
+        run_id = f"daily-{date}"
+        now = datetime.now(timezone.utc)
+        run = await self.db.broadcast_runs.find_one_and_update(
+            {"_id": run_id},
+            {"$setOnInsert": {"date": date, "status": "running", "started_at": now,
+                              "sent": 0, "blocked": 0, "failed": 0},
+             "$set": {"updated_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if run.get("finished_at"):
+            logger.info(f"Broadcast {run_id} already finished")
+            return run
+        if run.get("status") == "preparing":
+            # Created by prepare(); from here on it is a regular run
+            run = await self.db.broadcast_runs.find_one_and_update(
+                {"_id": run_id},
+                {"$set": {"status": "running", "started_at": now, "sent": 0, "blocked": 0, "failed": 0}},
+                return_document=ReturnDocument.AFTER,
+            )
+
+        horoscopes = await self._horoscopes(run, date)
+        last_id = run.get("last_id")
+        logger.info(f"Broadcast {run_id} {'resuming after ' + str(last_id) if last_id else 'starting'}")
+
+        with send_lane(LANE_BROADCAST):
+            batch = await self._fetch(run_id, last_id)
+            while batch:
+                ids = [doc["_id"] for doc in batch]
+                await self.db.users.update_many({"_id": {"$in": ids}}, {"$set": {"last_broadcast": run_id}})
+                # Read the next batch from Mongo while this one drains through the sender
+                prefetch = asyncio.create_task(self._fetch(run_id, ids[-1]))
+                try:
+                    outcomes = await asyncio.gather(*(self._send(doc, horoscopes, date) for doc in batch))
+                except BaseException:
+                    prefetch.cancel()
+                    raise
+
+                blocked = [doc["_id"] for doc, outcome in zip(batch, outcomes) if outcome == "blocked"]
+                if blocked:
+                    await self.db.users.update_many({"_id": {"$in": blocked}}, {"$set": {"daily_horoscope": False}})
+                counts = {key: outcomes.count(key) for key in ("sent", "blocked", "failed")}
+                await self.db.broadcast_runs.update_one(
+                    {"_id": run_id},
+                    {"$set": {"last_id": ids[-1], "updated_at": datetime.now(timezone.utc)}, "$inc": counts},
+                )
+                batch = await prefetch
+
+        run = await self.db.broadcast_runs.find_one_and_update(
+            {"_id": run_id},
+            {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        logger.info(f"Broadcast {run_id} finished: {run['sent']} sent, {run['blocked']} blocked, {run['failed']} failed")
+        return run
+
+    async def latest(self) -> Optional[dict]:
+        return await self.db.broadcast_runs.find_one({}, {"horoscopes": 0}, sort=[("started_at", -1)])
+
+
+def next_run_at(now: datetime, at: str = BROADCAST_TIME, tz: str = BROADCAST_TZ) -> datetime:
+    """Next local occurrence of the HH:MM broadcast time"""
+    local = now.astimezone(ZoneInfo(tz))
+    hour, minute = map(int, at.split(":"))
+    scheduled = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if scheduled <= local:
+        scheduled += timedelta(days=1)
+    return scheduled
+
+
+async def run_daily(broadcast: DailyBroadcast, at: str = BROADCAST_TIME, tz: str = BROADCAST_TZ,
+                    lead: float = BROADCAST_BATCH_LEAD):
+    """Run the broadcast every day at the configured local time, forever"""
+    # Finish a run interrupted by a restart before waiting for the next one
+    interrupted = await broadcast.db.broadcast_runs.find_one({"status": "running"}, sort=[("started_at", -1)])
+    if interrupted:
+        await broadcast.run(interrupted["date"])
+    while True:
+        scheduled = next_run_at(datetime.now(timezone.utc), at, tz)
+        if broadcast.batch_api:
+            await asyncio.sleep(max(0.0, (scheduled - datetime.now(timezone.utc)).total_seconds() - lead))
+            try:
+                await broadcast.prepare(scheduled.date().isoformat())
+            except Exception as e:
+                logger.warning(f"Broadcast batch submission failed, generating at send time: {e}")
+        await asyncio.sleep((scheduled - datetime.now(timezone.utc)).total_seconds())
+        try:
+            await broadcast.run(scheduled.date().isoformat())
+        except Exception as e:
+            logger.error(f"Daily broadcast failed: {e}")
+
+
+async def main():
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from aiogram import Bot
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    from llm_client import LLMClient
+
+    parser = argparse.ArgumentParser(description="Run or resume the daily horoscope broadcast")
+    parser.add_argument("--date", default=datetime.now(ZoneInfo(BROADCAST_TZ)).date().isoformat())
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    bot = Bot(token=os.environ['BOT_TOKEN'])
+    scheduler = SendScheduler()
+    bot.session.middleware(SendSchedulerMiddleware(scheduler))
+    llm = LLMClient(api_key=os.environ.get('OPENAI_API_KEY'))
+    try:
+        await DailyBroadcast(client[os.environ['DB_NAME']], bot, llm).run(args.date)
+    finally:
+        await scheduler.close()
+        await bot.session.close()
+        await llm.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Multi-worker configuration: 'single' runs everything in-process, 'lease' elects a leader through Mongo
+CLUSTER_MODE = os.environ.get('CLUSTER_MODE', 'single')
+CLUSTER_LEASE_TTL = float(os.environ.get('CLUSTER_LEASE_TTL', '30'))
+CLUSTER_RENEW_INTERVAL = float(os.environ.get('CLUSTER_RENEW_INTERVAL', '10'))
+
+# Unique per process, also across restarts that reuse a pid
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Lease:
+    """Time-limited ownership of `key`, stored as a document in `collection`.
+
+    acquire() takes a free or expired lease, or extends one we hold, in a
+    single upsert; a lease held by someone else makes the upsert collide on
+    _id. Expiry uses local clocks, so they must agree to within a fraction
+    of the TTL. We stop trusting a lease a renew interval before it expires.
+    """
+
+    def __init__(self, collection, key, holder: str = PROCESS_ID, ttl: float = CLUSTER_LEASE_TTL,
+                 margin: float = CLUSTER_RENEW_INTERVAL):
+        self.collection = collection
+        self.key = key
+        self.holder = holder
+        self.ttl = timedelta(seconds=ttl)
+        self.margin = timedelta(seconds=min(margin, ttl / 2))
+        self.expires_at: Optional[datetime] = None
+
+    @property
+    def held(self) -> bool:
+        return self.expires_at is not None and datetime.now(timezone.utc) < self.expires_at - self.margin
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"_id": self.key, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + self.ttl, "renewed_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            self.expires_at = None
+            return False
+        self.expires_at = now + self.ttl
+        return True
+
+    async def release(self):
+        self.expires_at = None
+        try:
+            await self.collection.delete_one({"_id": self.key, "holder": self.holder})
+        except PyMongoError as e:
+            logger.warning(f"Failed to release lease {self.key}: {e}")
+
+
+class LeaderElection:
+    """Runs the leader-only startup work and jobs in exactly one process.
+
+    In 'lease' mode every process competes for the leader lease and renews
+    it every `renew_interval`; on_elected runs when a process takes over and
+    on_demoted when it loses the lease. In 'single' mode the process is the
+    leader straight away, without touching Mongo.
+    """
+
+    def __init__(self, db, on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]],
+                 mode: str = CLUSTER_MODE, holder: str = PROCESS_ID, ttl: float = CLUSTER_LEASE_TTL,
+                 renew_interval: float = CLUSTER_RENEW_INTERVAL):
+        self.mode = mode
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.renew_interval = renew_interval
+        self.lease = Lease(db.cluster_leases, "leader", holder, ttl, renew_interval)
+        self.is_leader = False
+        self.elections = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        if leader:
+            self.elections += 1
+            logger.info(f"{self.lease.holder} is now the leader")
+            await self.on_elected()
+        else:
+            logger.warning(f"{self.lease.holder} lost leadership")
+            await self.on_demoted()
+
+    async def _campaign(self):
+        while True:
+            try:
+                await self.lease.acquire()
+            except PyMongoError as e:
+                logger.warning(f"Leader lease renewal failed: {e}")
+            try:
+                await self._set_leader(self.lease.held)
+            except Exception as e:
+                logger.error(f"Leadership change handling failed: {e}")
+            await asyncio.sleep(self.renew_interval)
+
+    async def start(self):
+        if self.mode == "single":
+            await self._set_leader(True)
+        elif self.mode == "lease":
+            self._task = asyncio.create_task(self._campaign())
+        else:
+            raise ValueError(f"Unknown cluster mode: {self.mode}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self.on_demoted()
+            if self.mode == "lease":
+                # Let another process take over without waiting out the TTL
+                await self.lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "process": self.lease.holder,
+            "leader": self.is_leader,
+            "lease_expires_at": self.lease.expires_at.isoformat() if self.lease.expires_at else None,
+            "elections": self.elections,
+        }
+
+
+class ClusterMembers:
+    """Live processes, each heartbeating a document that expires with its lease TTL"""
+
+    def __init__(self, collection, holder: str = PROCESS_ID, ttl: float = CLUSTER_LEASE_TTL):
+        self.collection = collection
+        self.holder = holder
+        self.ttl = timedelta(seconds=ttl)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def heartbeat(self) -> int:
+        """Refresh our membership and return the number of live processes"""
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one({"_id": self.holder}, {"$set": {"expires_at": now + self.ttl}}, upsert=True)
+        return await self.collection.count_documents({"expires_at": {"$gt": now}})
+
+    async def leave(self):
+        try:
+            await self.collection.delete_one({"_id": self.holder})
+        except PyMongoError as e:
+            logger.warning(f"Failed to leave the cluster: {e}")
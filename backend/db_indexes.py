@@ -0,0 +1,102 @@
+import os
+import logging
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHECK_TTL_SECONDS = int(os.environ.get('STATUS_CHECK_TTL_SECONDS', str(30 * 24 * 60 * 60)))
+
+# (collection, keys, options) for every index the hot paths rely on
+INDEX_SPECS = [
+    ("users", [("telegram_id", ASCENDING)], {"name": "telegram_id_unique", "unique": True}),
+    # Only active subscriptions can expire; the sweeper's queries always include the filter
+    ("users", [("subscription_end", ASCENDING)],
+     {"name": "active_subscription_end", "partialFilterExpression": {"subscription_active": True}}),
+    ("readings", [("telegram_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+     {"name": "telegram_id_created_at_id"}),
+    # Opening one reading from the web app's preview list
+    ("readings", [("id", ASCENDING)], {"name": "id"}),
+    ("status_checks", [("timestamp", ASCENDING)], {"name": "timestamp_ttl", "expireAfterSeconds": STATUS_CHECK_TTL_SECONDS}),
+    ("status_checks", [("timestamp", DESCENDING), ("id", DESCENDING)], {"name": "timestamp_id"}),
+]
+
+# Indexes superseded by INDEX_SPECS, dropped when present
+OBSOLETE_INDEXES = [
+    ("readings", "telegram_id_created_at"),
+]
+
+# (collection, filter, sort, expected index) for the hot queries to explain
+QUERY_PLANS = [
+    ("users", {"telegram_id": 0}, None, "telegram_id_unique"),
+    ("users", {"subscription_active": True, "subscription_end": {"$lte": datetime.fromtimestamp(0, timezone.utc)}},
+     [("subscription_end", ASCENDING)], "active_subscription_end"),
+    ("readings", {"telegram_id": 0}, [("created_at", DESCENDING), ("id", DESCENDING)], "telegram_id_created_at_id"),
+]
+
+
+async def ensure_indexes(db) -> List[str]:
+    """Create indexes for users, readings and status_checks"""
+    created = []
+    for collection, keys, options in INDEX_SPECS:
+        try:
+            name = await db[collection].create_index(keys, **options)
+            created.append(f"{collection}.{name}")
+        except OperationFailure as e:
+            # e.g. duplicate telegram_ids or an index with conflicting options
+            logger.error(f"Failed to create index {options['name']} on {collection}: {e}")
+    for collection, name in OBSOLETE_INDEXES:
+        if name in await db[collection].index_information():
+            await db[collection].drop_index(name)
+            logger.info(f"Dropped obsolete index {collection}.{name}")
+    return created
+
+
+def _plan_stages(plan: dict) -> List[dict]:
+    """Flatten a winning plan into its stages"""
+    stages = []
+    while plan:
+        stages.append(plan)
+        if "queryPlan" in plan:
+            plan = plan["queryPlan"]
+        elif "inputStage" in plan:
+            plan = plan["inputStage"]
+        elif plan.get("inputStages"):
+            plan = plan["inputStages"][0]
+        else:
+            plan = None
+    return stages
+
+
+async def verify_indexes(db) -> dict:
+    """Explain the hot queries and report whether they use the expected index"""
+    report = {}
+    for collection, query, sort, index_name in QUERY_PLANS:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = await cursor.explain()
+        except OperationFailure as e:
+            logger.error(f"Failed to explain {collection} query: {e}")
+            report[f"{collection}.{index_name}"] = {"ok": False, "error": str(e)}
+            continue
+
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        names = [stage.get("stage") for stage in stages]
+        used = [stage.get("indexName") for stage in stages if stage.get("stage") == "IXSCAN"]
+        ok = index_name in used and "COLLSCAN" not in names and "SORT" not in names
+        report[f"{collection}.{index_name}"] = {"ok": ok, "stages": names, "indexes": used}
+        if not ok:
+            logger.warning(f"Query on {collection} does not use index {index_name}: {names}")
+    return report
+
+
+async def bootstrap_indexes(db) -> dict:
+    """Ensure indexes exist and verify the hot query plans"""
+    created = await ensure_indexes(db)
+    logger.info(f"Indexes ready: {', '.join(created)}")
+    return await verify_indexes(db)
@@ -0,0 +1,180 @@
+import os
+import re
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = Path(os.environ.get('GAZETTEER_PATH', Path(__file__).parent / 'data' / 'gazetteer.tsv'))
+GEOCODER_CACHE_SIZE = int(os.environ.get('GEOCODER_CACHE_SIZE', '10000'))
+# Shorter names are only matched exactly: one typo or a prefix turns Бали into Баку
+GEOCODER_FUZZY_MIN_LENGTH = int(os.environ.get('GEOCODER_FUZZY_MIN_LENGTH', '6'))
+
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u", "ә": "a", "ғ": "g", "қ": "k", "ң": "n",
+    "ө": "o", "ұ": "u", "ү": "u", "һ": "h",
+}
+LATIN_FOLD = str.maketrans("áàâäãåçéèêëíìîïñóòôöõúùûüýÿışğ", "aaaaaaceeeeiiiinooooouuuuyyisg")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def transliterate(text: str) -> str:
+    """Lowercase text and map Cyrillic letters to Latin"""
+    return "".join(TRANSLIT.get(ch, ch) for ch in text.lower()).translate(LATIN_FOLD)
+
+
+def normalize_place(text: str) -> str:
+    """Transliterated, punctuation-free lookup key"""
+    return _NON_ALNUM.sub(" ", transliterate(text)).strip()
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    name_ru: str
+    country: str
+    country_ru: str
+    lat: float
+    lon: float
+    timezone: str
+    population: int
+
+
+class _TrieNode:
+    __slots__ = ("children", "places")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.places: List[int] = []
+
+
+class PlaceIndex:
+    """Trie over transliterated place names with prefix and fuzzy lookup"""
+
+    def __init__(self, places: List[Place], aliases: List[List[str]]):
+        self.places = places
+        self.root = _TrieNode()
+        self.countries: Dict[str, str] = {}
+        for place_id, (place, names) in enumerate(zip(places, aliases)):
+            for name in {place.name, place.name_ru, *names}:
+                key = normalize_place(name)
+                if key:
+                    self._insert(key, place_id)
+            for country in (place.country, place.country_ru):
+                self.countries[normalize_place(country)] = place.country
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_PATH) -> "PlaceIndex":
+        """Build the index from a tab-separated gazetteer file"""
+        places, aliases = [], []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                name, name_ru, country, country_ru, lat, lon, tz, population, alt = line.rstrip("\n").split("\t")
+                places.append(Place(name, name_ru, country, country_ru, float(lat), float(lon), tz, int(population)))
+                aliases.append([a for a in alt.split(",") if a])
+        logger.info(f"Gazetteer loaded: {len(places)} places")
+        return cls(places, aliases)
+
+    def _insert(self, key: str, place_id: int):
+        node = self.root
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+        if place_id not in node.places:
+            node.places.append(place_id)
+
+    def _node(self, key: str) -> Optional[_TrieNode]:
+        node = self.root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def exact(self, key: str) -> List[int]:
+        node = self._node(key)
+        return list(node.places) if node else []
+
+    def prefix(self, key: str, limit: int = 10) -> List[int]:
+        """Places whose name starts with key"""
+        node = self._node(key)
+        found, stack = [], [node] if node else []
+        while stack:
+            node = stack.pop()
+            found.extend(p for p in node.places if p not in found)
+            stack.extend(node.children.values())
+        found.sort(key=lambda p: -self.places[p].population)
+        return found[:limit]
+
+    def fuzzy(self, key: str, max_distance: int) -> List[int]:
+        """Places within max_distance edits of key (Levenshtein over the trie)"""
+        results: Dict[int, int] = {}
+        first_row = list(range(len(key) + 1))
+
+        def walk(node: _TrieNode, ch: str, previous: List[int]):
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (key[i - 1] != ch)))
+            if row[-1] <= max_distance:
+                for p in node.places:
+                    results[p] = min(results.get(p, max_distance), row[-1])
+            if min(row) <= max_distance:
+                for next_ch, child in node.children.items():
+                    walk(child, next_ch, row)
+
+        for ch, child in self.root.children.items():
+            walk(child, ch, first_row)
+        return sorted(results, key=lambda p: (results[p], -self.places[p].population))
+
+    def resolve(self, text: str) -> Optional[Place]:
+        """Resolve free text like "Москва, Россия" to a place.
+
+        Returns None rather than a guess: when nothing matches closely
+        enough, or when nothing matches in the country the user named.
+        """
+        parts = [normalize_place(part) for part in text.split(",")]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        city = parts[0]
+        country = next((self.countries[p] for p in parts[1:] if p in self.countries), None)
+
+        # Exact names first, then typos, then unfinished names; each list is best-first
+        candidates = sorted(self.exact(city), key=lambda p: -self.places[p].population)
+        if not candidates and len(city) >= GEOCODER_FUZZY_MIN_LENGTH:
+            candidates = self.fuzzy(city, 1 if len(city) < 8 else 2)
+        if not candidates and len(city) >= GEOCODER_FUZZY_MIN_LENGTH:
+            candidates = self.prefix(city)
+        if country:
+            candidates = [p for p in candidates if self.places[p].country == country]
+        return self.places[candidates[0]] if candidates else None
+
+
+_index: Optional[PlaceIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_place_index() -> PlaceIndex:
+    """Load the bundled gazetteer once per process"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PlaceIndex.load()
+    return _index
+
+
+@lru_cache(maxsize=GEOCODER_CACHE_SIZE)
+def resolve_place(text: str) -> Optional[Place]:
+    """Resolve a birth place offline, caching results in-process"""
+    return get_place_index().resolve(text)
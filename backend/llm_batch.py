@@ -0,0 +1,161 @@
+import os
+import json
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from llm_client import LLM_MODEL, LLMClient
+
+logger = logging.getLogger(__name__)
+
+# Batch API configuration for non-interactive completions
+LLM_BATCH_CONCURRENCY = int(os.environ.get('LLM_BATCH_CONCURRENCY', '16'))
+LLM_BATCH_POLL = float(os.environ.get('LLM_BATCH_POLL', '30'))
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def batch_request(custom_id: str, messages: List[dict], model: str = LLM_MODEL,
+                  max_tokens: int = 400, temperature: float = 0.7) -> dict:
+    """One line of a Batch API input file"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature},
+    }
+
+
+def write_batch_file(path: Path, requests: Iterable[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def parse_batch_results(lines: Iterable[str]) -> Dict[str, Optional[str]]:
+    """custom_id -> completion text, or None for failed requests"""
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        text = None
+        if response.get("status_code") == 200:
+            # Content is null after a content-filter finish
+            text = (response["body"]["choices"][0]["message"].get("content") or "").strip() or None
+        results[record["custom_id"]] = text
+    return results
+
+
+def read_batch_results(path: Path) -> Dict[str, Optional[str]]:
+    with open(path, encoding="utf-8") as f:
+        return parse_batch_results(f)
+
+
+async def submit_batch(llm: LLMClient, path: Path) -> str:
+    """Upload an input file and start a Batch API job; returns the batch id"""
+    with open(path, "rb") as f:
+        uploaded = await llm.api.files.create(file=f, purpose="batch")
+    batch = await llm.api.batches.create(
+        input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} from {path}")
+    return batch.id
+
+
+async def wait_for_batch(llm: LLMClient, batch_id: str, poll: float = LLM_BATCH_POLL):
+    while True:
+        batch = await llm.api.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            return batch
+        logger.info(f"Batch {batch_id} {batch.status}: {batch.request_counts}")
+        await asyncio.sleep(poll)
+
+
+async def download_batch_results(llm: LLMClient, batch, path: Path) -> int:
+    """Write a finished batch's output file; returns the number of result lines"""
+    if not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} has no output ({batch.status})")
+    content = await llm.api.files.content(batch.output_file_id)
+    path.write_bytes(content.content)
+    return sum(1 for line in content.text.splitlines() if line.strip())
+
+
+async def fetch_batch_results(llm: LLMClient, batch) -> Dict[str, Optional[str]]:
+    """A finished batch's results, read without writing a file"""
+    if not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} has no output ({batch.status})")
+    content = await llm.api.files.content(batch.output_file_id)
+    return parse_batch_results(content.text.splitlines())
+
+
+async def run_batch_file(llm: LLMClient, path_in: Path, path_out: Path,
+                         concurrency: int = LLM_BATCH_CONCURRENCY) -> int:
+    """Execute an input file directly against chat completions, writing Batch API style output.
+
+    For providers or mock servers without the Batch API, and for jobs too
+    small to wait a completion window for.
+    """
+    with open(path_in, encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def execute(request: dict) -> dict:
+        body = request["body"]
+        async with semaphore:
+            try:
+                text = await llm.complete(body["messages"], model=body.get("model"),
+                                          max_tokens=body.get("max_tokens", 400),
+                                          temperature=body.get("temperature", 0.7))
+            except Exception as e:
+                return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+        return {
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}},
+            "error": None,
+        }
+
+    results = await asyncio.gather(*(execute(request) for request in requests))
+    return write_batch_file(path_out, results)
+
+
+async def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Offline LLM batch jobs over JSONL files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="upload an input file and start a Batch API job")
+    submit.add_argument("input", type=Path)
+    fetch = commands.add_parser("fetch", help="wait for a batch and download its output")
+    fetch.add_argument("batch_id")
+    fetch.add_argument("output", type=Path)
+    run = commands.add_parser("run", help="execute an input file directly, without the Batch API")
+    run.add_argument("input", type=Path)
+    run.add_argument("output", type=Path)
+    args = parser.parse_args()
+
+    llm = LLMClient(api_key=os.environ.get('OPENAI_API_KEY'))
+    try:
+        if args.command == "submit":
+            print(await submit_batch(llm, args.input))
+        elif args.command == "fetch":
+            batch = await wait_for_batch(llm, args.batch_id)
+            lines = await download_batch_results(llm, batch, args.output)
+            logger.info(f"Batch {batch.id} {batch.status}: {lines} results written to {args.output}")
+        else:
+            lines = await run_batch_file(llm, args.input, args.output)
+            logger.info(f"{lines} results written to {args.output}")
+    finally:
+        await llm.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
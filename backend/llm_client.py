@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional
+
+import httpx
+import openai
+
+from metrics import observe_llm
+
+logger = logging.getLogger(__name__)
+
+# LLM client configuration
+LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4o-mini')
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '256'))
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '100'))
+LLM_MAX_KEEPALIVE = int(os.environ.get('LLM_MAX_KEEPALIVE', '20'))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', '30'))
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '60'))
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', '5'))
+# SDK-level retries; ResilientLLM retries with backoff and fallback on top
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '0'))
+
+
+class EmptyCompletionError(Exception):
+    """The model returned no text, e.g. a content-filter or tool-call finish"""
+
+
+class LLMClient:
+    """Long-lived async OpenAI client sharing one pooled HTTP connection"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: Optional[str] = None,
+        model: str = LLM_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_MAX_KEEPALIVE,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        timeout: float = LLM_TIMEOUT,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http,
+            max_retries=max_retries,
+        )
+
+    @property
+    def api(self) -> openai.AsyncOpenAI:
+        """Underlying OpenAI client, for endpoints without a wrapper here"""
+        return self._client
+
+    @property
+    def in_flight(self) -> int:
+        """Number of completions currently awaiting the provider"""
+        return self._in_flight
+
+    async def complete(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Run a chat completion without blocking the event loop"""
+        model = model or self.model
+        async with self._semaphore:
+            self._in_flight += 1
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout or self.timeout,
+                )
+            finally:
+                self._in_flight -= 1
+                observe_llm(model, "complete", "ok" if response else "error", time.perf_counter() - started,
+                            response.usage if response else None)
+        choice = response.choices[0]
+        text = (choice.message.content or "").strip()
+        if not text:
+            raise EmptyCompletionError(f"{model} returned an empty completion ({choice.finish_reason or 'unknown'})")
+        return text
+
+    async def stream(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion text deltas as the provider produces them"""
+        model = model or self.model
+        async with self._semaphore:
+            self._in_flight += 1
+            started = time.perf_counter()
+            outcome, usage = "error", None
+            try:
+                response = await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout or self.timeout,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in response:
+                    # The final chunk carries usage and no choices
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                outcome = "ok"
+            finally:
+                self._in_flight -= 1
+                observe_llm(model, "stream", outcome, time.perf_counter() - started, usage)
+
+    async def close(self):
+        """Close the pooled HTTP connection"""
+        await self._client.close()
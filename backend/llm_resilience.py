@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import openai
+
+from llm_client import EmptyCompletionError, LLMClient
+
+logger = logging.getLogger(__name__)
+
+# Resilience configuration
+LLM_DEADLINE = float(os.environ.get('LLM_DEADLINE', '30'))
+LLM_RETRY_ATTEMPTS = int(os.environ.get('LLM_RETRY_ATTEMPTS', '3'))
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', '8'))
+LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.environ.get('LLM_BREAKER_RESET', '30'))
+# Tried in order after the primary model
+LLM_FALLBACK_MODELS = [m.strip() for m in os.environ.get('LLM_FALLBACK_MODELS', 'gpt-4.1-mini,gpt-4.1-nano').split(',') if m.strip()]
+
+# Transient provider trouble: worth retrying and counted against the breaker
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+# The model itself is unusable for us, or refused this prompt; move on to the next one
+FALLBACK_ERRORS = (openai.NotFoundError, openai.PermissionDeniedError, EmptyCompletionError)
+
+
+class LLMUnavailableError(Exception):
+    """Every model in the chain failed, was fast-failed or ran out of time"""
+
+
+class CircuitBreaker:
+    """Closed until `threshold` consecutive failures, then open for `reset_timeout`.
+
+    After the timeout a single probe call is let through (half-open); its
+    outcome closes the breaker or opens it for another period.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """A call ended without a verdict, e.g. cancelled; let another probe through"""
+        self._probing = False
+
+
+class ResilientLLM:
+    """LLMClient wrapper adding a deadline, retries, circuit breakers and model fallback.
+
+    Each call gets `deadline` seconds in total. Transient errors are retried
+    with full-jitter exponential backoff, up to `attempts` per model; then,
+    or straight away if the model's breaker is open, the next model in the
+    chain is tried. Streams are retried only until the first delta arrives,
+    but the deadline covers the whole stream.
+    """
+
+    def __init__(self, llm: LLMClient, fallback_models: List[str] = LLM_FALLBACK_MODELS,
+                 deadline: float = LLM_DEADLINE, attempts: int = LLM_RETRY_ATTEMPTS,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX,
+                 breaker_threshold: int = LLM_BREAKER_THRESHOLD, breaker_reset: float = LLM_BREAKER_RESET):
+        self.llm = llm
+        self.model = llm.model
+        self.fallback_models = fallback_models
+        self.deadline = deadline
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.fallbacks = 0
+        self.fast_failures = 0
+
+    @property
+    def api(self) -> openai.AsyncOpenAI:
+        return self.llm.api
+
+    @property
+    def in_flight(self) -> int:
+        return self.llm.in_flight
+
+    def _chain(self, model: Optional[str]) -> List[str]:
+        primary = model or self.model
+        return [primary] + [m for m in self.fallback_models if m != primary]
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def _run(self, call: Callable[[str, float], Awaitable], model: Optional[str], timeout: Optional[float]):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.deadline)
+        chain = self._chain(model)
+        last_error: Optional[BaseException] = None
+        for position, name in enumerate(chain):
+            breaker = self._breaker(name)
+            for attempt in range(self.attempts):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise LLMUnavailableError(f"LLM deadline exceeded: {last_error}") from last_error
+                if not breaker.allow():
+                    self.fast_failures += 1
+                    last_error = last_error or LLMUnavailableError(f"Circuit open for {name}")
+                    break
+                try:
+                    result = await asyncio.wait_for(call(name, remaining), remaining)
+                except RETRYABLE_ERRORS as e:
+                    breaker.record_failure()
+                    last_error = e
+                    logger.warning(f"LLM call to {name} failed (attempt {attempt + 1}): {type(e).__name__}: {e}")
+                    if attempt + 1 == self.attempts or breaker.state == "open":
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(min(self._backoff(attempt, e), max(0.0, deadline - loop.time())))
+                    continue
+                except FALLBACK_ERRORS as e:
+                    breaker.release()
+                    last_error = e
+                    logger.error(f"LLM model {name} unusable: {e}")
+                    break
+                except BaseException:
+                    breaker.release()
+                    raise
+                breaker.record_success()
+                if position:
+                    self.fallbacks += 1
+                return result
+        raise LLMUnavailableError(f"All models failed: {last_error}") from last_error
+
+    async def complete(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> str:
+        async def call(name: str, remaining: float):
+            return await self.llm.complete(messages, name, max_tokens, temperature, remaining)
+
+        return await self._run(call, model, timeout)
+
+    async def stream(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Stream deltas; the deadline covers the whole stream, not just the first delta"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.deadline)
+
+        async def call(name: str, remaining: float):
+            deltas = self.llm.stream(messages, name, max_tokens, temperature, remaining)
+            try:
+                return name, deltas, await deltas.__anext__()
+            except StopAsyncIteration:
+                return name, deltas, None
+            except BaseException:
+                await deltas.aclose()
+                raise
+
+        name, deltas, first = await self._run(call, model, deadline - loop.time())
+        try:
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    delta = await asyncio.wait_for(deltas.__anext__(), max(0.0, deadline - loop.time()))
+                except StopAsyncIteration:
+                    return
+                except RETRYABLE_ERRORS as e:
+                    # Too late to retry, but a stalling model still counts against its breaker
+                    self._breaker(name).record_failure()
+                    logger.warning(f"LLM stream from {name} failed midway: {type(e).__name__}: {e}")
+                    raise LLMUnavailableError(f"LLM stream from {name} failed midway: {e}") from e
+                yield delta
+        finally:
+            await deltas.aclose()
+
+    async def close(self):
+        await self.llm.close()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "fast_failures": self.fast_failures,
+            "breakers": {name: {"state": breaker.state, "failures": breaker.failures}
+                         for name, breaker in self.breakers.items()},
+        }
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from metrics import LOOP_BLOCKS, LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Event loop watchdog configuration
+LOOP_MONITOR_ENABLED = os.environ.get('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+LOOP_MONITOR_INTERVAL = float(os.environ.get('LOOP_MONITOR_INTERVAL', '0.1'))
+LOOP_BLOCK_THRESHOLD = float(os.environ.get('LOOP_BLOCK_THRESHOLD', '0.1'))
+# Stack capture runs a watchdog thread; meant for staging and local runs
+LOOP_MONITOR_DEBUG = os.environ.get('LOOP_MONITOR_DEBUG', 'false').lower() == 'true'
+LOOP_MONITOR_WINDOW = int(os.environ.get('LOOP_MONITOR_WINDOW', '600'))
+LOOP_MONITOR_REPORTS = int(os.environ.get('LOOP_MONITOR_REPORTS', '50'))
+
+APP_DIR = str(Path(__file__).parent)
+
+
+def task_stack(frame) -> traceback.StackSummary:
+    """The loop thread's stack without the event loop's own frames"""
+    stack = traceback.extract_stack(frame)
+    for index in range(len(stack) - 1, -1, -1):
+        if stack[index].name == "_run" and stack[index].filename.endswith(os.path.join("asyncio", "events.py")):
+            return traceback.StackSummary.from_list(stack[index + 1:])
+    return stack
+
+
+def blocking_location(stack: traceback.StackSummary) -> str:
+    """Innermost frame in our own code, else the innermost frame"""
+    app_frames = [frame for frame in stack if frame.filename.startswith(APP_DIR)]
+    frame = (app_frames or list(stack))[-1]
+    filename = os.path.relpath(frame.filename, APP_DIR) if app_frames else frame.filename
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """Measures event-loop lag and, in debug mode, catches what blocks the loop.
+
+    A task sleeps `interval` seconds at a time; how late it wakes up is the
+    lag. In debug mode a watchdog thread also watches that task's heartbeat,
+    and once the loop has not come round for `threshold` seconds it captures
+    the loop thread's stack, which ends in the blocking call itself.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD,
+                 debug: bool = LOOP_MONITOR_DEBUG, window: int = LOOP_MONITOR_WINDOW,
+                 max_reports: int = LOOP_MONITOR_REPORTS):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self._lags = deque(maxlen=window)
+        self._reports = deque(maxlen=max_reports)
+        self._locations = Counter()
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.blocks = 0
+        self.max_lag = 0.0
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                self.blocks += 1
+                LOOP_BLOCKS.inc()
+                if self._reports and self._reports[-1]["blocked_ms"] is None:
+                    # The watchdog saw this stall start; now we know how long it lasted
+                    self._reports[-1]["blocked_ms"] = round(lag * 1000, 1)
+                elif not self.debug:
+                    logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int):
+        captured = None
+        while not self._stopping.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            if heartbeat == captured or time.monotonic() - heartbeat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is None:
+                continue
+            captured = heartbeat
+            stack = task_stack(frame)
+            del frame
+            task = asyncio.current_task(loop)
+            location = blocking_location(stack)
+            self._locations[location] += 1
+            self._reports.append({
+                "at": datetime.now(timezone.utc).isoformat(),
+                "blocked_ms": None,
+                "task": task.get_name() if task else None,
+                "location": location,
+                "stack": stack.format(),
+            })
+            logger.warning(f"Event loop blocked at {location}:\n{''.join(stack.format())}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._measure())
+        if self.debug:
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._watch, args=(asyncio.get_running_loop(), threading.get_ident()),
+                name="loop-watchdog", daemon=True,
+            )
+            self._thread.start()
+        logger.info(f"Loop monitor started (threshold {self.threshold * 1000:.0f}ms, debug {self.debug})")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+
+        def at(q: float) -> float:
+            return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2) if lags else 0.0
+
+        return {
+            "debug": self.debug,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": {"p50": at(0.5), "p99": at(0.99), "max": at(1.0), "samples": len(lags)},
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "blocks": self.blocks,
+            "top_locations": self._locations.most_common(10),
+            "recent": list(self._reports),
+        }
@@ -0,0 +1,226 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Traces slower than this are logged at INFO, the rest at DEBUG
+TRACE_LOG_THRESHOLD_MS = float(os.environ.get('TRACE_LOG_THRESHOLD_MS', '1000'))
+TRACE_MAX_PENDING = int(os.environ.get('TRACE_MAX_PENDING', '10000'))
+
+# Latency buckets from fast Mongo reads up to slow LLM generations
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+WEBHOOK_SECONDS = Histogram("webhook_seconds", "Webhook request handling time", ["outcome"], buckets=BUCKETS)
+FEED_UPDATE_SECONDS = Histogram("feed_update_seconds", "Dispatcher feed_update duration", ["update_type"],
+                                buckets=BUCKETS)
+HANDLER_SECONDS = Histogram("handler_seconds", "Bot handler latency", ["handler"], buckets=BUCKETS)
+STAGE_SECONDS = Histogram("update_stage_seconds", "Time spent per update stage", ["stage"], buckets=BUCKETS)
+MONGO_SECONDS = Histogram("mongo_command_seconds", "MongoDB command latency", ["collection", "command", "outcome"],
+                          buckets=BUCKETS)
+LLM_SECONDS = Histogram("llm_request_seconds", "LLM provider call latency", ["model", "kind", "outcome"],
+                        buckets=BUCKETS)
+LLM_TOKENS = Counter("llm_tokens", "LLM tokens used", ["model", "type"])
+TELEGRAM_SECONDS = Histogram("telegram_request_seconds", "Bot API call latency, including outbound pacing",
+                             ["method", "outcome"], buckets=BUCKETS)
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds", "How late the event loop runs a scheduled wakeup",
+                             buckets=BUCKETS)
+LOOP_BLOCKS = Counter("event_loop_blocks", "Event loop stalls longer than the block threshold")
+
+
+class Trace:
+    """Per-update stage timings under a correlation id"""
+
+    __slots__ = ("correlation_id", "started", "stages")
+
+    def __init__(self, correlation_id: str):
+        self.correlation_id = correlation_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        breakdown = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages.items())
+        level = logging.INFO if total_ms >= TRACE_LOG_THRESHOLD_MS else logging.DEBUG
+        logger.log(level, f"Trace {self.correlation_id}: total={total_ms:.0f}ms {breakdown}")
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+# Traces started by the webhook, waiting for a worker to pick up their update
+_handoffs: "OrderedDict[int, tuple]" = OrderedDict()
+
+
+def correlation_id(update_id: int) -> str:
+    return f"upd-{update_id}"
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current update; also fine outside a trace"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def trace_update(update_id: int):
+    """Open the trace for an update in the current task"""
+    trace = Trace(correlation_id(update_id))
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def hand_off(update_id: int, trace: Trace):
+    """Park the webhook's trace until a worker resumes it for the same update"""
+    _handoffs[update_id] = (trace, time.perf_counter())
+    if len(_handoffs) > TRACE_MAX_PENDING:
+        _handoffs.popitem(last=False)
+
+
+def drop_hand_off(update_id: int):
+    _handoffs.pop(update_id, None)
+
+
+@contextmanager
+def resume_trace(update_id: int):
+    """Continue an update's trace in the worker task, recording its queue wait"""
+    handed_off = _handoffs.pop(update_id, None)
+    if handed_off is None:
+        trace = Trace(correlation_id(update_id))
+    else:
+        trace, parked_at = handed_off
+    token = _trace.set(trace)
+    try:
+        if handed_off is not None:
+            record_stage("queue", time.perf_counter() - parked_at)
+        yield trace
+    finally:
+        _trace.reset(token)
+        trace.finish()
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds the current update's correlation id to every log record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _trace.get()
+        record.correlation_id = trace.correlation_id if trace is not None else "-"
+        return True
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner dispatcher middleware observing each handler's latency"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+class TelegramTimingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware timing Bot API calls as the update's send stage"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await make_request(bot, method)
+            outcome = "ok"
+            return response
+        finally:
+            seconds = time.perf_counter() - started
+            TELEGRAM_SECONDS.labels(type(method).__name__, outcome).observe(seconds)
+            record_stage("send", seconds)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command latency per collection, fed by the driver's command monitoring"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else "-"
+        )
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_SECONDS.labels(collection, event.command_name, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+def observe_llm(model: str, kind: str, outcome: str, seconds: float, usage=None):
+    LLM_SECONDS.labels(model, kind, outcome).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+    record_stage("llm", seconds)
+
+
+class QueueDepthCollector:
+    """Exports queue depths read from component stats at scrape time"""
+
+    def __init__(self, sources: Dict[str, Callable[[], float]]):
+        self.sources = sources
+
+    def collect(self):
+        gauge = GaugeMetricFamily("queue_depth", "Items waiting per internal queue", labels=["queue"])
+        for name, depth in self.sources.items():
+            try:
+                gauge.add_metric([name], depth())
+            except Exception as e:
+                logger.debug(f"Queue depth for {name} unavailable: {e}")
+        yield gauge
+
+
+def register_queue_depths(sources: Dict[str, Callable[[], float]]):
+    REGISTRY.register(QueueDepthCollector(sources))
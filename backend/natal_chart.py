@@ -0,0 +1,302 @@
+"""Local natal chart engine.
+
+Planet longitudes come from a precomputed ephemeris table (built once from
+mean Keplerian elements and a truncated lunar series, then memory-mapped)
+and are linearly interpolated with NumPy, so charts for many users can be
+computed in one vectorized call without any network access.
+"""
+import os
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from geocoder import resolve_place
+
+logger = logging.getLogger(__name__)
+
+EPHEMERIS_PATH = Path(os.environ.get('EPHEMERIS_PATH', Path(__file__).parent / 'data' / 'ephemeris.npy'))
+EPHEMERIS_START_JD = 2415020.5  # 1900-01-01 00:00 UTC
+EPHEMERIS_END_JD = 2470172.5  # 2051-01-01 00:00 UTC
+EPHEMERIS_STEP_DAYS = 0.5
+J2000_JD = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+# Clocks run from 12 hours behind UTC to 14 hours ahead of it
+UTC_OFFSET_MIN = timedelta(hours=-12)
+UTC_OFFSET_MAX = timedelta(hours=14)
+
+BODIES = ["sun", "moon", "mercury", "venus", "mars", "jupiter", "saturn", "uranus", "neptune", "pluto"]
+SIGNS = ["aries", "taurus", "gemini", "cancer", "leo", "virgo",
+         "libra", "scorpio", "sagittarius", "capricorn", "aquarius", "pisces"]
+SIGN_NAMES_RU = ["Овен", "Телец", "Близнецы", "Рак", "Лев", "Дева",
+                 "Весы", "Скорпион", "Стрелец", "Козерог", "Водолей", "Рыбы"]
+BODY_NAMES_RU = {
+    "sun": "Солнце", "moon": "Луна", "mercury": "Меркурий", "venus": "Венера", "mars": "Марс",
+    "jupiter": "Юпитер", "saturn": "Сатурн", "uranus": "Уран", "neptune": "Нептун", "pluto": "Плутон",
+}
+
+# Mean orbital elements at J2000 and their rates per Julian century
+# (a [au], e, I [deg], L [deg], long. perihelion [deg], long. node [deg]),
+# valid 1800-2050 (JPL approximate positions of the major planets)
+ORBITAL_ELEMENTS = {
+    "mercury": ((0.38709927, 0.20563593, 7.00497902, 252.25032350, 77.45779628, 48.33076593),
+                (0.00000037, 0.00001906, -0.00594749, 149472.67411175, 0.16047689, -0.12534081)),
+    "venus": ((0.72333566, 0.00677672, 3.39467605, 181.97909950, 131.60246718, 76.67984255),
+              (0.00000390, -0.00004107, -0.00078890, 58517.81538729, 0.00268329, -0.27769418)),
+    "earth": ((1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0),
+              (0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0)),
+    "mars": ((1.52371034, 0.09339410, 1.84969142, -4.55343205, -23.94362959, 49.55953891),
+             (0.00001847, 0.00007882, -0.00813131, 19140.30268499, 0.44441088, -0.29257343)),
+    "jupiter": ((5.20288700, 0.04838624, 1.30439695, 34.39644051, 14.72847983, 100.47390909),
+                (-0.00011607, -0.00013253, -0.00183714, 3034.74612775, 0.21252668, 0.20469106)),
+    "saturn": ((9.53667594, 0.05386179, 2.48599187, 49.95424423, 92.59887831, 113.66242448),
+               (-0.00125060, -0.00050991, 0.00193609, 1222.49362201, -0.41897216, -0.28867794)),
+    "uranus": ((19.18916464, 0.04725744, 0.77263783, 313.23810451, 170.95427630, 74.01692503),
+               (-0.00196176, -0.00004397, -0.00242939, 428.48202785, 0.40805281, 0.04240589)),
+    "neptune": ((30.06992276, 0.00859048, 1.77004347, -55.12002969, 44.96476227, 131.78422574),
+                (0.00026291, 0.00005105, 0.00035372, 218.45945325, -0.32241464, -0.00508664)),
+    "pluto": ((39.48211675, 0.24882730, 17.14001206, 238.92903833, 224.06891629, 110.30393684),
+              (-0.00031596, 0.00005170, 0.00004818, 145.20780515, -0.04062942, -0.01183482)),
+}
+
+# Precession of the equinoxes, degrees per Julian century
+PRECESSION_PER_CENTURY = 1.396971
+
+_ephemeris = None
+_ephemeris_lock = threading.Lock()
+
+
+def _heliocentric(body: str, T: np.ndarray):
+    """Heliocentric ecliptic (J2000) coordinates of a planet"""
+    base, rate = ORBITAL_ELEMENTS[body]
+    a, e, inc, L, peri, node = (b + r * T for b, r in zip(base, rate))
+    inc, node = np.radians(inc), np.radians(node)
+    omega = np.radians(peri) - node
+    M = np.radians((L - peri) % 360.0)
+
+    E = M + e * np.sin(M)
+    for _ in range(8):
+        E = E - (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+
+    xp = a * (np.cos(E) - e)
+    yp = a * np.sqrt(1 - e * e) * np.sin(E)
+    cw, sw, cn, sn, ci = np.cos(omega), np.sin(omega), np.cos(node), np.sin(node), np.cos(inc)
+    x = (cw * cn - sw * sn * ci) * xp + (-sw * cn - cw * sn * ci) * yp
+    y = (cw * sn + sw * cn * ci) * xp + (-sw * sn + cw * cn * ci) * yp
+    return x, y
+
+
+def _moon_longitude(d: np.ndarray) -> np.ndarray:
+    """Geocentric lunar longitude of date from a truncated series (~0.3 deg)"""
+    Lp = 218.316 + 13.176396 * d
+    M = np.radians(134.963 + 13.064993 * d)
+    D = np.radians(297.850 + 12.190749 * d)
+    F = np.radians(93.272 + 13.229350 * d)
+    Ms = np.radians(357.529 + 0.98560028 * d)
+    return (Lp + 6.289 * np.sin(M) + 1.274 * np.sin(2 * D - M) + 0.658 * np.sin(2 * D)
+            + 0.214 * np.sin(2 * M) - 0.186 * np.sin(Ms) - 0.114 * np.sin(2 * F)) % 360.0
+
+
+def compute_longitudes(jd: np.ndarray) -> np.ndarray:
+    """Geocentric tropical longitudes (deg) of all BODIES, shape (len(jd), len(BODIES))"""
+    jd = np.asarray(jd, dtype=np.float64)
+    d = jd - J2000_JD
+    T = d / 36525.0
+    precession = PRECESSION_PER_CENTURY * T
+    xe, ye = _heliocentric("earth", T)
+
+    columns = []
+    for body in BODIES:
+        if body == "sun":
+            lon = np.degrees(np.arctan2(-ye, -xe)) + precession
+        elif body == "moon":
+            lon = _moon_longitude(d)
+        else:
+            x, y = _heliocentric(body, T)
+            lon = np.degrees(np.arctan2(y - ye, x - xe)) + precession
+        columns.append(lon % 360.0)
+    return np.stack(columns, axis=1)
+
+
+def build_ephemeris(path: Path = EPHEMERIS_PATH) -> Path:
+    """Precompute the ephemeris table and write it to path"""
+    jd = np.arange(EPHEMERIS_START_JD, EPHEMERIS_END_JD + EPHEMERIS_STEP_DAYS, EPHEMERIS_STEP_DAYS)
+    # Unwrapped longitudes interpolate linearly across the 360 -> 0 boundary
+    table = np.degrees(np.unwrap(np.radians(compute_longitudes(jd)), axis=0))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.npy')
+    np.save(tmp_path, table)
+    os.replace(tmp_path, path)
+    logger.info(f"Ephemeris table built: {path} ({table.shape[0]} rows)")
+    return path
+
+
+def load_ephemeris(path: Path = EPHEMERIS_PATH) -> np.ndarray:
+    """Memory-map the ephemeris table, building it on first use"""
+    global _ephemeris
+    if _ephemeris is not None:
+        return _ephemeris
+    with _ephemeris_lock:
+        if _ephemeris is None:
+            expected_rows = int(round((EPHEMERIS_END_JD - EPHEMERIS_START_JD) / EPHEMERIS_STEP_DAYS)) + 1
+            if not path.exists():
+                build_ephemeris(path)
+            table = np.load(path, mmap_mode='r')
+            if table.shape != (expected_rows, len(BODIES)):
+                logger.warning(f"Ephemeris table {path} has shape {table.shape}, rebuilding")
+                build_ephemeris(path)
+                table = np.load(path, mmap_mode='r')
+            _ephemeris = table
+    return _ephemeris
+
+
+def julian_day(dt: datetime) -> float:
+    """Julian day of an aware datetime"""
+    return dt.timestamp() / 86400.0 + UNIX_EPOCH_JD
+
+
+def interpolate_longitudes(jd: np.ndarray):
+    """Interpolated longitudes and retrograde flags for an array of Julian days"""
+    table = load_ephemeris()
+    pos = (np.asarray(jd, dtype=np.float64) - EPHEMERIS_START_JD) / EPHEMERIS_STEP_DAYS
+    if np.any(pos < 0) or np.any(pos > table.shape[0] - 1):
+        raise ValueError("Date outside ephemeris range (1900-2050)")
+    i0 = np.minimum(pos.astype(np.int64), table.shape[0] - 2)
+    frac = (pos - i0)[:, None]
+    lo, hi = table[i0], table[i0 + 1]
+    return (lo + (hi - lo) * frac) % 360.0, hi < lo
+
+
+def compute_angles(jd: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+    """Ascendant and midheaven (deg) for arrays of Julian days and coordinates"""
+    d = np.asarray(jd, dtype=np.float64) - J2000_JD
+    eps = np.radians(23.439291 - 0.0130042 * d / 36525.0)
+    ramc = np.radians((280.46061837 + 360.98564736629 * d + np.asarray(lon)) % 360.0)
+    phi = np.radians(np.asarray(lat))
+    asc = np.degrees(np.arctan2(np.cos(ramc), -(np.sin(ramc) * np.cos(eps) + np.tan(phi) * np.sin(eps))))
+    mc = np.degrees(np.arctan2(np.sin(ramc), np.cos(ramc) * np.cos(eps)))
+    return asc % 360.0, mc % 360.0
+
+
+def compute_charts(jd: np.ndarray, lat: Optional[np.ndarray] = None, lon: Optional[np.ndarray] = None) -> dict:
+    """Vectorized charts for many birth moments.
+
+    Returns arrays: ``longitudes`` (n, bodies), ``signs`` (n, bodies),
+    ``retrograde`` (n, bodies) and, when coordinates are given, ``ascendant``,
+    ``midheaven`` and equal-house ``houses`` (n, bodies).
+    """
+    jd = np.atleast_1d(np.asarray(jd, dtype=np.float64))
+    longitudes, retrograde = interpolate_longitudes(jd)
+    charts = {
+        "longitudes": longitudes,
+        "signs": (longitudes // 30).astype(np.int8),
+        "retrograde": retrograde,
+    }
+    if lat is not None and lon is not None:
+        asc, mc = compute_angles(jd, lat, lon)
+        charts["ascendant"] = asc
+        charts["midheaven"] = mc
+        charts["houses"] = (((longitudes - asc[:, None]) % 360.0) // 30 + 1).astype(np.int8)
+    return charts
+
+
+def birth_window(birth_date: str, birth_time: Optional[str], tz: Optional[str] = None) -> Tuple[datetime, datetime]:
+    """Earliest and latest UTC moments the birth data allows; equal when both time and zone are known"""
+    start = datetime.strptime(f"{birth_date.strip()} {(birth_time or '00:00').strip()}", "%Y-%m-%d %H:%M")
+    end = start if birth_time else start + timedelta(hours=23, minutes=59)
+    if tz:
+        zone = ZoneInfo(tz)
+        return start.replace(tzinfo=zone).astimezone(timezone.utc), end.replace(tzinfo=zone).astimezone(timezone.utc)
+    return (start - UTC_OFFSET_MAX).replace(tzinfo=timezone.utc), (end - UTC_OFFSET_MIN).replace(tzinfo=timezone.utc)
+
+
+def _position(longitude: float) -> dict:
+    sign = int(longitude // 30)
+    return {"sign": SIGNS[sign], "degree": round(longitude % 30, 1)}
+
+
+def natal_chart(birth_date: str, birth_time: Optional[str] = None, lat: Optional[float] = None,
+                lon: Optional[float] = None, tz: Optional[str] = None) -> dict:
+    """Structured natal chart for one birth moment.
+
+    Without a birth time or time zone the moment is only known to within a
+    window, and the chart is marked approximate: degrees, houses and angles
+    are left out, and a body's sign is only given if it holds for the whole window.
+    """
+    earliest, latest = birth_window(birth_date, birth_time, tz)
+    exact = earliest == latest
+    has_place = lat is not None and lon is not None
+    with_angles = exact and has_place
+    charts = compute_charts(np.array([julian_day(earliest), julian_day(latest)]),
+                            np.array([lat, lat]) if with_angles else None,
+                            np.array([lon, lon]) if with_angles else None)
+
+    bodies = {}
+    for i, body in enumerate(BODIES):
+        if exact:
+            position = _position(float(charts["longitudes"][0, i]))
+        elif charts["signs"][0, i] == charts["signs"][1, i]:
+            position = {"sign": SIGNS[int(charts["signs"][0, i])]}
+        else:
+            continue
+        if body not in ("sun", "moon") and charts["retrograde"][0, i] == charts["retrograde"][1, i]:
+            position["retrograde"] = bool(charts["retrograde"][0, i])
+        if with_angles:
+            position["house"] = int(charts["houses"][0, i])
+        bodies[body] = position
+
+    chart = {"bodies": bodies, "time_known": bool(birth_time), "place_known": has_place, "approximate": not exact}
+    if with_angles:
+        asc = float(charts["ascendant"][0])
+        chart["ascendant"] = _position(asc)
+        chart["midheaven"] = _position(float(charts["midheaven"][0]))
+        chart["houses"] = [SIGNS[int(((asc + 30 * i) % 360.0) // 30)] for i in range(12)]
+    return chart
+
+
+def chart_for_user(user_doc: dict) -> Optional[dict]:
+    """Natal chart from a user document, or None if birth data is missing or invalid"""
+    if not user_doc.get('birth_date'):
+        return None
+    lat, lon, tz = user_doc.get('birth_lat'), user_doc.get('birth_lon'), user_doc.get('birth_tz')
+    if not tz and user_doc.get('birth_place'):
+        # Profiles saved before birth places were resolved
+        place = resolve_place(user_doc['birth_place'])
+        if place is not None:
+            lat, lon, tz = place.lat, place.lon, place.timezone
+    try:
+        return natal_chart(user_doc['birth_date'], user_doc.get('birth_time'), lat, lon, tz)
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Cannot compute natal chart for {user_doc.get('telegram_id')}: {e}")
+        return None
+
+
+def format_chart(chart: dict) -> str:
+    """Render a chart as prompt lines in Russian"""
+    lines = []
+    if chart.get("approximate"):
+        lines.append("Время или часовой пояс рождения неизвестны: указаны только знаки, "
+                     "верные при любом возможном моменте рождения; градусы, дома и асцендент не рассчитаны")
+    for body, position in chart["bodies"].items():
+        line = f"{BODY_NAMES_RU[body]}: {SIGN_NAMES_RU[SIGNS.index(position['sign'])]}"
+        if "degree" in position:
+            line += f" {position['degree']}°"
+        if "house" in position:
+            line += f", {position['house']} дом"
+        if position.get("retrograde"):
+            line += " (ретроградный)"
+        lines.append(line)
+    if "ascendant" in chart:
+        for key, name in (("ascendant", "Асцендент"), ("midheaven", "MC")):
+            position = chart[key]
+            lines.append(f"{name}: {SIGN_NAMES_RU[SIGNS.index(position['sign'])]} {position['degree']}°")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_ephemeris()
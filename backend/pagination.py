@@ -0,0 +1,47 @@
+import os
+import json
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', '20'))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', '100'))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, doc_id: str) -> str:
+    """Opaque cursor for the (timestamp, id) position of the last returned item"""
+    payload = json.dumps([timestamp.isoformat(), doc_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), str(doc_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_filter(cursor: str, time_field: str) -> dict:
+    """Filter selecting items after the cursor in (time_field desc, id desc) order"""
+    timestamp, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {time_field: {"$lt": timestamp}},
+        {time_field: timestamp, "id": {"$lt": doc_id}},
+    ]}
+
+
+def keyset_sort(time_field: str) -> list:
+    return [(time_field, -1), ("id", -1)]
+
+
+def split_page(items: list, limit: int, time_field: str) -> Tuple[list, Optional[str]]:
+    """Trim a limit + 1 fetch to one page and return it with the next cursor"""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor(last[time_field], last["id"])
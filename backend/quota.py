@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def is_subscribed(user_doc: dict, now: Optional[datetime] = None) -> bool:
+    """Whether the subscription is paid up; Mongo hands back naive UTC datetimes"""
+    subscription_end = user_doc.get("subscription_end")
+    if not user_doc.get("subscription_active") or not subscription_end:
+        return False
+    if isinstance(subscription_end, str):
+        subscription_end = datetime.fromisoformat(subscription_end.replace("Z", "+00:00"))
+    if subscription_end.tzinfo is None:
+        subscription_end = subscription_end.replace(tzinfo=timezone.utc)
+    return subscription_end > (now or datetime.now(timezone.utc))
+
+
+def has_readings_left(user_doc: dict, now: Optional[datetime] = None) -> bool:
+    """Whether the user can still spend a reading: an active subscription or free readings left"""
+    return is_subscribed(user_doc, now) or user_doc.get("free_readings_left", 0) > 0
+
+
+def reserve_query(telegram_id: int, now: datetime) -> dict:
+    """Matches the user only if has_readings_left() holds for them"""
+    return {"telegram_id": telegram_id, "$or": [
+        {"subscription_active": True, "subscription_end": {"$gt": now}},
+        {"free_readings_left": {"$gt": 0}}
+    ]}
+
+
+def reserve_update(now: datetime) -> list:
+    """Charges a free reading unless is_subscribed() holds, as one pipeline update"""
+    subscribed = {"$and": [
+        {"$eq": ["$subscription_active", True]},
+        {"$gt": ["$subscription_end", now]}
+    ]}
+    return [{"$set": {"free_readings_left": {"$cond": [
+        subscribed,
+        "$free_readings_left",
+        {"$subtract": ["$free_readings_left", 1]}
+    ]}}}]
+
+
+REFUND_UPDATE = {"$inc": {"free_readings_left": 1}}
@@ -0,0 +1,194 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Rate limit configuration: sustained rate (tokens per second) and burst size
+RATE_LIMIT_FREE_RATE = float(os.environ.get('RATE_LIMIT_FREE_RATE', '0.2'))
+RATE_LIMIT_FREE_BURST = float(os.environ.get('RATE_LIMIT_FREE_BURST', '5'))
+RATE_LIMIT_PREMIUM_RATE = float(os.environ.get('RATE_LIMIT_PREMIUM_RATE', '0.5'))
+RATE_LIMIT_PREMIUM_BURST = float(os.environ.get('RATE_LIMIT_PREMIUM_BURST', '10'))
+RATE_LIMIT_GLOBAL_RATE = float(os.environ.get('RATE_LIMIT_GLOBAL_RATE', '200'))
+RATE_LIMIT_GLOBAL_BURST = float(os.environ.get('RATE_LIMIT_GLOBAL_BURST', '400'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_NOTICE_INTERVAL = float(os.environ.get('RATE_LIMIT_NOTICE_INTERVAL', '30'))
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+
+RATE_LIMITED_TEXT = "⏳ Звезды просят немного терпения. Пожалуйста, подождите перед следующим запросом."
+
+TIERS = {
+    "free": (RATE_LIMIT_FREE_RATE, RATE_LIMIT_FREE_BURST),
+    "premium": (RATE_LIMIT_PREMIUM_RATE, RATE_LIMIT_PREMIUM_BURST),
+}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available"""
+        # A bucket created during this check can be newer than `now`
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float("inf")
+
+
+class MongoTokenBucketStore:
+    """Token buckets shared across processes, one atomic update per check"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$divide": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, 1000]}, rate]}
+        ]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"refilled": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$refilled", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$refilled", 1]}, {"$subtract": ["$refilled", 1]}, "$refilled"]},
+                    "updated": now,
+                }},
+                {"$unset": "refilled"},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return 0.0
+        return (1 - doc["tokens"]) / rate if rate else float("inf")
+
+    async def ensure_indexes(self, ttl_seconds: int = 3600):
+        await self.collection.create_index("updated", expireAfterSeconds=ttl_seconds)
+
+
+class RateLimiter:
+    """Per-key and global token buckets kept in memory.
+
+    Buckets for idle keys are evicted LRU-first once max_keys is reached;
+    an evicted key simply starts again with a full bucket. With a shared
+    store, per-key buckets live there and only the global bucket stays local.
+    """
+
+    def __init__(self, tiers: Dict[str, Tuple[float, float]] = TIERS,
+                 global_rate: float = RATE_LIMIT_GLOBAL_RATE, global_burst: float = RATE_LIMIT_GLOBAL_BURST,
+                 max_keys: int = RATE_LIMIT_MAX_KEYS, store: Optional[MongoTokenBucketStore] = None):
+        self.tiers = tiers
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_keys = max_keys
+        self.store = store
+        self._buckets = OrderedDict()
+        self._notified = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _bucket(self, key: str, tier: str) -> TokenBucket:
+        rate, capacity = self.tiers[tier]
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate, capacity)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        return bucket
+
+    async def check(self, key: str, tier: str = "free") -> float:
+        """Return 0 if the request may proceed, else the suggested retry delay in seconds"""
+        now = time.monotonic()
+        if self.store is not None:
+            rate, capacity = self.tiers[tier]
+            wait = await self.store.take(f"{tier}:{key}", rate, capacity)
+        else:
+            wait = self._bucket(key, tier).take(now)
+        if not wait:
+            wait = self.global_bucket.take(now)
+        if wait:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def should_notify(self, key: str, interval: float = RATE_LIMIT_NOTICE_INTERVAL) -> bool:
+        """Whether to tell a limited user about it; at most once per interval"""
+        now = time.monotonic()
+        last = self._notified.get(key)
+        if last is not None and now - last < interval:
+            return False
+        self._notified[key] = now
+        self._notified.move_to_end(key)
+        if len(self._notified) > self.max_keys:
+            self._notified.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "tracked_keys": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "global_tokens": round(self.global_bucket.tokens, 2),
+        }
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Reject updates over the limit before handlers touch Mongo or the LLM"""
+
+    def __init__(self, limiter: RateLimiter, tier_of: Callable[[int], str]):
+        self.limiter = limiter
+        self.tier_of = tier_of
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+        # Payments must always go through
+        if isinstance(event, Message) and event.successful_payment:
+            return await handler(event, data)
+
+        if not await self.limiter.check(str(user.id), self.tier_of(user.id)):
+            return await handler(event, data)
+
+        logger.info(f"Rate limited user {user.id}")
+        if isinstance(event, CallbackQuery):
+            await event.answer(RATE_LIMITED_TEXT)
+        elif isinstance(event, Message) and self.limiter.should_notify(str(user.id)):
+            await event.answer(RATE_LIMITED_TEXT)
+        return None
+
+
+def create_rate_limiter(db) -> RateLimiter:
+    """Build the rate limiter selected by RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == 'mongo':
+        return RateLimiter(store=MongoTokenBucketStore(db.rate_limits))
+    if RATE_LIMIT_BACKEND == 'memory':
+        return RateLimiter()
+    raise ValueError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
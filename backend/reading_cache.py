@@ -0,0 +1,262 @@
+import os
+import re
+import random
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Reading cache configuration
+READING_CACHE_ENABLED = os.environ.get('READING_CACHE_ENABLED', 'true').lower() == 'true'
+READING_CACHE_TTL = float(os.environ.get('READING_CACHE_TTL', str(6 * 60 * 60)))
+READING_CACHE_VARIANTS = int(os.environ.get('READING_CACHE_VARIANTS', '3'))
+READING_CACHE_MAX_KEYS = int(os.environ.get('READING_CACHE_MAX_KEYS', '20000'))
+READING_CACHE_BUCKET_HOURS = int(os.environ.get('READING_CACHE_BUCKET_HOURS', '24'))
+READING_CACHE_SIMILARITY = os.environ.get('READING_CACHE_SIMILARITY', 'false').lower() == 'true'
+READING_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get('READING_CACHE_SIMILARITY_THRESHOLD', '0.85'))
+
+EMBEDDING_DIM = 512
+MONTHS_GENITIVE = ("января", "февраля", "марта", "апреля", "мая", "июня",
+                   "июля", "августа", "сентября", "октября", "ноября", "декабря")
+
+# (last day, sign) per month: a date belongs to the first sign whose last day it does not exceed
+ZODIAC_BOUNDARIES = {
+    1: ((19, "capricorn"), (31, "aquarius")),
+    2: ((18, "aquarius"), (29, "pisces")),
+    3: ((20, "pisces"), (31, "aries")),
+    4: ((19, "aries"), (30, "taurus")),
+    5: ((20, "taurus"), (31, "gemini")),
+    6: ((20, "gemini"), (30, "cancer")),
+    7: ((22, "cancer"), (31, "leo")),
+    8: ((22, "leo"), (31, "virgo")),
+    9: ((22, "virgo"), (30, "libra")),
+    10: ((22, "libra"), (31, "scorpio")),
+    11: ((21, "scorpio"), (30, "sagittarius")),
+    12: ((21, "sagittarius"), (31, "capricorn")),
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]+", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Russian names decline by their ending: Анна, Анне, Анну, Анной
+_NAME_ENDINGS = "аяйьео"
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = question.lower().replace("ё", "е")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def sun_sign(birth_date: Optional[str]) -> Optional[str]:
+    """Tropical sun sign for a YYYY-MM-DD birth date"""
+    if not birth_date:
+        return None
+    try:
+        date = datetime.strptime(birth_date.strip(), "%Y-%m-%d")
+    except ValueError:
+        return None
+    for last_day, sign in ZODIAC_BOUNDARIES[date.month]:
+        if date.day <= last_day:
+            return sign
+    return None
+
+
+def name_pattern(name: str) -> Optional[re.Pattern]:
+    """Matches a first name and its declined forms, or None for names too short to match safely"""
+    stem = name[:-1] if name[-1:].lower() in _NAME_ENDINGS else name
+    if len(stem) < 3:
+        return re.compile(rf"\b{re.escape(name)}\b") if len(name) > 1 else None
+    return re.compile(rf"\b{re.escape(stem)}\w{{0,3}}\b", re.IGNORECASE)
+
+
+def personal_patterns(user_doc: dict) -> List[re.Pattern]:
+    """Patterns for the user's name and birth details, which must never reach another user"""
+    words = _WORD.findall(f"{user_doc.get('first_name') or ''} {user_doc.get('birth_place') or ''}")
+    patterns = [pattern for pattern in map(name_pattern, words) if pattern is not None]
+    try:
+        date = datetime.strptime((user_doc.get('birth_date') or "").strip(), "%Y-%m-%d")
+        patterns += [
+            re.compile(rf"\b{date.year}\b"),
+            re.compile(rf"\b0?{date.day}\s+{MONTHS_GENITIVE[date.month - 1]}\b", re.IGNORECASE),
+            re.compile(rf"\b0?{date.day}\.0?{date.month}\b"),
+        ]
+    except ValueError:
+        pass
+    birth_time = (user_doc.get('birth_time') or "").strip()
+    if birth_time:
+        patterns.append(re.compile(rf"\b0?{re.escape(birth_time.lstrip('0') or birth_time)}\b"))
+    return patterns
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed character-trigram embedding, L2-normalized"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    padded = f" {text} "
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Variant:
+    __slots__ = ("text", "seen")
+
+    def __init__(self, text: str, telegram_id):
+        self.text = text
+        # Users who generated or were served this variant
+        self.seen = {telegram_id}
+
+
+class _Entry:
+    __slots__ = ("expires_at", "variants", "vector")
+
+    def __init__(self, expires_at: float, vector: Optional[np.ndarray]):
+        self.expires_at = expires_at
+        self.variants = []
+        self.vector = vector
+
+
+class ReadingCache:
+    """Cache of generated readings keyed by normalized question, sun sign and a time bucket.
+
+    Each key holds a pool of up to ``variants`` readings; until the pool is
+    full lookups miss so that new variants get generated, afterwards a
+    variant the user has not seen yet is served. Readings that mention the
+    user's name or birth details are personal and never stored.
+    """
+
+    def __init__(
+        self,
+        ttl: float = READING_CACHE_TTL,
+        variants: int = READING_CACHE_VARIANTS,
+        max_keys: int = READING_CACHE_MAX_KEYS,
+        bucket_hours: int = READING_CACHE_BUCKET_HOURS,
+        similarity: bool = READING_CACHE_SIMILARITY,
+        similarity_threshold: float = READING_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.ttl = ttl
+        self.variants = variants
+        self.max_keys = max_keys
+        self.bucket_hours = bucket_hours
+        self.similarity = similarity
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._groups = {}
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.personal_skips = 0
+
+    def _group(self, user_doc: dict) -> str:
+        bucket = int(datetime.now(timezone.utc).timestamp() // (self.bucket_hours * 3600))
+        return f"{sun_sign(user_doc.get('birth_date')) or 'unknown'}:{bucket}"
+
+    def make_key(self, user_doc: dict, question: str) -> Tuple[str, str]:
+        """(group, normalized question) cache key"""
+        return self._group(user_doc), normalize_question(question)
+
+    def _live(self, key: Tuple[str, str]) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        return entry
+
+    def _drop(self, key: Tuple[str, str]):
+        self._entries.pop(key, None)
+        keys = self._groups.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[key[0]]
+
+    def _similar(self, key: Tuple[str, str]) -> Optional[_Entry]:
+        candidates = [k for k in self._groups.get(key[0], ()) if k != key]
+        if not candidates:
+            return None
+        query = embed(key[1])
+        best_key, best_score = None, self.similarity_threshold
+        for candidate in candidates:
+            entry = self._live(candidate)
+            if entry is None or len(entry.variants) < self.variants:
+                continue
+            score = float(np.dot(query, entry.vector))
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return self._entries.get(best_key) if best_key else None
+
+    @staticmethod
+    def _unseen(entry: _Entry, telegram_id) -> List[_Variant]:
+        return [variant for variant in entry.variants if telegram_id not in variant.seen]
+
+    def _serve(self, variants: List[_Variant], telegram_id) -> str:
+        variant = random.choice(variants)
+        variant.seen.add(telegram_id)
+        return variant.text
+
+    def get(self, user_doc: dict, question: str) -> Optional[str]:
+        """Return a cached reading the user has not seen, or None if a new one should be generated"""
+        key = self.make_key(user_doc, question)
+        telegram_id = user_doc.get('telegram_id')
+        entry = self._live(key)
+        if entry is not None and len(entry.variants) >= self.variants:
+            unseen = self._unseen(entry, telegram_id)
+            if unseen:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._serve(unseen, telegram_id)
+
+        if self.similarity and entry is None:
+            similar = self._similar(key)
+            unseen = self._unseen(similar, telegram_id) if similar is not None else None
+            if unseen:
+                self.similar_hits += 1
+                return self._serve(unseen, telegram_id)
+
+        self.misses += 1
+        return None
+
+    def put(self, user_doc: dict, question: str, reading: str):
+        """Add a generated reading to the variant pool for its key, unless it is personal"""
+        if any(pattern.search(reading) for pattern in personal_patterns(user_doc)):
+            self.personal_skips += 1
+            return
+        key = self.make_key(user_doc, question)
+        entry = self._live(key)
+        if entry is None:
+            vector = embed(key[1]) if self.similarity else None
+            entry = _Entry(time.monotonic() + self.ttl, vector)
+            self._entries[key] = entry
+            self._groups.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_keys:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        if len(entry.variants) >= self.variants:
+            return
+        entry.variants.append(_Variant(reading, user_doc.get('telegram_id')))
+        self._entries.move_to_end(key)
+        self.stores += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._groups.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "keys": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "personal_skips": self.personal_skips,
+        }
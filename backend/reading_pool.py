@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional, Tuple
+
+from quota import has_readings_left
+from reading_schema import BIRTH_SNAPSHOT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Next-reading pool configuration
+READING_POOL_ENABLED = os.environ.get('READING_POOL_ENABLED', 'true').lower() == 'true'
+READING_POOL_DEPTH = int(os.environ.get('READING_POOL_DEPTH', '1'))
+READING_POOL_TTL = float(os.environ.get('READING_POOL_TTL', str(6 * 60 * 60)))
+READING_POOL_MAX_USERS = int(os.environ.get('READING_POOL_MAX_USERS', '10000'))
+READING_POOL_WORKERS = int(os.environ.get('READING_POOL_WORKERS', '2'))
+# Pre-generate only while fewer LLM calls than this are in flight
+READING_POOL_MAX_IN_FLIGHT = int(os.environ.get('READING_POOL_MAX_IN_FLIGHT', '8'))
+READING_POOL_IDLE_POLL = float(os.environ.get('READING_POOL_IDLE_POLL', '1'))
+
+
+def reading_inputs(user_doc: dict) -> Tuple:
+    """Everything a general reading depends on; a change makes pooled readings stale"""
+    return (user_doc.get("first_name"), *(user_doc.get(field) for field in BIRTH_SNAPSHOT_FIELDS))
+
+
+def wants_pool(user_doc: Optional[dict]) -> bool:
+    """Pre-generate only for users with birth data who can spend the result"""
+    return bool(user_doc and user_doc.get("birth_date") and has_readings_left(user_doc))
+
+
+class ReadingPool:
+    """Small per-user pools of ready general readings, refilled in the background.
+
+    Only users who ask for general readings, have birth data and can still
+    spend a reading get a pool; each holds up to `depth` readings for `ttl` seconds, and the least
+    recently used pools are dropped beyond max_users. Refills wait until
+    is_idle() reports spare capacity, so pre-generation never competes with
+    readings users are waiting for.
+    """
+
+    def __init__(self, generate: Callable[[dict], Awaitable[str]],
+                 load_user: Callable[[int], Awaitable[Optional[dict]]],
+                 is_idle: Callable[[], bool] = lambda: True,
+                 depth: int = READING_POOL_DEPTH, ttl: float = READING_POOL_TTL,
+                 max_users: int = READING_POOL_MAX_USERS, workers: int = READING_POOL_WORKERS):
+        self.generate = generate
+        self.load_user = load_user
+        self.is_idle = is_idle
+        self.depth = depth
+        self.ttl = ttl
+        self.max_users = max_users
+        self.workers = workers
+        self._pools = OrderedDict()
+        self._refills = asyncio.Queue()
+        self._requested = set()
+        self._tasks = []
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.discarded = 0
+
+    def take(self, user_doc: dict) -> Optional[str]:
+        """Pop a ready reading for the user, if a fresh one matches their current data"""
+        telegram_id = user_doc["telegram_id"]
+        entry = self._pools.get(telegram_id)
+        if entry is not None:
+            inputs, readings = entry
+            now = time.monotonic()
+            while readings and readings[0][0] < now:
+                readings.popleft()
+                self.discarded += 1
+            if readings and inputs == reading_inputs(user_doc):
+                self.hits += 1
+                return readings.popleft()[1]
+        self.misses += 1
+        return None
+
+    def request(self, user_doc: dict):
+        """Queue a background refill for a user who just asked for a general reading"""
+        if not wants_pool(user_doc):
+            return
+        telegram_id = user_doc["telegram_id"]
+        if telegram_id in self._requested:
+            return
+        self._requested.add(telegram_id)
+        self._refills.put_nowait(telegram_id)
+
+    def invalidate(self, telegram_id: int):
+        self._pools.pop(telegram_id, None)
+
+    def _store(self, user_doc: dict, reading: str):
+        telegram_id = user_doc["telegram_id"]
+        inputs = reading_inputs(user_doc)
+        entry = self._pools.get(telegram_id)
+        if entry is None or entry[0] != inputs:
+            entry = self._pools[telegram_id] = (inputs, deque())
+        entry[1].append((time.monotonic() + self.ttl, reading))
+        self._pools.move_to_end(telegram_id)
+        if len(self._pools) > self.max_users:
+            self._pools.popitem(last=False)
+
+    def _missing(self, user_doc: dict) -> int:
+        entry = self._pools.get(user_doc["telegram_id"])
+        if entry is None or entry[0] != reading_inputs(user_doc):
+            return self.depth
+        return self.depth - len(entry[1])
+
+    async def _worker(self):
+        while True:
+            telegram_id = await self._refills.get()
+            try:
+                while not self.is_idle():
+                    await asyncio.sleep(READING_POOL_IDLE_POLL)
+                user_doc = await self.load_user(telegram_id)
+                while wants_pool(user_doc) and self._missing(user_doc) > 0:
+                    reading = await self.generate(user_doc)
+                    # Birth data may have changed while generating
+                    current = await self.load_user(telegram_id)
+                    if current and reading_inputs(current) == reading_inputs(user_doc):
+                        self._store(user_doc, reading)
+                        self.generated += 1
+                    user_doc = current
+            except Exception as e:
+                logger.warning(f"Reading pre-generation failed for {telegram_id}: {e}")
+            finally:
+                self._requested.discard(telegram_id)
+                self._refills.task_done()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._pools),
+            "ready": sum(len(readings) for _, readings in self._pools.values()),
+            "pending_refills": self._refills.qsize(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "discarded": self.discarded,
+        }
@@ -0,0 +1,111 @@
+import os
+import asyncio
+import logging
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Birth fields kept on each reading; everything else stays on the user document
+BIRTH_SNAPSHOT_FIELDS = ("birth_date", "birth_time", "birth_place", "birth_lat", "birth_lon", "birth_tz")
+
+# Projection for the readings read path, also compacts unmigrated documents
+READING_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "user_id": 1,
+    "telegram_id": 1,
+    "question": 1,
+    "reading": 1,
+    "created_at": 1,
+    **{f"birth_data.{field}": 1 for field in BIRTH_SNAPSHOT_FIELDS},
+}
+
+# Fields clients may request from the readings list
+READING_FIELDS = ("id", "user_id", "telegram_id", "question", "reading", "birth_data", "created_at")
+READING_PREVIEW_CHARS = int(os.environ.get('READING_PREVIEW_CHARS', '200'))
+
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+MIGRATION_PAUSE = float(os.environ.get('MIGRATION_PAUSE', '0.05'))
+
+
+def birth_snapshot(user_doc: Optional[dict]) -> Optional[dict]:
+    """Compact birth-data snapshot of a user document"""
+    if not user_doc:
+        return None
+    snapshot = {field: user_doc[field] for field in BIRTH_SNAPSHOT_FIELDS if user_doc.get(field) is not None}
+    return snapshot or None
+
+
+def reading_projection(fields: Optional[List[str]] = None, preview: bool = False) -> dict:
+    """Projection for the readings list; id and created_at are always kept for the cursor"""
+    if fields:
+        unknown = set(fields) - set(READING_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection = {"_id": 0, "id": 1, "created_at": 1}
+        for field in fields:
+            if field == "birth_data":
+                projection.update({f"birth_data.{f}": 1 for f in BIRTH_SNAPSHOT_FIELDS})
+            else:
+                projection[field] = 1
+    else:
+        projection = dict(READING_PROJECTION)
+    if preview and "reading" in projection:
+        # Truncate server-side so full texts never leave the database
+        projection["reading"] = {"$substrCP": ["$reading", 0, READING_PREVIEW_CHARS]}
+        projection["truncated"] = {"$gt": [{"$strLenCP": "$reading"}, READING_PREVIEW_CHARS]}
+    return projection
+
+
+async def migrate_readings(db, batch_size: int = MIGRATION_BATCH_SIZE, pause: float = MIGRATION_PAUSE) -> int:
+    """Rewrite readings that embed a full user document, in _id order.
+
+    Safe to run while the bot is serving traffic and to resume after an
+    interruption: migrated documents no longer match the filter.
+    """
+    legacy = {"$or": [
+        {"birth_data._id": {"$exists": True}},
+        {"birth_data.telegram_id": {"$exists": True}},
+    ]}
+    migrated = 0
+    last_id = None
+    while True:
+        query = dict(legacy)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.readings.find(query, {"birth_data": 1}).sort("_id", 1).to_list(batch_size)
+        if not batch:
+            break
+
+        await db.readings.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": {"birth_data": birth_snapshot(doc.get("birth_data"))}})
+             for doc in batch],
+            ordered=False
+        )
+        migrated += len(batch)
+        last_id = batch[-1]["_id"]
+        logger.info(f"Migrated {migrated} readings")
+        # Leave room for foreground traffic between batches
+        await asyncio.sleep(pause)
+    return migrated
+
+
+async def main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        migrated = await migrate_readings(client[os.environ['DB_NAME']])
+        logger.info(f"Readings migration finished: {migrated} documents rewritten")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
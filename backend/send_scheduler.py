@@ -0,0 +1,227 @@
+import os
+import heapq
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendInvoice, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+logger = logging.getLogger(__name__)
+
+# Outbound limits, the global one a little under Telegram's, see https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+SEND_GLOBAL_LIMIT = int(os.environ.get('SEND_GLOBAL_LIMIT', '25'))
+SEND_GLOBAL_PERIOD = float(os.environ.get('SEND_GLOBAL_PERIOD', '1'))
+SEND_CHAT_LIMIT = int(os.environ.get('SEND_CHAT_LIMIT', '3'))
+SEND_CHAT_PERIOD = float(os.environ.get('SEND_CHAT_PERIOD', '3'))
+SEND_GROUP_LIMIT = int(os.environ.get('SEND_GROUP_LIMIT', '20'))
+SEND_GROUP_PERIOD = float(os.environ.get('SEND_GROUP_PERIOD', '60'))
+# Sends arrive at Telegram a little later than we grant them, unevenly
+SEND_JITTER_MARGIN = float(os.environ.get('SEND_JITTER_MARGIN', '0.1'))
+SEND_MAX_RETRIES = int(os.environ.get('SEND_MAX_RETRIES', '3'))
+SEND_MAX_CHATS = int(os.environ.get('SEND_MAX_CHATS', '100000'))
+
+# Priority lanes, lower is sent first
+LANE_PAYMENT = 0
+LANE_INTERACTIVE = 1
+LANE_READING = 2
+LANE_BROADCAST = 3
+LANES = {LANE_PAYMENT: "payment", LANE_INTERACTIVE: "interactive", LANE_READING: "reading", LANE_BROADCAST: "broadcast"}
+
+_lane: ContextVar[int] = ContextVar("send_lane", default=LANE_INTERACTIVE)
+
+
+@contextmanager
+def send_lane(lane: int):
+    """Send every Bot API call made inside the block through the given lane"""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class SendWindow:
+    """At most `limit` sends per `period` seconds, measured on actual send times"""
+
+    __slots__ = ("limit", "period", "sends", "blocked_until", "lock")
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.sends = deque(maxlen=limit)
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def delay(self, now: float) -> float:
+        """Seconds until the next send fits in the window"""
+        at = max(now, self.blocked_until)
+        if len(self.sends) == self.limit:
+            at = max(at, self.sends[0] + self.period)
+        return at - now
+
+    def record(self, now: float):
+        self.sends.append(now)
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now: float) -> bool:
+        return not self.lock.locked() and not self.delay(now) and (not self.sends or self.sends[-1] + self.period <= now)
+
+
+class SendScheduler:
+    """Paces outbound sends per chat and globally, highest priority lane first.
+
+    Sends to one chat go out one at a time and in order. Each waits for
+    its chat's window on its own, so one busy chat never holds up others,
+    then joins a priority heap drained at the global rate.
+    """
+
+    def __init__(self, global_limit: int = SEND_GLOBAL_LIMIT, global_period: float = SEND_GLOBAL_PERIOD,
+                 chat_limit: int = SEND_CHAT_LIMIT, chat_period: float = SEND_CHAT_PERIOD,
+                 group_limit: int = SEND_GROUP_LIMIT, group_period: float = SEND_GROUP_PERIOD,
+                 max_chats: int = SEND_MAX_CHATS):
+        # Spread global sends evenly; a full burst per period lands in a shorter span
+        self.global_window = SendWindow(1, global_period / global_limit)
+        self.chat_window = (chat_limit, chat_period + SEND_JITTER_MARGIN)
+        self.group_window = (group_limit, group_period + SEND_JITTER_MARGIN)
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+        self._heap = []
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.pacing = 0
+        self.sent = {name: 0 for name in LANES.values()}
+        self.flood_waits = 0
+        self.max_depth = 0
+
+    def _window(self, chat_id) -> SendWindow:
+        window = self._chats.get(chat_id)
+        if window is None:
+            # Negative ids and @usernames are groups and channels
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            window = self._chats[chat_id] = SendWindow(*(self.group_window if is_group else self.chat_window))
+            if len(self._chats) > self.max_chats:
+                self._evict()
+        self._chats.move_to_end(chat_id)
+        return window
+
+    def _evict(self):
+        # Forget the least recently used chat whose window has fully elapsed
+        now = time.monotonic()
+        for chat_id, window in self._chats.items():
+            if window.idle(now):
+                del self._chats[chat_id]
+                return
+
+    async def acquire(self, chat_id, lane: int = LANE_INTERACTIVE):
+        """Wait until a send to chat_id may go out"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        window = self._window(chat_id)
+        async with window.lock:
+            delay = window.delay(time.monotonic())
+            if delay > 0:
+                self.pacing += 1
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self.pacing -= 1
+
+            granted = asyncio.get_running_loop().create_future()
+            self._seq += 1
+            heapq.heappush(self._heap, (lane, self._seq, granted))
+            self.max_depth = max(self.max_depth, len(self._heap))
+            self._wakeup.set()
+            await granted
+            window.record(time.monotonic())
+        self.sent[LANES[lane]] += 1
+
+    async def _drain(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.global_window.delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            # Whatever is most urgent now gets the slot, including late arrivals
+            while self._heap:
+                _, _, granted = heapq.heappop(self._heap)
+                if not granted.done():
+                    granted.set_result(None)
+                    self.global_window.record(time.monotonic())
+                    break
+
+    def flood_wait(self, chat_id, retry_after: float):
+        """Hold back a chat after Telegram asked us to wait"""
+        self.flood_waits += 1
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self.global_window.block(until)
+        else:
+            self._window(chat_id).block(until)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in LANES.values()}
+        for lane, _, granted in self._heap:
+            if not granted.done():
+                queued[LANES[lane]] += 1
+        return {
+            "queued": queued,
+            "depth": sum(queued.values()),
+            "max_depth": self.max_depth,
+            "pacing": self.pacing,
+            "tracked_chats": len(self._chats),
+            "sent": dict(self.sent),
+            "flood_waits": self.flood_waits,
+        }
+
+
+class SendSchedulerMiddleware(BaseRequestMiddleware):
+    """Bot session middleware routing every chat-bound API call through the scheduler.
+
+    Calls without a chat (callback answers, pre-checkout answers, webhook
+    management) are time-critical or rare and go straight through.
+    """
+
+    def __init__(self, scheduler: SendScheduler, max_retries: int = SEND_MAX_RETRIES):
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        lane = LANE_PAYMENT if isinstance(method, SendInvoice) else _lane.get()
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(chat_id, lane)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Flood wait {e.retry_after}s on {type(method).__name__} to chat {chat_id}")
+                self.scheduler.flood_wait(chat_id, e.retry_after)
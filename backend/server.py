@@ -1,29 +1,75 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request, Response, Query, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import json
+import math
+import time
 import logging
+import secrets
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import asyncio
 import aiohttp
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
 from aiogram.filters import Command, CommandStart
-from aiogram.types import WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton, LabeledPrice
+from aiogram.methods import AnswerCallbackQuery, AnswerPreCheckoutQuery, EditMessageText, SendInvoice, SendMessage
+from aiogram.methods.base import Response as BotAPIResponse
+from aiogram.types import InlineKeyboardMarkup, LabeledPrice
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
-import openai
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Local modules read their configuration from the environment at import time
+from llm_client import LLMClient
+from llm_resilience import ResilientLLM
+from update_queue import QueueFullError, UpdateWorkerPool, create_update_queue
+from cluster import LeaderElection
+from update_dedup import UpdateDeduplicator
+from db_indexes import bootstrap_indexes
+from user_cache import UserCache
+from quota import REFUND_UPDATE, is_subscribed, reserve_query, reserve_update
+from reading_cache import READING_CACHE_ENABLED, ReadingCache, normalize_question
+from natal_chart import chart_for_user, format_chart, load_ephemeris
+from geocoder import Place, get_place_index, resolve_place
+from webapp_auth import INIT_DATA_HEADER, InitDataError, verify_init_data
+from reading_schema import birth_snapshot, reading_projection
+from rate_limit import RateLimitMiddleware, create_rate_limiter
+from user_locks import KeyedSerializer, UpdateTurns, UserBusyError, yield_turn
+from reading_pool import READING_POOL_ENABLED, READING_POOL_MAX_IN_FLIGHT, ReadingPool
+from broadcast import BROADCAST_ENABLED, DailyBroadcast, run_daily
+from subscriptions import SUBSCRIPTION_SWEEP_ENABLED, SubscriptionSweeper
+from send_scheduler import LANE_PAYMENT, LANE_READING, SendScheduler, SendSchedulerMiddleware, send_lane
+from metrics import (
+    FEED_UPDATE_SECONDS, WEBHOOK_SECONDS, CorrelationIdFilter, HandlerTimingMiddleware, MongoCommandMetrics,
+    TelegramTimingMiddleware, drop_hand_off, hand_off, register_queue_depths, resume_trace, stage, trace_update
+)
+from loop_monitor import LOOP_MONITOR_ENABLED, LoopMonitor
+from pagination import NEXT_CURSOR_HEADER, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, keyset_filter, keyset_sort, split_page
+from bot_assets import (
+    BIRTH_DATA_INSTRUCTIONS, BIRTH_DATA_SAVED_TEXT, BIRTH_INFO, BIRTH_PLACE_UNKNOWN_TEXT, CHART_INFO,
+    FREE_READINGS_STATUS, INVOICE_ERROR_TEXT, NO_BIRTH_INFO, NO_READINGS_SHORT_TEXT, NO_READINGS_TEXT, PAYMENT_ERROR_TEXT,
+    PAYMENT_SUCCESS_TEXT, PERSONAL_READING_TITLE, READING_IN_PROGRESS_TEXT, READING_TITLE, START_FIRST_TEXT,
+    SUBSCRIPTION_ACTIVE_STATUS, SUBSCRIPTION_ALREADY_ACTIVE_TEXT, SUBSCRIPTION_OFFER_TEXT,
+    USER_NOT_FOUND_TEXT, WELCOME_TEXT, build_keyboards, reading_messages
+)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Telegram Bot Setup
@@ -31,19 +77,73 @@ BOT_TOKEN = os.environ.get('BOT_TOKEN')
 WEBHOOK_PATH = "/webhook/telegram"
 WEBAPP_URL = os.environ.get('WEBAPP_URL', 'https://stargazer-12.preview.emergentagent.com')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+# Point the bot at a local Bot API server, e.g. benchmarks/fake_bot_api.py
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL')
+# Stats and debug endpoints require this in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
 
-# Initialize OpenAI client
-openai.api_key = OPENAI_API_KEY
+# Keyboards are immutable and shared by all handlers
+keyboards = build_keyboards(WEBAPP_URL)
+
+# Initialize shared async LLM client with deadlines, retries and model fallback
+llm = ResilientLLM(LLMClient(api_key=OPENAI_API_KEY))
 
 # Initialize bot and dispatcher
-bot = Bot(token=BOT_TOKEN)
+api_server = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=api_server))
 dp = Dispatcher()
 
+# Bot API timings include the pacing wait added by the send scheduler
+bot.session.middleware(TelegramTimingMiddleware())
+
+# Every chat-bound Bot API call is paced per chat and globally to avoid flood waits
+send_scheduler = SendScheduler()
+bot.session.middleware(SendSchedulerMiddleware(send_scheduler))
+
+for observer in (dp.message, dp.callback_query, dp.pre_checkout_query):
+    observer.middleware(HandlerTimingMiddleware())
+
+# Each user's updates start in the order they were dequeued
+update_turns = UpdateTurns()
+
+async def process_update(update: types.Update):
+    """Feed a queued update to the dispatcher under its trace, in its user's turn"""
+    async def feed():
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        finally:
+            FEED_UPDATE_SECONDS.labels(update.event_type).observe(time.perf_counter() - started)
+
+    with resume_trace(update.update_id):
+        await update_turns.run(update_user_id(update), feed)
+
+def update_user_id(update: types.Update) -> Optional[int]:
+    """Shard key: the user an update comes from"""
+    try:
+        user = getattr(update.event, "from_user", None)
+    except Exception:
+        return None
+    return user.id if user else None
+
+# Webhook updates are acknowledged immediately and processed by workers;
+# UPDATE_QUEUE_BACKEND=mongo shards them by user across processes
+update_queue = create_update_queue(
+    db=db,
+    key=update_user_id,
+    order=lambda update: update.update_id,
+    encode=lambda update: update.model_dump(mode="json", exclude_none=True),
+    decode=types.Update.model_validate,
+)
+update_workers = UpdateWorkerPool(update_queue, process_update)
+
+# Telegram redelivers slow updates; drop repeats before they reach the dispatcher
+update_dedup = UpdateDeduplicator(db.processed_updates)
+
 # Create the main app without a prefix
 app = FastAPI()
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
 
 # Pydantic Models
 class User(BaseModel):
@@ -55,9 +155,14 @@ class User(BaseModel):
     birth_date: Optional[str] = None
     birth_time: Optional[str] = None
     birth_place: Optional[str] = None
+    birth_lat: Optional[float] = None
+    birth_lon: Optional[float] = None
+    birth_tz: Optional[str] = None
+    birth_place_resolved: Optional[str] = None
     subscription_active: bool = False
     subscription_end: Optional[datetime] = None
     free_readings_left: int = 3
+    daily_horoscope: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
@@ -88,15 +193,136 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Shared by bot handlers and the API; writes below keep it in sync
+user_cache = UserCache()
+
+# Readings for repeated questions are served from per-key variant pools
+reading_cache = ReadingCache()
+
+# One reading at a time per user; duplicate questions share the in-flight one
+reading_serializer = KeyedSerializer()
+
+def pregeneration_idle() -> bool:
+    """Spare capacity: no queued updates and few LLM calls in flight"""
+    return not update_workers.queue.qsize() and llm.in_flight < READING_POOL_MAX_IN_FLIGHT
+
+# Ready general readings for users who keep asking for another one
+reading_pool = ReadingPool(
+    generate=lambda user_doc: generate_astrology_reading(user_doc),
+    load_user=lambda telegram_id: get_user_doc(telegram_id),
+    is_idle=pregeneration_idle,
+)
+
+# Daily horoscope push, one generation per sun sign, submitted to the Batch API ahead of time
+daily_broadcast = DailyBroadcast(db, bot, llm, keyboards.daily_horoscope)
+# Scheduled jobs, run by the leader process only
+leader_tasks = []
+
+def forget_users(telegram_ids: List[int]):
+    for telegram_id in telegram_ids:
+        user_cache.invalidate(telegram_id)
+
+# Clears subscription_active at each expiry and optionally reminds users to renew
+subscription_sweeper = SubscriptionSweeper(db, bot, keyboards.subscription_renewal, on_expired=forget_users)
+
+# Exported with the other metrics on /metrics at scrape time
+register_queue_depths({
+    "updates": lambda: update_workers.queue.qsize(),
+    "send": lambda: send_scheduler.stats()["depth"],
+    "reading_pool": lambda: reading_pool.stats()["pending_refills"],
+    "reading_serializer": lambda: reading_serializer.stats()["pending"],
+    "llm_in_flight": lambda: llm.in_flight,
+})
+
+# Event loop lag watchdog; LOOP_MONITOR_DEBUG=true also captures blocking stacks
+loop_monitor = LoopMonitor()
+
+# Shared by the bot middleware and the API; rejects never touch Mongo or the LLM
+rate_limiter = create_rate_limiter(db)
+
+def rate_limit_tier(telegram_id: int) -> str:
+    """Rate limit tier from the cached user document only"""
+    user_doc = user_cache.peek(telegram_id)
+    return "premium" if user_doc and user_doc.get('subscription_active') else "free"
+
+def verified_webapp_user(request: Request) -> Optional[int]:
+    """Telegram user id from the web app's signed initData, verified once per request"""
+    if not hasattr(request.state, "webapp_user_id"):
+        request.state.webapp_user_id, request.state.webapp_auth_error = None, None
+        try:
+            request.state.webapp_user_id = verify_init_data(request.headers.get(INIT_DATA_HEADER), BOT_TOKEN)["id"]
+        except InitDataError as e:
+            request.state.webapp_auth_error = str(e)
+    return request.state.webapp_user_id
+
+async def webapp_user_id(request: Request) -> int:
+    """Dependency for endpoints that act as the web app user; 401 without valid initData"""
+    telegram_id = verified_webapp_user(request)
+    if telegram_id is None:
+        raise HTTPException(status_code=401, detail=request.state.webapp_auth_error)
+    return telegram_id
+
+async def api_rate_limit(request: Request):
+    """Rate limit API calls per web app user or telegram_id, or per client address"""
+    if request.url.path.endswith(WEBHOOK_PATH):
+        return
+    webapp_id = verified_webapp_user(request)
+    telegram_id = request.path_params.get('telegram_id') or request.query_params.get('telegram_id')
+    if webapp_id is not None:
+        # The signature proves who is asking, so their subscription decides the tier
+        user_doc = await get_user_doc(webapp_id)
+        key, tier = f"api:{webapp_id}", "premium" if user_doc and is_subscribed(user_doc) else "free"
+    elif telegram_id and str(telegram_id).isdigit():
+        key, tier = f"api:{telegram_id}", rate_limit_tier(int(telegram_id))
+    else:
+        key, tier = f"api:{request.client.host if request.client else 'unknown'}", "free"
+    wait = await rate_limiter.check(key, tier)
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers={"Retry-After": str(math.ceil(wait))})
+
+dp.message.outer_middleware(RateLimitMiddleware(rate_limiter, rate_limit_tier))
+dp.callback_query.outer_middleware(RateLimitMiddleware(rate_limiter, rate_limit_tier))
+
+async def require_admin(request: Request):
+    """Guard for operational endpoints, which expose internals and must stay off the public API"""
+    token = request.headers.get(ADMIN_TOKEN_HEADER)
+    if not ADMIN_TOKEN or not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Create a router with the /api prefix
+api_router = APIRouter(prefix="/api", dependencies=[Depends(api_rate_limit)])
+# Stats endpoints for operators, outside the rate limit
+internal_router = APIRouter(prefix="/api", dependencies=[Depends(require_admin)])
+
+# Reading constants
+DEFAULT_QUESTION = "Дай мне общее астрологическое чтение"
+READING_ERROR_TEXT = "Сейчас у меня проблемы с подключением к космическим энергиям. Пожалуйста, попробуйте через мгновение. ✨"
+READING_PLACEHOLDER_TEXT = "🔮 Звезды складываются в ответ..."
+STREAM_READINGS = os.environ.get('STREAM_READINGS', 'true').lower() == 'true'
+STREAM_EDIT_INTERVAL = float(os.environ.get('STREAM_EDIT_INTERVAL', '1.5'))
+STREAM_EDIT_MIN_CHARS = int(os.environ.get('STREAM_EDIT_MIN_CHARS', '40'))
+
 # Subscription constants
 SUBSCRIPTION_PRICE = 100  # Telegram Stars
 SUBSCRIPTION_TITLE = "Премиум подписка LunaAura"
 SUBSCRIPTION_DESCRIPTION = "Безлимитные астрологические чтения на месяц ✨"
+SUBSCRIPTION_PRICES = [LabeledPrice(label=SUBSCRIPTION_TITLE, amount=SUBSCRIPTION_PRICE)]
+SUBSCRIPTION_PERIOD = timedelta(days=30)
 
 # Helper Functions
+async def get_user_doc(telegram_id: int) -> Optional[dict]:
+    """Get user document through the read-through cache"""
+    user_doc = user_cache.get(telegram_id)
+    if user_doc is None:
+        user_doc = await db.users.find_one({"telegram_id": telegram_id})
+        if user_doc:
+            user_cache.set(telegram_id, user_doc)
+    return user_doc
+
 async def get_or_create_user(telegram_user: types.User) -> User:
     """Get existing user or create new one"""
-    user_doc = await db.users.find_one({"telegram_id": telegram_user.id})
+    user_doc = await get_user_doc(telegram_user.id)
     
     if user_doc:
         return User(**user_doc)
@@ -110,152 +336,202 @@ async def get_or_create_user(telegram_user: types.User) -> User:
         free_readings_left=3
     )
     
-    await db.users.insert_one(user.dict())
+    user_doc = user.dict()
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Created concurrently by another update
+        user_cache.invalidate(telegram_user.id)
+        return User(**await get_user_doc(telegram_user.id))
+    user_cache.set(telegram_user.id, user_doc)
     return user
 
-async def update_birth_data(telegram_id: int, birth_data: BirthData):
-    """Update user's birth data"""
+async def update_birth_data(telegram_id: int, birth_data: BirthData) -> Optional[Place]:
+    """Update user's birth data, resolving the place to coordinates and timezone.
+
+    Returns the resolved place, or None if the place could not be found.
+    """
+    fields = {
+        "birth_date": birth_data.birth_date,
+        "birth_time": birth_data.birth_time,
+        "birth_place": birth_data.birth_place
+    }
+    place = resolve_place(birth_data.birth_place)
+    fields.update({
+        "birth_lat": place.lat if place else None,
+        "birth_lon": place.lon if place else None,
+        "birth_tz": place.timezone if place else None,
+        "birth_place_resolved": f"{place.name_ru}, {place.country_ru}" if place else None
+    })
     await db.users.update_one(
         {"telegram_id": telegram_id},
-        {"$set": {
-            "birth_date": birth_data.birth_date,
-            "birth_time": birth_data.birth_time,
-            "birth_place": birth_data.birth_place
-        }}
+        {"$set": fields}
+    )
+    user_cache.update(telegram_id, fields)
+    reading_pool.invalidate(telegram_id)
+    return place
+
+async def reserve_reading(telegram_id: int) -> Tuple[Optional[dict], bool]:
+    """Atomically check quota and reserve one reading.
+
+    Returns the updated user document (None if the user has no quota left)
+    and whether a free reading was charged.
+    """
+    now = datetime.now(timezone.utc)
+    user_doc = await db.users.find_one_and_update(
+        reserve_query(telegram_id, now),
+        reserve_update(now),
+        return_document=ReturnDocument.AFTER
     )
+    if not user_doc:
+        return None, False
+    user_cache.set(telegram_id, user_doc)
+    return user_doc, not is_subscribed(user_doc, now)
 
-async def can_get_reading(user_data: dict) -> bool:
-    """Check if user can get a reading"""
-    # Check if has active subscription
-    if user_data.get('subscription_active') and user_data.get('subscription_end'):
-        subscription_end = user_data['subscription_end']
-        if isinstance(subscription_end, str):
-            subscription_end = datetime.fromisoformat(subscription_end.replace('Z', '+00:00'))
-        if subscription_end > datetime.now(timezone.utc):
-            return True
-    
-    # Check free readings
-    return user_data.get('free_readings_left', 0) > 0
+async def refund_reading(telegram_id: int, charged_free: bool):
+    """Return a reserved reading after a failed generation"""
+    if charged_free:
+        await db.users.update_one({"telegram_id": telegram_id}, REFUND_UPDATE)
+        user_cache.invalidate(telegram_id)
 
-async def use_reading(telegram_id: int):
-    """Use one reading"""
-    user_doc = await db.users.find_one({"telegram_id": telegram_id})
+async def activate_subscription(telegram_id: int):
+    """Activate premium subscription for 30 days; a renewal extends the current end"""
+    now = datetime.now(timezone.utc)
+    user_doc = await db.users.find_one_and_update(
+        {"telegram_id": telegram_id},
+        [{"$set": {
+            "subscription_active": True,
+            "subscription_end": {"$add": [
+                {"$max": ["$subscription_end", now]},
+                int(SUBSCRIPTION_PERIOD.total_seconds() * 1000)
+            ]}
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
     if not user_doc:
         return
-        
-    if not user_doc.get('subscription_active'):
-        new_count = max(0, user_doc.get('free_readings_left', 0) - 1)
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"free_readings_left": new_count}}
+    user_cache.set(telegram_id, user_doc)
+    subscription_sweeper.schedule(telegram_id, user_doc["subscription_end"])
+
+def build_reading_messages(user_data: dict, question: str) -> List[dict]:
+    """Chat messages for an astrology reading"""
+    if user_data.get('birth_date') and user_data.get('birth_time') and user_data.get('birth_place'):
+        birth_info = BIRTH_INFO.render(
+            birth_date=user_data['birth_date'],
+            birth_time=user_data['birth_time'],
+            birth_place=user_data['birth_place']
         )
+        chart = chart_for_user(user_data)
+        if chart:
+            birth_info += CHART_INFO.render(chart=format_chart(chart))
+    else:
+        birth_info = NO_BIRTH_INFO
+    return reading_messages(user_data.get('first_name') or 'Дорогая душа', birth_info, question)
+
+async def generate_astrology_reading(user_data: dict, question: str = DEFAULT_QUESTION, client=None) -> str:
+    """Generate AI-powered astrology reading using OpenAI, raising on provider errors"""
+    return await (client or llm).complete(
+        messages=build_reading_messages(user_data, question),
+        max_tokens=400,
+        temperature=0.7
+    )
 
-async def activate_subscription(telegram_id: int):
-    """Activate premium subscription for 30 days"""
-    subscription_end = datetime.now(timezone.utc) + timedelta(days=30)
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
-        {"$set": {
-            "subscription_active": True,
-            "subscription_end": subscription_end
-        }}
+async def stream_astrology_reading(user_data: dict, question: str = DEFAULT_QUESTION) -> AsyncIterator[str]:
+    """Stream an astrology reading token by token"""
+    async for delta in llm.stream(
+        messages=build_reading_messages(user_data, question),
+        max_tokens=400,
+        temperature=0.7
+    ):
+        yield delta
+
+async def save_reading(user_doc: dict, question: str, reading: str) -> AstrologyReading:
+    """Save a generated reading to the database"""
+    reading_obj = AstrologyReading(
+        user_id=user_doc.get('id', str(uuid.uuid4())),
+        telegram_id=user_doc['telegram_id'],
+        question=question,
+        reading=reading,
+        birth_data=birth_snapshot(user_doc)
     )
+    await db.readings.insert_one(reading_obj.dict())
+    return reading_obj
 
-async def generate_astrology_reading(user_data: dict, question: str = "Дай мне общее астрологическое чтение") -> str:
-    """Generate AI-powered astrology reading using OpenAI"""
-    try:
-        # Create a comprehensive prompt for astrology reading
-        birth_info = ""
-        if user_data.get('birth_date') and user_data.get('birth_time') and user_data.get('birth_place'):
-            birth_info = f"""
-Дата рождения: {user_data['birth_date']}
-Время рождения: {user_data['birth_time']}
-Место рождения: {user_data['birth_place']}
-"""
-        else:
-            birth_info = "Данные о рождении пока не предоставлены."
-
-        prompt = f"""Ты LunaAura - мудрый и сочувствующий астролог, который предоставляет персонализированные чтения для женщин. 
-Ты сочетаешь древнюю астрологическую мудрость с современными психологическими инсайтами.
-
-Информация о пользователе:
-Имя: {user_data.get('first_name', 'Дорогая душа')}
-{birth_info}
-
-Вопрос пользователя: {question}
-
-Предоставь теплое, проницательное астрологическое чтение, которое:
-1. Отвечает на конкретный вопрос с эмпатией и мудростью
-2. Включает соответствующие астрологические концепции, если данные о рождении доступны
-3. Предлагает практические советы и поддержку
-4. Использует поддерживающий, женственно-вдохновляющий тон
-5. Содержит 150-300 слов
-6. Использует подходящие эмодзи для магической атмосферы
-
-Если данные о рождении не предоставлены, сосредоточься на общих советах и поощри их поделиться информацией о рождении для более персонализированных чтений.
-Отвечай только на русском языке.
-"""
-
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=400,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content.strip()
+async def deliver_reading(message: types.Message, user_doc: dict, question: str, title: str,
+                          keyboard: InlineKeyboardMarkup) -> Optional[str]:
+    """Send a reading to the chat, streaming it into a placeholder when enabled.
+
+    Returns the reading text, or None if generation failed.
+    """
+    cached = reading_cache.get(user_doc, question) if READING_CACHE_ENABLED else None
+    if cached:
+        await message.answer(f"{title}\n\n{cached}", parse_mode="Markdown", reply_markup=keyboard)
+        return cached
     
+    if not STREAM_READINGS:
+        try:
+            reading = await generate_astrology_reading(user_doc, question)
+        except Exception as e:
+            logger.error(f"Error generating astrology reading: {e}")
+            await message.answer(READING_ERROR_TEXT)
+            return None
+        if READING_CACHE_ENABLED:
+            reading_cache.put(user_doc, question, reading)
+        await message.answer(f"{title}\n\n{reading}", parse_mode="Markdown", reply_markup=keyboard)
+        return reading
+    
+    placeholder = await message.answer(READING_PLACEHOLDER_TEXT)
+    text = ""
+    shown = 0
+    next_edit = time.monotonic() + STREAM_EDIT_INTERVAL
+    try:
+        async for delta in stream_astrology_reading(user_doc, question):
+            text += delta
+            # Throttle edits to stay under Telegram's per-chat edit limits
+            if time.monotonic() >= next_edit and len(text) - shown >= STREAM_EDIT_MIN_CHARS:
+                next_edit = time.monotonic() + STREAM_EDIT_INTERVAL
+                shown = len(text)
+                try:
+                    await placeholder.edit_text(f"{text.rstrip()} ▌")
+                except TelegramRetryAfter as e:
+                    next_edit = time.monotonic() + e.retry_after
+                except TelegramAPIError as e:
+                    logger.debug(f"Skipped progressive edit: {e}")
     except Exception as e:
-        logger.error(f"Error generating astrology reading: {e}")
-        return "Сейчас у меня проблемы с подключением к космическим энергиям. Пожалуйста, попробуйте через мгновение. ✨"
+        logger.error(f"Error streaming astrology reading: {e}")
+        text = ""
+    
+    reading = text.strip()
+    if not reading:
+        await placeholder.edit_text(READING_ERROR_TEXT)
+        return None
+    if READING_CACHE_ENABLED:
+        reading_cache.put(user_doc, question, reading)
+    await placeholder.edit_text(f"{title}\n\n{reading}", parse_mode="Markdown", reply_markup=keyboard)
+    return reading
 
 # Telegram Bot Handlers
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message):
     """Handle /start command"""
-    user = await get_or_create_user(message.from_user)
+    with stage("user_lookup"):
+        user = await get_or_create_user(message.from_user)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="🌟 Открыть приложение LunaAura", 
-            web_app=WebAppInfo(url=WEBAPP_URL)
-        )],
-        [
-            InlineKeyboardButton(text="🔮 Получить чтение", callback_data="get_reading"),
-            InlineKeyboardButton(text="💫 Подписка", callback_data="subscription")
-        ],
-        [InlineKeyboardButton(text="🌙 Указать данные рождения", callback_data="set_birth_data")]
-    ])
-    
-    subscription_status = ""
     if user.subscription_active:
-        subscription_status = "💎 Премиум подписка активна"
+        subscription_status = SUBSCRIPTION_ACTIVE_STATUS
     else:
-        subscription_status = f"✨ Осталось бесплатных чтений: {user.free_readings_left}"
+        subscription_status = FREE_READINGS_STATUS.render(count=user.free_readings_left)
     
-    welcome_text = f"""🌙 Добро пожаловать в LunaAura, {user.first_name or 'прекрасная душа'}! 
-
-Я твой персональный ИИ-астролог, готовый дать тебе космические советы и озарения.
-
-✨ Что я могу для тебя сделать:
-• Персонализированные астрологические чтения
-• Ежедневные космические советы  
-• Ответы на вопросы о любви, карьере и жизни
-• Связь с мудростью звезд
-
-{subscription_status}
-
-🌟 С чего начнем твое космическое путешествие?"""
-
-    await message.answer(welcome_text, reply_markup=keyboard)
+    welcome_text = WELCOME_TEXT.render(name=user.first_name or 'прекрасная душа', subscription_status=subscription_status)
+    await message.answer(welcome_text, reply_markup=keyboards.start)
 
 @dp.callback_query(F.data == "subscription")
 async def process_subscription(callback_query: types.CallbackQuery):
     """Handle subscription callback"""
     await callback_query.answer()
     
-    user_doc = await db.users.find_one({"telegram_id": callback_query.from_user.id})
+    with stage("user_lookup"):
+        user_doc = await get_user_doc(callback_query.from_user.id)
     
     # Check if already has active subscription
     if user_doc and user_doc.get('subscription_active'):
@@ -263,40 +539,15 @@ async def process_subscription(callback_query: types.CallbackQuery):
         if isinstance(subscription_end, str):
             subscription_end = datetime.fromisoformat(subscription_end.replace('Z', '+00:00'))
         
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))],
-            [InlineKeyboardButton(text="🔮 Получить чтение", callback_data="get_reading")]
-        ])
-        
         await callback_query.message.answer(
-            f"💎 У вас уже есть активная премиум подписка!\n\n"
-            f"⏰ Действует до: {subscription_end.strftime('%d.%m.%Y')}\n\n"
-            f"✨ Наслаждайтесь безлимитными астрологическими чтениями!",
-            reply_markup=keyboard
+            SUBSCRIPTION_ALREADY_ACTIVE_TEXT.render(until=subscription_end.strftime('%d.%m.%Y')),
+            reply_markup=keyboards.subscription_active
         )
         return
     
     # Show subscription options
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⭐ Купить подписку (100 Stars)", callback_data="buy_subscription")],
-        [InlineKeyboardButton(text="🔮 Получить бесплатное чтение", callback_data="get_reading")],
-        [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))]
-    ])
-    
-    subscription_text = f"""💫 **Премиум подписка LunaAura**
-
-🌟 **Что включает:**
-• Безлимитные астрологические чтения
-• Персонализированные ответы на любые вопросы  
-• Доступ к расширенным функциям приложения
-• Приоритетная поддержка
-
-💎 **Цена:** 100 Telegram Stars (≈ $2)
-⏰ **Период:** 30 дней
-
-✨ Без подписки доступно {user_doc.get('free_readings_left', 3) if user_doc else 3} бесплатных чтения."""
-
-    await callback_query.message.answer(subscription_text, parse_mode="Markdown", reply_markup=keyboard)
+    subscription_text = SUBSCRIPTION_OFFER_TEXT.render(count=user_doc.get('free_readings_left', 3) if user_doc else 3)
+    await callback_query.message.answer(subscription_text, parse_mode="Markdown", reply_markup=keyboards.subscription_offer)
 
 @dp.callback_query(F.data == "buy_subscription")
 async def process_buy_subscription(callback_query: types.CallbackQuery):
@@ -304,8 +555,6 @@ async def process_buy_subscription(callback_query: types.CallbackQuery):
     await callback_query.answer()
     
     # Create invoice for Telegram Stars
-    prices = [LabeledPrice(label=SUBSCRIPTION_TITLE, amount=SUBSCRIPTION_PRICE)]
-    
     try:
         await bot.send_invoice(
             chat_id=callback_query.from_user.id,
@@ -314,13 +563,11 @@ async def process_buy_subscription(callback_query: types.CallbackQuery):
             payload=f"subscription_{callback_query.from_user.id}_{datetime.now().timestamp()}",
             provider_token="",  # Empty for Telegram Stars
             currency="XTR",  # Telegram Stars currency
-            prices=prices
+            prices=SUBSCRIPTION_PRICES
         )
     except Exception as e:
         logger.error(f"Error sending invoice: {e}")
-        await callback_query.message.answer(
-            "😔 Произошла ошибка при создании счета. Попробуйте позже или обратитесь в поддержку."
-        )
+        await callback_query.message.answer(INVOICE_ERROR_TEXT)
 
 @dp.pre_checkout_query()
 async def process_pre_checkout_query(pre_checkout_query: types.PreCheckoutQuery):
@@ -330,100 +577,76 @@ async def process_pre_checkout_query(pre_checkout_query: types.PreCheckoutQuery)
 @dp.message(F.successful_payment)
 async def process_successful_payment(message: types.Message):
     """Handle successful payment"""
-    try:
-        # Activate subscription
-        await activate_subscription(message.from_user.id)
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔮 Получить первое премиум чтение", callback_data="get_reading")],
-            [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))]
-        ])
-        
-        await message.answer(
-            f"🎉 **Поздравляем!** Премиум подписка активирована!\n\n"
-            f"💎 Теперь у вас есть доступ к:\n"
-            f"• Безлимитным астрологическим чтениям\n"
-            f"• Персонализированным советам\n"
-            f"• Всем функциям приложения\n\n"
-            f"✨ Подписка активна на 30 дней. Наслаждайтесь магией звезд!",
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
-        
-    except Exception as e:
-        logger.error(f"Error processing payment: {e}")
-        await message.answer(
-            "Спасибо за оплату! Если у вас возникли проблемы с активацией подписки, обратитесь в поддержку."
-        )
+    # Payment confirmations go out ahead of queued readings
+    with send_lane(LANE_PAYMENT):
+        try:
+            # Activate subscription
+            await activate_subscription(message.from_user.id)
+            
+            await message.answer(PAYMENT_SUCCESS_TEXT, parse_mode="Markdown", reply_markup=keyboards.payment_success)
+            
+        except Exception as e:
+            logger.error(f"Error processing payment: {e}")
+            await message.answer(PAYMENT_ERROR_TEXT)
 
 @dp.callback_query(F.data == "get_reading")
 async def process_get_reading(callback_query: types.CallbackQuery):
     """Handle get reading callback"""
     await callback_query.answer()
     
-    user_doc = await db.users.find_one({"telegram_id": callback_query.from_user.id})
-    
-    if not user_doc:
-        await callback_query.message.answer("Ошибка: пользователь не найден. Попробуйте /start")
-        return
-    
-    # Check if can get reading
-    if not await can_get_reading(user_doc):
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⭐ Купить подписку", callback_data="buy_subscription")],
-            [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))]
-        ])
+    async def reading_flow():
+        # Check quota and reserve a reading in one round-trip
+        with stage("quota"):
+            user_doc, charged_free = await reserve_reading(callback_query.from_user.id)
+        # The reading is reserved against the profile as it is now; later updates may go ahead
+        yield_turn()
         
-        await callback_query.message.answer(
-            "😔 У вас закончились бесплатные чтения.\n\n"
-            "💫 Оформите премиум подписку для безлимитного доступа к мудрости звезд!",
-            reply_markup=keyboard
-        )
-        return
-    
-    # Generate reading
-    reading = await generate_astrology_reading(user_doc or {})
-    
-    # Use reading
-    await use_reading(callback_query.from_user.id)
-    
-    # Save reading to database
-    reading_obj = AstrologyReading(
-        user_id=user_doc.get('id') if user_doc else str(uuid.uuid4()),
-        telegram_id=callback_query.from_user.id,
-        question="Общее чтение по запросу через бота",
-        reading=reading,
-        birth_data=user_doc if user_doc else None
-    )
-    
-    await db.readings.insert_one(reading_obj.dict())
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))],
-        [InlineKeyboardButton(text="🔮 Еще одно чтение", callback_data="get_reading")]
-    ])
-    
-    await callback_query.message.answer(f"🌟 **Ваше чтение от LunaAura** ✨\n\n{reading}", 
-                                       parse_mode="Markdown", reply_markup=keyboard)
+        if not user_doc:
+            if not await get_user_doc(callback_query.from_user.id):
+                await callback_query.message.answer(USER_NOT_FOUND_TEXT)
+                return
+            
+            await callback_query.message.answer(NO_READINGS_TEXT, reply_markup=keyboards.no_readings)
+            return
+        
+        saved = False
+        try:
+            # Serve a pre-generated reading when one is ready, else generate and send
+            reading = reading_pool.take(user_doc) if READING_POOL_ENABLED else None
+            with send_lane(LANE_READING):
+                if reading:
+                    await callback_query.message.answer(f"{READING_TITLE}\n\n{reading}", parse_mode="Markdown",
+                                                        reply_markup=keyboards.after_reading)
+                else:
+                    reading = await deliver_reading(callback_query.message, user_doc, DEFAULT_QUESTION,
+                                                    READING_TITLE, keyboards.after_reading)
+            if reading is None:
+                return
+            if READING_POOL_ENABLED:
+                reading_pool.request(user_doc)
+            
+            # Save reading to database
+            with stage("db_insert"):
+                await save_reading(user_doc, "Общее чтение по запросу через бота", reading)
+            saved = True
+        finally:
+            # Any failure after the reservation, Telegram errors included, gives the reading back
+            if not saved:
+                await refund_reading(callback_query.from_user.id, charged_free)
+    
+    # Repeated taps while a reading is in flight don't start another one
+    try:
+        await reading_serializer.run(callback_query.from_user.id, reading_flow,
+                                     tag=normalize_question(DEFAULT_QUESTION))
+    except UserBusyError:
+        await callback_query.message.answer(READING_IN_PROGRESS_TEXT)
 
 @dp.callback_query(F.data == "set_birth_data")
 async def process_set_birth_data(callback_query: types.CallbackQuery):
     """Handle set birth data callback"""
     await callback_query.answer()
     
-    instructions = """🌙 **Укажите ваши данные рождения** 
-
-Для самых точных и персонализированных чтений мне нужна ваша информация о рождении.
-
-Пожалуйста, отправьте данные в таком формате:
-`ГГГГ-ММ-ДД ЧЧ:ММ Город, Страна`
-
-Пример:
-`1995-08-15 14:30 Москва, Россия`
-
-Это поможет мне рассчитать вашу натальную карту и дать глубоко персонализированные космические озарения! ✨"""
-
-    await callback_query.message.answer(instructions, parse_mode="Markdown")
+    await callback_query.message.answer(BIRTH_DATA_INSTRUCTIONS, parse_mode="Markdown")
 
 @dp.message()
 async def handle_messages(message: types.Message):
@@ -447,68 +670,57 @@ async def handle_messages(message: types.Message):
                         birth_place=place_part
                     )
                     
-                    await update_birth_data(message.from_user.id, birth_data)
-                    
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🔮 Получить персональное чтение", callback_data="get_reading")],
-                        [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))]
-                    ])
+                    with stage("db_update"):
+                        place = await update_birth_data(message.from_user.id, birth_data)
                     
+                    if place is None:
+                        await message.answer(BIRTH_PLACE_UNKNOWN_TEXT.render(birth_place=place_part))
+                        return
                     await message.answer(
-                        f"🌙 Прекрасно! Я сохранила ваши данные рождения:\n"
-                        f"📅 Дата: {date_part}\n"
-                        f"⏰ Время: {time_part}\n"
-                        f"📍 Место: {place_part}\n\n"
-                        f"Теперь я могу дать вам глубоко персонализированные чтения! ✨",
-                        reply_markup=keyboard
+                        BIRTH_DATA_SAVED_TEXT.render(birth_date=date_part, birth_time=time_part, birth_place=place_part),
+                        reply_markup=keyboards.birth_data_saved
                     )
                     return
         except Exception as e:
             logger.error(f"Error processing birth data: {e}")
     
     # Treat as question for astrology reading
-    user_doc = await db.users.find_one({"telegram_id": message.from_user.id})
-    if not user_doc:
-        await message.answer("Пожалуйста, начните с команды /start")
-        return
-    
-    # Check if can get reading
-    if not await can_get_reading(user_doc):
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⭐ Купить подписку", callback_data="buy_subscription")]
-        ])
+    async def reading_flow():
+        # Check quota and reserve a reading in one round-trip
+        with stage("quota"):
+            user_doc, charged_free = await reserve_reading(message.from_user.id)
+        # The reading is reserved against the profile as it is now; later updates may go ahead
+        yield_turn()
+        if not user_doc:
+            if not await get_user_doc(message.from_user.id):
+                await message.answer(START_FIRST_TEXT)
+                return
+            
+            await message.answer(NO_READINGS_SHORT_TEXT, reply_markup=keyboards.no_readings_short)
+            return
         
-        await message.answer(
-            "😔 У вас закончились бесплатные чтения.\n\n"
-            "💫 Оформите премиум подписку для безлимитного доступа!",
-            reply_markup=keyboard
-        )
-        return
-    
-    # Generate personalized reading
-    reading = await generate_astrology_reading(user_doc, text)
-    
-    # Use reading
-    await use_reading(message.from_user.id)
-    
-    # Save reading
-    reading_obj = AstrologyReading(
-        user_id=user_doc.get('id', str(uuid.uuid4())),
-        telegram_id=message.from_user.id,
-        question=text,
-        reading=reading,
-        birth_data=user_doc
-    )
-    
-    await db.readings.insert_one(reading_obj.dict())
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🌟 Открыть приложение", web_app=WebAppInfo(url=WEBAPP_URL))],
-        [InlineKeyboardButton(text="🔮 Задать другой вопрос", callback_data="get_reading")]
-    ])
-    
-    await message.answer(f"✨ **Ваше персональное чтение** 🌟\n\n{reading}", 
-                        parse_mode="Markdown", reply_markup=keyboard)
+        saved = False
+        try:
+            # Generate and send personalized reading
+            with send_lane(LANE_READING):
+                reading = await deliver_reading(message, user_doc, text, PERSONAL_READING_TITLE,
+                                                keyboards.after_question)
+            if reading is None:
+                return
+            
+            # Save reading
+            with stage("db_insert"):
+                await save_reading(user_doc, text, reading)
+            saved = True
+        finally:
+            if not saved:
+                await refund_reading(message.from_user.id, charged_free)
+    
+    # Questions from one user are answered in order, one LLM call at a time
+    try:
+        await reading_serializer.run(message.from_user.id, reading_flow, tag=normalize_question(text))
+    except UserBusyError:
+        await message.answer(READING_IN_PROGRESS_TEXT)
 
 # API Routes
 @api_router.get("/")
@@ -523,43 +735,201 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(response: Response, limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
+                            cursor: Optional[str] = None):
+    """Get status checks, newest first; pass X-Next-Cursor back as cursor for the next page"""
+    query = {}
+    if cursor:
+        try:
+            query = keyset_filter(cursor, "timestamp")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    status_checks = await db.status_checks.find(query, {"_id": 0}).sort(keyset_sort("timestamp")).to_list(limit + 1)
+    status_checks, next_cursor = split_page(status_checks, limit, "timestamp")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return status_checks
 
 @api_router.get("/user/{telegram_id}")
 async def get_user_profile(telegram_id: int):
     """Get user profile by telegram ID"""
-    user_doc = await db.users.find_one({"telegram_id": telegram_id})
+    user_doc = await get_user_doc(telegram_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     return User(**user_doc)
 
+@api_router.get("/readings/stream")
+async def stream_user_reading(question: str = DEFAULT_QUESTION, telegram_id: int = Depends(webapp_user_id)):
+    """Stream a new reading as Server-Sent Events for the web app user signed into initData"""
+    user_doc, charged_free = await reserve_reading(telegram_id)
+    if not user_doc:
+        if not await get_user_doc(telegram_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(status_code=402, detail="No readings left")
+    
+    async def events():
+        saved = False
+        text = reading_cache.get(user_doc, question) if READING_CACHE_ENABLED else None
+        try:
+            if text:
+                yield f"data: {json.dumps({'delta': text}, ensure_ascii=False)}\n\n"
+            else:
+                text = ""
+                async for delta in stream_astrology_reading(user_doc, question):
+                    text += delta
+                    yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+                if not text.strip():
+                    raise ValueError("Empty reading")
+                if READING_CACHE_ENABLED:
+                    reading_cache.put(user_doc, question, text.strip())
+            reading_obj = await save_reading(user_doc, question, text.strip())
+            saved = True
+            yield f"event: done\ndata: {json.dumps({'id': reading_obj.id})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming astrology reading: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': READING_ERROR_TEXT}, ensure_ascii=False)}\n\n"
+        finally:
+            # Also covers clients that disconnect mid-stream
+            if not saved:
+                await refund_reading(telegram_id, charged_free)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @api_router.get("/readings/{telegram_id}")
-async def get_user_readings(telegram_id: int):
-    """Get all readings for a user"""
-    readings = await db.readings.find({"telegram_id": telegram_id}).sort("created_at", -1).to_list(100)
-    return [AstrologyReading(**reading) for reading in readings]
+async def get_user_readings(telegram_id: int, response: Response,
+                            limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+                            cursor: Optional[str] = None, fields: Optional[str] = None,
+                            view: str = Query("full", pattern="^(full|preview)$")):
+    """Get a user's readings, newest first.
+
+    ``fields`` is a comma-separated projection, ``view=preview`` truncates
+    reading texts, and X-Next-Cursor is passed back as ``cursor`` for the next page.
+    """
+    query = {"telegram_id": telegram_id}
+    try:
+        projection = reading_projection(fields.split(",") if fields else None, preview=view == "preview")
+        if cursor:
+            query.update(keyset_filter(cursor, "created_at"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    readings = await db.readings.find(query, projection).sort(keyset_sort("created_at")).to_list(limit + 1)
+    readings, next_cursor = split_page(readings, limit, "created_at")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return readings
+
+@api_router.get("/readings/{telegram_id}/{reading_id}")
+async def get_user_reading(telegram_id: int, reading_id: str):
+    """Get one full reading, opened from a list fetched with ``view=preview``"""
+    reading = await db.readings.find_one({"id": reading_id, "telegram_id": telegram_id}, reading_projection())
+    if not reading:
+        raise HTTPException(status_code=404, detail="Reading not found")
+    return reading
+
+@internal_router.get("/queue/stats")
+async def get_queue_stats():
+    """Get webhook update queue backpressure metrics"""
+    return {**update_workers.stats(), "dedup": update_dedup.stats(), "turns": update_turns.stats()}
+
+@internal_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get user cache, reading cache and reading pool hit/miss metrics"""
+    return {"users": user_cache.stats(), "readings": reading_cache.stats(), "pool": reading_pool.stats()}
+
+@internal_router.get("/readings/inflight/stats")
+async def get_inflight_reading_stats():
+    """Get per-user reading serialization metrics"""
+    return reading_serializer.stats()
+
+@internal_router.get("/llm/stats")
+async def get_llm_stats():
+    """Get in-flight completions, retries and circuit breakers"""
+    return llm.stats()
+
+@internal_router.get("/send/stats")
+async def get_send_stats():
+    """Get outbound Telegram send queue depths per lane"""
+    return send_scheduler.stats()
+
+@internal_router.get("/broadcast/status")
+async def get_broadcast_status():
+    """Get progress of the latest daily horoscope broadcast"""
+    run = await daily_broadcast.latest()
+    if not run:
+        raise HTTPException(status_code=404, detail="No broadcast has run yet")
+    run.pop("last_id", None)
+    return run
+
+@internal_router.get("/subscriptions/stats")
+async def get_subscription_stats():
+    """Get subscription expiry sweeper metrics"""
+    return subscription_sweeper.stats()
+
+@internal_router.get("/cluster/status")
+async def get_cluster_status():
+    """Get this process's leadership and update shard ownership"""
+    return {**leader.stats(), "queue": update_workers.queue.stats()}
+
+@internal_router.get("/ratelimit/stats")
+async def get_rate_limit_stats():
+    """Get rate limiter allow/reject metrics"""
+    return rate_limiter.stats()
+
+@internal_router.get("/debug/loop")
+async def get_loop_stats():
+    """Get event loop lag and, in debug mode, stacks of recent blocking calls"""
+    return loop_monitor.stats()
 
 @api_router.post("/webhook/telegram")
 async def telegram_webhook(request: Request):
     """Handle Telegram webhook"""
+    started = time.perf_counter()
+    outcome = "error"
     try:
         json_data = await request.json()
         update = types.Update(**json_data)
         
-        # Log incoming update for debugging
-        logger.info(f"Received update: {update.update_id} from user {update.message.from_user.id if update.message else 'unknown'}")
-        
-        await dp.feed_update(bot, update)
+        # The trace opened here is finished by the worker that processes the update
+        with trace_update(update.update_id) as trace:
+            with stage("receive"):
+                # Log incoming update for debugging
+                logger.info(f"Received update: {update.update_id} from user {update.message.from_user.id if update.message else 'unknown'}")
+                duplicate = await update_dedup.seen(update.update_id)
+            if duplicate:
+                outcome = "duplicate"
+                logger.info(f"Dropping duplicate update: {update.update_id}")
+                return {"ok": True}
+            
+            hand_off(update.update_id, trace)
+            try:
+                await update_workers.submit(update)
+            except QueueFullError as e:
+                # Non-2xx makes Telegram redeliver the update later
+                drop_hand_off(update.update_id)
+                await update_dedup.forget(update.update_id)
+                outcome = "rejected"
+                logger.warning(f"Webhook backpressure: {e}")
+                return JSONResponse(status_code=503, content={"ok": False})
+        outcome = "ok"
         return {"ok": True}
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         return {"ok": False}
+    finally:
+        WEBHOOK_SECONDS.labels(outcome).observe(time.perf_counter() - started)
 
-# Include the router in the main app
+# Include the routers in the main app; internal routes first, so /readings/{telegram_id}/{reading_id}
+# does not shadow /readings/inflight/stats
+app.include_router(internal_router)
 app.include_router(api_router)
 
+# Prometheus scrape endpoint, outside the rate-limited /api router
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Add Telegram webhook endpoint to main app
 @app.post("/webhook/telegram")
 async def telegram_webhook_main(request: Request):
@@ -571,33 +941,81 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
 )
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(CorrelationIdFilter())
 logger = logging.getLogger(__name__)
 
-@app.on_event("startup")
-async def startup_event():
-    """Set webhook on startup"""
+async def start_leader_jobs():
+    """Startup work and scheduled jobs that must run in one process only"""
+    try:
+        await update_dedup.ensure_indexes()
+        if rate_limiter.store is not None:
+            await rate_limiter.store.ensure_indexes()
+        index_report = await bootstrap_indexes(db)
+        logger.info(f"Index verification: {index_report}")
+    except Exception as e:
+        logger.error(f"Failed to create indexes: {e}")
     try:
         webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', WEBAPP_URL)}/api/webhook/telegram"
-        # Delete existing webhook first
-        await bot.delete_webhook()
-        # Set new webhook
-        await bot.set_webhook(webhook_url)
-        logger.info(f"Webhook set to: {webhook_url}")
+        # Setting the webhook drops Telegram's open connections; only do it when the URL changed
+        webhook_info = await bot.get_webhook_info()
+        if webhook_info.url != webhook_url:
+            await bot.set_webhook(webhook_url)
+            logger.info(f"Webhook set to: {webhook_url}")
         
         # Test bot connection
         me = await bot.get_me()
         logger.info(f"Bot connected: @{me.username} (ID: {me.id})")
     except Exception as e:
         logger.error(f"Failed to set webhook: {e}")
+    if BROADCAST_ENABLED:
+        leader_tasks.append(asyncio.create_task(run_daily(daily_broadcast)))
+    if SUBSCRIPTION_SWEEP_ENABLED:
+        leader_tasks.append(asyncio.create_task(subscription_sweeper.run()))
+
+async def stop_leader_jobs():
+    for task in leader_tasks:
+        task.cancel()
+    await asyncio.gather(*leader_tasks, return_exceptions=True)
+    leader_tasks.clear()
+
+# CLUSTER_MODE=lease elects one leader among processes through a Mongo lease
+leader = LeaderElection(db, start_leader_jobs, stop_leader_jobs)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start workers and run for leadership, which sets the webhook"""
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    update_workers.start()
+    if READING_POOL_ENABLED:
+        reading_pool.start()
+    try:
+        await asyncio.to_thread(load_ephemeris)
+        await asyncio.to_thread(get_place_index)
+    except Exception as e:
+        logger.error(f"Failed to load astrology data: {e}")
+    # aiogram builds a pydantic model per response type on first use, blocking the loop mid-update
+    for method in (SendMessage, EditMessageText, AnswerCallbackQuery, AnswerPreCheckoutQuery, SendInvoice):
+        BotAPIResponse[method.__returning__]
+    await leader.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Drain queued updates while Mongo, LLM and bot sessions are still open
+    await update_workers.stop()
+    await reading_pool.stop()
+    await leader.stop()
     client.close()
+    await llm.close()
+    await send_scheduler.close()
+    await loop_monitor.stop()
     await bot.session.close()
\ No newline at end of file
@@ -0,0 +1,194 @@
+import os
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, List, Optional
+
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+
+from bot_assets import SUBSCRIPTION_REMINDER_TEXT
+from send_scheduler import LANE_BROADCAST, send_lane
+
+logger = logging.getLogger(__name__)
+
+# Subscription expiry configuration
+SUBSCRIPTION_SWEEP_ENABLED = os.environ.get('SUBSCRIPTION_SWEEP_ENABLED', 'true').lower() == 'true'
+SUBSCRIPTION_SWEEP_BATCH = int(os.environ.get('SUBSCRIPTION_SWEEP_BATCH', '500'))
+# Expiries this far ahead are loaded into the heap; later ones on the next load
+SUBSCRIPTION_SWEEP_LOOKAHEAD = float(os.environ.get('SUBSCRIPTION_SWEEP_LOOKAHEAD', str(6 * 60 * 60)))
+SUBSCRIPTION_SWEEP_HEAP_MAX = int(os.environ.get('SUBSCRIPTION_SWEEP_HEAP_MAX', '10000'))
+SUBSCRIPTION_REMINDERS_ENABLED = os.environ.get('SUBSCRIPTION_REMINDERS_ENABLED', 'false').lower() == 'true'
+SUBSCRIPTION_REMINDER_BEFORE = float(os.environ.get('SUBSCRIPTION_REMINDER_BEFORE', str(24 * 60 * 60)))
+
+EXPIRE = "expire"
+REMIND = "remind"
+
+USER_PROJECTION = {"_id": 1, "telegram_id": 1, "subscription_end": 1}
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes"""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+class SubscriptionSweeper:
+    """Clears subscription_active when subscriptions end, waking exactly when they do.
+
+    Upcoming expiries within `lookahead` are loaded through the partial
+    subscription_end index into a min-heap, and the sweeper sleeps until
+    the earliest one (or until the next load). Due users are flipped with
+    update_many in batches of `batch_size`; the filter re-checks
+    subscription_end, so renewals after loading are never expired. With
+    reminders on, users are also messaged `remind_before` seconds ahead of
+    expiry, once per subscription_end, in the broadcast send lane.
+    """
+
+    def __init__(self, db, bot=None, keyboard=None,
+                 on_expired: Callable[[List[int]], None] = lambda telegram_ids: None,
+                 batch_size: int = SUBSCRIPTION_SWEEP_BATCH, lookahead: float = SUBSCRIPTION_SWEEP_LOOKAHEAD,
+                 heap_max: int = SUBSCRIPTION_SWEEP_HEAP_MAX, reminders: bool = SUBSCRIPTION_REMINDERS_ENABLED,
+                 remind_before: float = SUBSCRIPTION_REMINDER_BEFORE):
+        self.db = db
+        self.bot = bot
+        self.keyboard = keyboard
+        self.on_expired = on_expired
+        self.batch_size = batch_size
+        self.lookahead = timedelta(seconds=lookahead)
+        self.heap_max = heap_max
+        self.reminders = reminders and bot is not None
+        self.remind_before = timedelta(seconds=remind_before)
+        self._heap = []
+        self._horizon: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self.expired = 0
+        self.reminded = 0
+        self.sweeps = 0
+        self.loads = 0
+
+    def _push(self, due: datetime, kind: str, telegram_id: int):
+        heapq.heappush(self._heap, (due, kind, telegram_id))
+
+    def schedule(self, telegram_id: int, subscription_end: datetime):
+        """Track a new or renewed subscription that ends before the next load"""
+        if self._horizon is None:
+            return
+        subscription_end = as_utc(subscription_end)
+        if subscription_end <= self._horizon:
+            self._push(subscription_end, EXPIRE, telegram_id)
+        if self.reminders and subscription_end - self.remind_before <= self._horizon:
+            self._push(subscription_end - self.remind_before, REMIND, telegram_id)
+        self._wakeup.set()
+
+    async def _load(self, now: datetime):
+        """Rebuild the heap from subscriptions ending (or due a reminder) before the new horizon"""
+        horizon = now + self.lookahead
+        until = horizon + self.remind_before if self.reminders else horizon
+        cursor = self.db.users.find({"subscription_active": True, "subscription_end": {"$lte": until}},
+                                    USER_PROJECTION)
+        docs = await cursor.sort("subscription_end", 1).limit(self.heap_max).to_list(self.heap_max)
+        if len(docs) == self.heap_max:
+            # Too many to hold; load the rest once these are done
+            horizon = min(horizon, as_utc(docs[-1]["subscription_end"]))
+        self._heap = []
+        for doc in docs:
+            subscription_end = as_utc(doc["subscription_end"])
+            if subscription_end <= horizon:
+                self._heap.append((subscription_end, EXPIRE, doc["telegram_id"]))
+            if self.reminders and subscription_end - self.remind_before <= horizon:
+                self._heap.append((subscription_end - self.remind_before, REMIND, doc["telegram_id"]))
+        heapq.heapify(self._heap)
+        self._horizon = horizon
+        self.loads += 1
+
+    async def expire_due(self, now: datetime) -> int:
+        """Flip every subscription that ended by `now`, a batch at a time"""
+        query = {"subscription_active": True, "subscription_end": {"$lte": now}}
+        expired = 0
+        while True:
+            docs = await self.db.users.find(query, USER_PROJECTION).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+            result = await self.db.users.update_many(
+                {**query, "_id": {"$in": [doc["_id"] for doc in docs]}},
+                {"$set": {"subscription_active": False}},
+            )
+            expired += result.modified_count
+            self.on_expired([doc["telegram_id"] for doc in docs])
+        if expired:
+            self.expired += expired
+            logger.info(f"Expired {expired} subscriptions")
+        return expired
+
+    async def remind(self, telegram_ids: Iterable[int], now: datetime) -> int:
+        """Send renewal reminders, claiming each subscription_end before its message goes out"""
+        query = {
+            "telegram_id": {"$in": list(telegram_ids)},
+            "subscription_active": True,
+            "subscription_end": {"$gt": now, "$lte": now + self.remind_before},
+            "$expr": {"$ne": ["$renewal_reminded_for", "$subscription_end"]},
+        }
+        docs = await self.db.users.find(query, USER_PROJECTION).to_list(None)
+        if not docs:
+            return 0
+        await self.db.users.update_many({**query, "_id": {"$in": [doc["_id"] for doc in docs]}},
+                                        [{"$set": {"renewal_reminded_for": "$subscription_end"}}])
+        sent = 0
+        with send_lane(LANE_BROADCAST):
+            for doc in docs:
+                until = as_utc(doc["subscription_end"]).strftime('%d.%m.%Y')
+                try:
+                    await self.bot.send_message(doc["telegram_id"], SUBSCRIPTION_REMINDER_TEXT.render(until=until),
+                                                reply_markup=self.keyboard)
+                    sent += 1
+                except TelegramForbiddenError:
+                    pass
+                except TelegramAPIError as e:
+                    logger.warning(f"Renewal reminder failed for {doc['telegram_id']}: {e}")
+        self.reminded += sent
+        return sent
+
+    async def run(self):
+        """Sweep on every due expiry, forever"""
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                if self._horizon is None or now >= self._horizon:
+                    await self._load(now)
+                due_reminders = set()
+                expire = False
+                while self._heap and self._heap[0][0] <= now:
+                    _, kind, telegram_id = heapq.heappop(self._heap)
+                    if kind == EXPIRE:
+                        expire = True
+                    else:
+                        due_reminders.add(telegram_id)
+                if expire:
+                    self.sweeps += 1
+                    await self.expire_due(now)
+                if due_reminders:
+                    await self.remind(due_reminders, now)
+            except Exception as e:
+                logger.error(f"Subscription sweep failed: {e}")
+                self._horizon = None
+                await asyncio.sleep(60)
+                continue
+
+            wake_at = min(self._heap[0][0], self._horizon) if self._heap else self._horizon
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       max(0.0, (wake_at - datetime.now(timezone.utc)).total_seconds()))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._heap),
+            "next_due": self._heap[0][0].isoformat() if self._heap else None,
+            "horizon": self._horizon.isoformat() if self._horizon else None,
+            "expired": self.expired,
+            "reminded": self.reminded,
+            "sweeps": self.sweeps,
+            "loads": self.loads,
+        }
@@ -0,0 +1,76 @@
+import os
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# De-duplication configuration
+DEDUP_CACHE_SIZE = int(os.environ.get('DEDUP_CACHE_SIZE', '50000'))
+DEDUP_TTL_SECONDS = int(os.environ.get('DEDUP_TTL_SECONDS', str(24 * 60 * 60)))
+
+
+class UpdateDeduplicator:
+    """Drop redelivered Telegram updates by update_id.
+
+    A bounded in-memory LRU answers repeats in O(1); a TTL-indexed Mongo
+    collection catches repeats across restarts and processes.
+    """
+
+    def __init__(self, collection, max_size: int = DEDUP_CACHE_SIZE, ttl_seconds: int = DEDUP_TTL_SECONDS):
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        """Expire stored update ids after the TTL"""
+        await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    def _remember(self, update_id: int):
+        self._recent[update_id] = None
+        self._recent.move_to_end(update_id)
+        if len(self._recent) > self.max_size:
+            self._recent.popitem(last=False)
+
+    async def seen(self, update_id: int) -> bool:
+        """Record update_id and return True if it was already processed"""
+        if update_id in self._recent:
+            self._recent.move_to_end(update_id)
+            self.hits += 1
+            return True
+
+        self._remember(update_id)
+        try:
+            await self.collection.insert_one({
+                "_id": update_id,
+                "created_at": datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            self.hits += 1
+            return True
+        except PyMongoError as e:
+            # Fall back to in-memory de-duplication only
+            logger.warning(f"Dedup store unavailable for update {update_id}: {e}")
+
+        self.misses += 1
+        return False
+
+    async def forget(self, update_id: int):
+        """Allow update_id to be processed again, e.g. after an enqueue failure"""
+        self._recent.pop(update_id, None)
+        try:
+            await self.collection.delete_one({"_id": update_id})
+        except PyMongoError as e:
+            logger.warning(f"Failed to forget update {update_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._recent),
+            "duplicates": self.hits,
+            "unique": self.misses,
+        }
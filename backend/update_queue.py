@@ -0,0 +1,394 @@
+import os
+import math
+import random
+import asyncio
+import logging
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from cluster import CLUSTER_LEASE_TTL, CLUSTER_RENEW_INTERVAL, PROCESS_ID, ClusterMembers, Lease
+
+logger = logging.getLogger(__name__)
+
+# Update queue configuration
+UPDATE_QUEUE_MAXSIZE = int(os.environ.get('UPDATE_QUEUE_MAXSIZE', '10000'))
+UPDATE_QUEUE_WORKERS = int(os.environ.get('UPDATE_QUEUE_WORKERS', '32'))
+UPDATE_QUEUE_PUT_TIMEOUT = float(os.environ.get('UPDATE_QUEUE_PUT_TIMEOUT', '0.5'))
+UPDATE_QUEUE_DRAIN_TIMEOUT = float(os.environ.get('UPDATE_QUEUE_DRAIN_TIMEOUT', '25'))
+# Mongo backend: shards spread over processes, and how often each polls its shards
+UPDATE_QUEUE_SHARDS = int(os.environ.get('UPDATE_QUEUE_SHARDS', '64'))
+UPDATE_QUEUE_POLL = float(os.environ.get('UPDATE_QUEUE_POLL', '0.1'))
+UPDATE_QUEUE_CLAIM_BATCH = int(os.environ.get('UPDATE_QUEUE_CLAIM_BATCH', '100'))
+
+
+class QueueFullError(Exception):
+    """Raised when an update cannot be enqueued in time"""
+
+
+class UpdateQueue(ABC):
+    """Interface for update queues consumed by UpdateWorkerPool.
+
+    Implementations may keep items in process or hand them to an external
+    broker; workers only rely on the methods below.
+    """
+
+    @abstractmethod
+    async def put(self, item: Any, timeout: Optional[float] = None):
+        """Enqueue an item, raising QueueFullError if there is no room within `timeout`"""
+
+    @abstractmethod
+    async def get(self) -> Any:
+        """Wait for the next item"""
+
+    @abstractmethod
+    def task_done(self, item: Any):
+        """Mark an item returned by get() as processed"""
+
+    @abstractmethod
+    async def join(self):
+        """Wait until every enqueued item is processed"""
+
+    @abstractmethod
+    def qsize(self) -> int:
+        """Items waiting to be processed"""
+
+    @property
+    @abstractmethod
+    def maxsize(self) -> int:
+        """Capacity beyond which put() fails"""
+
+    def start(self):
+        """Start background work, if the backend has any"""
+
+    async def close(self):
+        """Stop background work once the queue is drained"""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryUpdateQueue(UpdateQueue):
+    """Bounded in-process queue backed by asyncio.Queue"""
+
+    def __init__(self, maxsize: int = UPDATE_QUEUE_MAXSIZE):
+        self._queue = asyncio.Queue(maxsize=maxsize)
+
+    async def put(self, item: Any, timeout: Optional[float] = None):
+        try:
+            if timeout is None:
+                await self._queue.put(item)
+            elif timeout <= 0:
+                self._queue.put_nowait(item)
+            else:
+                await asyncio.wait_for(self._queue.put(item), timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            raise QueueFullError(f"Update queue full ({self._queue.maxsize} items)")
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def task_done(self, item: Any):
+        self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+
+class UpdateWorkerPool:
+    """Pool of workers feeding queued updates to a handler"""
+
+    def __init__(
+        self,
+        queue: UpdateQueue,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = UPDATE_QUEUE_WORKERS,
+        put_timeout: float = UPDATE_QUEUE_PUT_TIMEOUT,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self._tasks: List[asyncio.Task] = []
+        self._busy = 0
+        self._accepting = False
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.enqueue_wait_total = 0.0
+
+    async def submit(self, item: Any):
+        """Enqueue an item, raising QueueFullError under backpressure"""
+        if not self._accepting:
+            raise QueueFullError("Update queue is not accepting items")
+        started = time.perf_counter()
+        try:
+            await self.queue.put(item, timeout=self.put_timeout)
+        except QueueFullError:
+            self.rejected += 1
+            raise
+        self.enqueue_wait_total += time.perf_counter() - started
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def _worker(self, index: int):
+        while True:
+            item = await self.queue.get()
+            self._busy += 1
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Update worker {index} failed: {e}")
+            finally:
+                self._busy -= 1
+                self.queue.task_done(item)
+
+    def start(self):
+        """Spawn worker tasks"""
+        if self._tasks:
+            return
+        self._accepting = True
+        self.queue.start()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} update workers (queue size {self.queue.maxsize})")
+
+    async def stop(self, drain_timeout: float = UPDATE_QUEUE_DRAIN_TIMEOUT):
+        """Stop accepting items, drain the queue and cancel workers"""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Update queue drain timed out with {self.queue.qsize()} items left")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.queue.close()
+
+    def stats(self) -> dict:
+        """Backpressure and throughput counters"""
+        depth = self.queue.qsize()
+        return {
+            "depth": depth,
+            "capacity": self.queue.maxsize,
+            "utilization": depth / self.queue.maxsize if self.queue.maxsize else 0.0,
+            "max_depth": self.max_depth,
+            "workers": len(self._tasks),
+            "busy_workers": self._busy,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_enqueue_wait_ms": (self.enqueue_wait_total / self.enqueued * 1000) if self.enqueued else 0.0,
+            **self.queue.stats(),
+        }
+
+
+class MongoUpdateQueue(UpdateQueue):
+    """Update queue shared by processes through Mongo, sharded by key.
+
+    put() stores an item in db.update_queue under a stable hash of its key.
+    Every process leases a fair share of the shards (shards / live
+    processes, rebalanced every renew interval) and moves their items,
+    lowest `order` first, into a local buffer that get() serves. So all
+    items of one key go to one process, in order. A shard is released only
+    once none of its items are buffered or running, so a key is never
+    handled by two processes at once. Like the in-memory queue, items are
+    removed when claimed, and a process that dies loses the ones it held.
+
+    put() rejects once the stored items reach maxsize. The stored count is
+    refreshed every renew interval and tracks local puts and claims in
+    between, so the bound is approximate across processes.
+    """
+
+    def __init__(self, db, key: Callable[[Any], Hashable], order: Callable[[Any], int],
+                 encode: Callable[[Any], dict], decode: Callable[[dict], Any],
+                 shards: int = UPDATE_QUEUE_SHARDS, maxsize: int = UPDATE_QUEUE_MAXSIZE,
+                 poll: float = UPDATE_QUEUE_POLL, claim_batch: int = UPDATE_QUEUE_CLAIM_BATCH,
+                 holder: str = PROCESS_ID, lease_ttl: float = CLUSTER_LEASE_TTL,
+                 renew_interval: float = CLUSTER_RENEW_INTERVAL):
+        self.collection = db.update_queue
+        self.leases = db.update_shard_leases
+        self.members = ClusterMembers(db.cluster_members, holder, lease_ttl)
+        self.key = key
+        self.order = order
+        self.encode = encode
+        self.decode = decode
+        self.shards = shards
+        self.poll = poll
+        self.claim_batch = claim_batch
+        self.holder = holder
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self._buffer = asyncio.Queue(maxsize=maxsize)
+        self._owned: Dict[int, Lease] = {}
+        self._releasing = set()
+        # Items per shard that are buffered or running here
+        self._pending = Counter()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        # Items stored in Mongo, not yet claimed by any process
+        self._stored = 0
+        self.claimed = 0
+        self.rebalances = 0
+
+    def shard_of(self, item: Any) -> int:
+        key = self.key(item)
+        # hash() of strings differs between processes
+        return (key if isinstance(key, int) else zlib.crc32(str(key).encode())) % self.shards
+
+    async def put(self, item: Any, timeout: Optional[float] = None):
+        if self._stored >= self._buffer.maxsize:
+            raise QueueFullError(f"Update queue full ({self._stored} items stored)")
+        shard = self.shard_of(item)
+        try:
+            await self.collection.insert_one({"shard": shard, "order": self.order(item), "item": self.encode(item)})
+        except PyMongoError as e:
+            raise QueueFullError(f"Update queue store unavailable: {e}")
+        self._stored += 1
+        if shard in self._owned:
+            self._wakeup.set()
+
+    async def get(self) -> Any:
+        return (await self._buffer.get())[1]
+
+    def task_done(self, item: Any):
+        self._buffer.task_done()
+        shard = self.shard_of(item)
+        self._pending[shard] -= 1
+        if self._pending[shard] <= 0:
+            del self._pending[shard]
+
+    async def join(self):
+        await self._buffer.join()
+
+    def qsize(self) -> int:
+        return self._stored + self._buffer.qsize()
+
+    @property
+    def maxsize(self) -> int:
+        return self._buffer.maxsize
+
+    async def _claim(self) -> int:
+        shards = [shard for shard in self._owned if shard not in self._releasing]
+        space = min(self.claim_batch, self._buffer.maxsize - self._buffer.qsize())
+        if not shards or space <= 0:
+            return 0
+        docs = await self.collection.find({"shard": {"$in": shards}}).sort("order", ASCENDING).to_list(space)
+        if not docs:
+            return 0
+        # Only this process polls these shards, so nobody else can remove them meanwhile
+        await self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        for doc in docs:
+            self._pending[doc["shard"]] += 1
+            self._buffer.put_nowait((doc["shard"], self.decode(doc["item"])))
+        self.claimed += len(docs)
+        self._stored = max(0, self._stored - len(docs))
+        return len(docs)
+
+    async def _poll(self):
+        while True:
+            try:
+                if await self._claim() == self.claim_batch:
+                    continue
+            except PyMongoError as e:
+                logger.warning(f"Update queue poll failed: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _rebalance_once(self):
+        share = math.ceil(self.shards / max(1, await self.members.heartbeat()))
+        self._stored = await self.collection.estimated_document_count()
+        for shard, lease in list(self._owned.items()):
+            if not await lease.acquire():
+                logger.warning(f"Lost update shard {shard}")
+                self._owned.pop(shard)
+                self._releasing.discard(shard)
+        # Hand back shards beyond our share once they are drained
+        surplus = len(self._owned) - len(self._releasing) - share
+        if surplus > 0:
+            self._releasing.update(sorted(set(self._owned) - self._releasing)[-surplus:])
+        for shard in list(self._releasing):
+            if not self._pending.get(shard):
+                await self._owned.pop(shard).release()
+                self._releasing.discard(shard)
+        if len(self._owned) >= share:
+            return
+        taken = await self.leases.find({"expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 1}).to_list(None)
+        taken = {doc["_id"] for doc in taken}
+        free = [shard for shard in range(self.shards) if shard not in taken and shard not in self._owned]
+        random.shuffle(free)
+        for shard in free[:share - len(self._owned)]:
+            lease = Lease(self.leases, shard, self.holder, self.lease_ttl, self.renew_interval)
+            if await lease.acquire():
+                self._owned[shard] = lease
+                self.rebalances += 1
+        self._wakeup.set()
+
+    async def _rebalance(self):
+        try:
+            await self.ensure_indexes()
+        except PyMongoError as e:
+            logger.error(f"Failed to create update queue indexes: {e}")
+        while True:
+            try:
+                await self._rebalance_once()
+            except PyMongoError as e:
+                logger.warning(f"Update shard rebalance failed: {e}")
+            await asyncio.sleep(self.renew_interval)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("shard", ASCENDING), ("order", ASCENDING)])
+        await self.members.ensure_indexes()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._rebalance()), asyncio.create_task(self._poll())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for lease in self._owned.values():
+            await lease.release()
+        self._owned.clear()
+        await self.members.leave()
+
+    def stats(self) -> dict:
+        return {
+            "shards_owned": sorted(self._owned),
+            "shards_releasing": sorted(self._releasing),
+            "claimed": self.claimed,
+            "rebalances": self.rebalances,
+        }
+
+
+def create_update_queue(backend: Optional[str] = None, **options) -> UpdateQueue:
+    """Build the update queue selected by UPDATE_QUEUE_BACKEND; options go to the Mongo backend"""
+    backend = backend or os.environ.get('UPDATE_QUEUE_BACKEND', 'memory')
+    if backend == 'memory':
+        return InMemoryUpdateQueue()
+    if backend == 'mongo':
+        return MongoUpdateQueue(**options)
+    raise ValueError(f"Unknown update queue backend: {backend}")
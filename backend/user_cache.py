@@ -0,0 +1,67 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# User cache configuration
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '100000'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '300'))
+
+
+class UserCache:
+    """Bounded LRU cache of user documents keyed by telegram_id"""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int) -> Optional[dict]:
+        """Return a copy of the cached document, or None if missing or expired"""
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, doc = entry
+        if expires_at < time.monotonic():
+            del self._entries[telegram_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return dict(doc)
+
+    def peek(self, telegram_id: int) -> Optional[dict]:
+        """Cached document without copying, refreshing LRU order or counting stats"""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, telegram_id: int, doc: dict):
+        """Cache a fresh copy of the user document"""
+        self._entries[telegram_id] = (time.monotonic() + self.ttl, dict(doc))
+        self._entries.move_to_end(telegram_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, telegram_id: int, fields: dict):
+        """Apply written fields to a cached document, if present"""
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            entry[1].update(fields)
+
+    def invalidate(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
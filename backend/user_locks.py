@@ -0,0 +1,172 @@
+import os
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-user serialization configuration
+READING_POLICY = os.environ.get('READING_POLICY', 'coalesce')
+READING_QUEUE_LIMIT = int(os.environ.get('READING_QUEUE_LIMIT', '2'))
+# Updates that may wait behind one user's running update; later ones run out of turn
+UPDATE_TURN_MAX_WAITING = int(os.environ.get('UPDATE_TURN_MAX_WAITING', '4'))
+
+POLICIES = ("coalesce", "reject", "queue")
+
+
+# Releases the user's turn held by the update being handled in this task
+_current_turn: ContextVar[Optional[Callable[[], None]]] = ContextVar("update_turn", default=None)
+
+
+def yield_turn():
+    """Let the user's next update start before the current handler finishes"""
+    release = _current_turn.get()
+    if release is not None:
+        release()
+
+
+class UserBusyError(Exception):
+    """Raised when a key already has as much work in flight as the policy allows"""
+
+
+class _Slot:
+    __slots__ = ("lock", "pending", "inflight")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+
+
+class KeyedSerializer:
+    """Run work for the same key one at a time, in arrival order.
+
+    Policies:
+      reject   - fail with UserBusyError while the key has work in flight
+      queue    - wait behind up to max_pending earlier calls, then fail
+      coalesce - like queue, but a call whose tag matches a running or
+                 waiting call shares that call's result instead of running
+
+    A key only holds memory while it has work in flight; the slot is
+    dropped as soon as its last call finishes.
+    """
+
+    def __init__(self, policy: str = READING_POLICY, max_pending: int = READING_QUEUE_LIMIT):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown serialization policy: {policy}")
+        self.policy = policy
+        self.max_pending = max_pending if policy != "reject" else 0
+        self._slots: Dict[Hashable, _Slot] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]], tag: Optional[Hashable] = None) -> Any:
+        """Run work() under the key's lock, subject to the policy"""
+        slot = self._slots.get(key)
+        if slot is not None and self.policy == "coalesce" and tag is not None and tag in slot.inflight:
+            self.coalesced += 1
+            # Nothing left to order: the shared call already saw the user's state
+            yield_turn()
+            return await asyncio.shield(slot.inflight[tag])
+        if slot is not None and slot.pending > self.max_pending:
+            self.rejected += 1
+            raise UserBusyError(f"{slot.pending} calls already in flight for {key}")
+
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        slot.pending += 1
+        shared = None
+        if self.policy == "coalesce" and tag is not None:
+            shared = slot.inflight[tag] = asyncio.get_running_loop().create_future()
+        try:
+            async with slot.lock:
+                self.executed += 1
+                result = await work()
+            if shared is not None:
+                shared.set_result(result)
+            return result
+        except BaseException as e:
+            if shared is not None:
+                if isinstance(e, asyncio.CancelledError):
+                    shared.cancel()
+                else:
+                    shared.set_exception(e)
+                    # Nobody else may be waiting; don't log "exception never retrieved"
+                    shared.exception()
+            raise
+        finally:
+            if shared is not None:
+                slot.inflight.pop(tag, None)
+            slot.pending -= 1
+            if not slot.pending:
+                del self._slots[key]
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "active_keys": len(self._slots),
+            "pending": sum(slot.pending for slot in self._slots.values()),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+class UpdateTurns:
+    """Starts each user's updates one at a time, in the order they were dequeued.
+
+    An update holds its user's turn until its handler returns or calls
+    yield_turn(). Reading flows yield once they have reserved a reading, so
+    a long generation doesn't hold up the user's later updates, while a
+    profile edit sent after a question still lands after the question read
+    the profile. Beyond max_waiting updates queued behind one user, further
+    ones run out of turn rather than tie up more workers.
+    """
+
+    def __init__(self, max_waiting: int = UPDATE_TURN_MAX_WAITING):
+        self.max_waiting = max_waiting
+        self._slots: Dict[Hashable, _Slot] = {}
+        self.ordered = 0
+        self.unordered = 0
+
+    async def run(self, key: Optional[Hashable], work: Callable[[], Awaitable[Any]]) -> Any:
+        """Run work() in the key's turn; must be called before the caller awaits anything else"""
+        slot = self._slots.get(key) if key is not None else None
+        if key is None or (slot is not None and slot.pending > self.max_waiting):
+            self.unordered += 1
+            return await work()
+
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        slot.pending += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                slot.lock.release()
+
+        try:
+            await slot.lock.acquire()
+            token = _current_turn.set(release)
+            try:
+                self.ordered += 1
+                return await work()
+            finally:
+                _current_turn.reset(token)
+                release()
+        finally:
+            slot.pending -= 1
+            if not slot.pending:
+                del self._slots[key]
+
+    def stats(self) -> dict:
+        return {
+            "active_keys": len(self._slots),
+            "pending": sum(slot.pending for slot in self._slots.values()),
+            "ordered": self.ordered,
+            "unordered": self.unordered,
+        }
@@ -0,0 +1,45 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+from typing import Optional
+from urllib.parse import parse_qsl
+
+# Telegram WebApp initData older than this is refused, so a leaked one stops working
+WEBAPP_AUTH_MAX_AGE = int(os.environ.get('WEBAPP_AUTH_MAX_AGE', str(24 * 60 * 60)))
+INIT_DATA_HEADER = "X-Telegram-Init-Data"
+
+
+class InitDataError(Exception):
+    """initData is missing, forged or expired"""
+
+
+def sign_init_data(fields: dict, bot_token: str) -> str:
+    """HMAC-SHA256 of the data-check string, keyed by HMAC("WebAppData", bot token)"""
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    return hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int = WEBAPP_AUTH_MAX_AGE,
+                     now: Optional[float] = None) -> dict:
+    """Validate Telegram WebApp initData and return the user it was issued for.
+
+    See https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    if not init_data or not bot_token:
+        raise InitDataError("initData missing")
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    if not hmac.compare_digest(sign_init_data(fields, bot_token), received):
+        raise InitDataError("initData signature mismatch")
+    try:
+        auth_date = int(fields["auth_date"])
+        user = json.loads(fields["user"])
+        user["id"] = int(user["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InitDataError(f"initData malformed: {e}")
+    if (now if now is not None else time.time()) - auth_date > max_age:
+        raise InitDataError("initData expired")
+    return user
@@ -4,6 +4,7 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const READINGS_PAGE_SIZE = 20;
 
 // Telegram WebApp SDK
 const tg = window.Telegram?.WebApp;
@@ -11,9 +12,11 @@ const tg = window.Telegram?.WebApp;
 const LunaAura = () => {
   const [user, setUser] = useState(null);
   const [readings, setReadings] = useState([]);
+  const [readingsCursor, setReadingsCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState('dashboard');
   const [demoMode, setDemoMode] = useState(false);
+  const [liveReading, setLiveReading] = useState(null);
 
   useEffect(() => {
     // Initialize Telegram WebApp
@@ -104,15 +107,68 @@ const LunaAura = () => {
     }
   };
 
-  const fetchReadings = async (telegramId) => {
+  const fetchReadings = async (telegramId, cursor = null) => {
     try {
-      const response = await axios.get(`${API}/readings/${telegramId}`);
-      setReadings(response.data);
+      const response = await axios.get(`${API}/readings/${telegramId}`, {
+        params: { limit: READINGS_PAGE_SIZE, view: 'preview', ...(cursor && { cursor }) }
+      });
+      setReadings(prev => cursor ? [...prev, ...response.data] : response.data);
+      setReadingsCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error("Ошибка при получении чтений:", error);
     }
   };
 
+  // The list holds previews; the full text is fetched when a reading is opened
+  const openReading = async (readingId) => {
+    try {
+      const response = await axios.get(`${API}/readings/${user.telegram_id}/${readingId}`);
+      setReadings(prev => prev.map(reading => reading.id === readingId ? response.data : reading));
+    } catch (error) {
+      console.error("Ошибка при получении чтения:", error);
+    }
+  };
+
+  // Streams a new reading over SSE; the backend identifies the user by the signed initData
+  const streamReading = async () => {
+    setLiveReading({ text: "", status: "streaming" });
+    try {
+      const response = await fetch(`${API}/readings/stream`, {
+        headers: { "X-Telegram-Init-Data": tg?.initData || "" }
+      });
+      if (!response.ok) {
+        const detail = response.status === 402 ? "У вас закончились бесплатные чтения ✨" : "Не удалось получить чтение";
+        setLiveReading({ text: "", status: "error", detail });
+        return;
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1] || "message";
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || "{}");
+          if (event === "message") {
+            setLiveReading(prev => ({ ...prev, text: prev.text + data.delta }));
+          } else if (event === "done") {
+            setLiveReading(prev => ({ ...prev, status: "done" }));
+            fetchUserData(user.telegram_id);
+          } else if (event === "error") {
+            setLiveReading({ text: "", status: "error", detail: data.detail });
+          }
+        }
+      }
+    } catch (error) {
+      console.error("Ошибка при получении чтения:", error);
+      setLiveReading({ text: "", status: "error", detail: "Не удалось получить чтение" });
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('ru-RU', {
       year: 'numeric',
@@ -241,6 +297,15 @@ const LunaAura = () => {
             <div className="bg-black bg-opacity-30 backdrop-blur-lg rounded-xl border border-purple-500/30 p-6 animate-slideUp">
               <h3 className="text-xl font-bold text-white mb-4">🌟 Быстрые действия</h3>
               <div className="grid grid-cols-1 gap-3">
+                {!demoMode && (
+                  <button
+                    onClick={streamReading}
+                    disabled={liveReading?.status === 'streaming'}
+                    className="bg-gradient-to-r from-pink-600 to-purple-600 text-white py-3 px-4 rounded-lg font-medium hover:from-pink-700 hover:to-purple-700 transition-all transform hover:scale-105 shadow-lg disabled:opacity-60"
+                  >
+                    ✨ {liveReading?.status === 'streaming' ? 'Звезды говорят...' : 'Получить чтение сейчас'}
+                  </button>
+                )}
                 <button 
                   onClick={() => demoMode ? alert('Для задавания вопросов используйте бота в Telegram!') : tg?.close()}
                   className="bg-gradient-to-r from-purple-600 to-pink-600 text-white py-3 px-4 rounded-lg font-medium hover:from-purple-700 hover:to-pink-700 transition-all transform hover:scale-105 shadow-lg"
@@ -262,6 +327,23 @@ const LunaAura = () => {
               </div>
             </div>
 
+            {/* Streamed Reading */}
+            {liveReading && (
+              <div className="bg-black bg-opacity-30 backdrop-blur-lg rounded-xl border border-purple-500/30 p-6 animate-slideUp">
+                <h3 className="text-xl font-bold text-white mb-4">🔮 Ваше чтение</h3>
+                <div className="bg-gradient-to-br from-purple-900/30 to-pink-900/30 rounded-lg p-4 backdrop-blur-sm">
+                  {liveReading.status === 'error' ? (
+                    <div className="text-pink-200 text-sm">{liveReading.detail}</div>
+                  ) : (
+                    <div className="text-white text-sm leading-relaxed whitespace-pre-wrap">
+                      {liveReading.text}
+                      {liveReading.status === 'streaming' && <span className="animate-pulse"> ▌</span>}
+                    </div>
+                  )}
+                </div>
+              </div>
+            )}
+
             {/* Recent Reading */}
             {readings.length > 0 && (
               <div className="bg-black bg-opacity-30 backdrop-blur-lg rounded-xl border border-purple-500/30 p-6 animate-slideUp">
@@ -275,7 +357,7 @@ const LunaAura = () => {
                   </div>
                   <div className="text-white text-sm leading-relaxed">
                     {readings[0].reading.substring(0, 200)}
-                    {readings[0].reading.length > 200 && '...'}
+                    {(readings[0].truncated || readings[0].reading.length > 200) && '...'}
                   </div>
                 </div>
               </div>
@@ -322,11 +404,27 @@ const LunaAura = () => {
                     <div>
                       <div className="text-sm font-medium text-purple-200 mb-2">Ответ LunaAura:</div>
                       <div className="text-purple-100 leading-relaxed whitespace-pre-wrap">
-                        {reading.reading}
+                        {reading.reading}{reading.truncated && '...'}
                       </div>
+                      {reading.truncated && (
+                        <button
+                          onClick={() => openReading(reading.id)}
+                          className="mt-2 text-sm text-purple-300 hover:text-purple-200 font-medium transition-all"
+                        >
+                          Читать полностью
+                        </button>
+                      )}
                     </div>
                   </div>
                 ))}
+                {readingsCursor && (
+                  <button
+                    onClick={() => fetchReadings(user.telegram_id, readingsCursor)}
+                    className="w-full bg-black bg-opacity-30 backdrop-blur-lg rounded-xl border border-purple-500/30 py-3 text-purple-200 font-medium hover:border-purple-400/50 transition-all"
+                  >
+                    Показать еще чтения
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from broadcast import GENERAL_GROUP, GROUPS, DailyBroadcast
+from llm_batch import parse_batch_results
+
+
+class FakeRuns:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append(update["$set"])
+
+
+class FakeLLM:
+    """Batch API and direct completions; the batch answers every group but `general`"""
+
+    def __init__(self, status="completed"):
+        self.status = status
+        self.completed = []
+        self.cancelled = []
+        self.api = SimpleNamespace(
+            batches=SimpleNamespace(retrieve=self.retrieve, cancel=self.cancel),
+            files=SimpleNamespace(content=self.content),
+        )
+
+    async def retrieve(self, batch_id):
+        return SimpleNamespace(id=batch_id, status=self.status, output_file_id="file-out")
+
+    async def cancel(self, batch_id):
+        self.cancelled.append(batch_id)
+
+    async def content(self, file_id):
+        lines = [json.dumps({"custom_id": group, "response": {"status_code": 200, "body": {
+            "choices": [{"message": {"content": f"batch {group}"}}]}}}) for group in GROUPS if group != GENERAL_GROUP]
+        lines.append(json.dumps({"custom_id": GENERAL_GROUP, "response": {"status_code": 500}}))
+        return SimpleNamespace(text="\n".join(lines))
+
+    async def complete(self, messages, max_tokens=400):
+        self.completed.append(messages)
+        return "direct"
+
+
+def horoscopes(llm, run):
+    runs = FakeRuns()
+    broadcast = DailyBroadcast(SimpleNamespace(broadcast_runs=runs), bot=None, llm=llm)
+    return asyncio.run(broadcast._horoscopes(run, "2026-10-17")), runs.updates
+
+
+def test_prepared_batch_is_used_and_gaps_generated_directly():
+    llm = FakeLLM()
+    texts, updates = horoscopes(llm, {"_id": "daily-2026-10-17", "batch_id": "batch_1"})
+
+    assert texts["leo"] == "batch leo"
+    assert texts[GENERAL_GROUP] == "direct"
+    assert len(llm.completed) == 1
+    assert set(updates[0]) == {f"horoscopes.{group}" for group in GROUPS}
+
+
+def test_unfinished_batch_is_cancelled_and_generated_directly():
+    llm = FakeLLM(status="in_progress")
+    texts, _ = horoscopes(llm, {"_id": "daily-2026-10-17", "batch_id": "batch_1"})
+
+    assert set(texts.values()) == {"direct"}
+    assert len(llm.completed) == len(GROUPS)
+    assert llm.cancelled == ["batch_1"]
+
+
+def test_stored_horoscopes_are_reused():
+    llm = FakeLLM()
+    stored = {group: "stored" for group in GROUPS}
+    texts, updates = horoscopes(llm, {"_id": "daily-2026-10-17", "batch_id": "batch_1", "horoscopes": stored})
+
+    assert texts == stored
+    assert llm.completed == [] and updates == []
+
+
+def test_batch_results_with_no_text_count_as_failed():
+    def line(custom_id, status_code, content):
+        body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+        return json.dumps({"custom_id": custom_id, "response": {"status_code": status_code, "body": body}})
+
+    lines = [line("aries", 200, " Совет "), line("leo", 200, None), line("virgo", 500, "ignored"), ""]
+    assert parse_batch_results(lines) == {"aries": "Совет", "leo": None, "virgo": None}
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import cluster
+from cluster import Lease
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class Clock(datetime):
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+class FakeLeases:
+    """Emulates the lease upsert: a filter miss inserts, and a taken _id collides"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def update_one(self, filter, update, upsert=False):
+        doc = self.docs.get(filter["_id"])
+        if doc is None or any(self.matches(doc, clause) for clause in filter["$or"]):
+            self.docs[filter["_id"]] = {**(doc or {}), **update["$set"]}
+        elif upsert:
+            raise DuplicateKeyError("E11000 duplicate key")
+
+    async def delete_one(self, filter):
+        doc = self.docs.get(filter["_id"])
+        if doc is not None and doc["holder"] == filter["holder"]:
+            del self.docs[filter["_id"]]
+
+    @staticmethod
+    def matches(doc, clause):
+        if "holder" in clause:
+            return doc["holder"] == clause["holder"]
+        return doc["expires_at"] <= clause["expires_at"]["$lte"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    Clock.current = START
+    monkeypatch.setattr(cluster, "datetime", Clock)
+    return Clock
+
+
+def advance(clock, seconds):
+    clock.current += timedelta(seconds=seconds)
+
+
+def test_lease_cannot_be_stolen_before_it_expires(clock):
+    async def scenario():
+        leases = FakeLeases()
+        a = Lease(leases, "leader", "a", ttl=30, margin=10)
+        b = Lease(leases, "leader", "b", ttl=30, margin=10)
+        assert await a.acquire()
+        advance(clock, 29)
+        assert not await b.acquire()
+        assert not b.held
+        # Renewing pushes the expiry out again
+        assert await a.acquire()
+        advance(clock, 29)
+        assert not await b.acquire()
+        return leases
+
+    assert asyncio.run(scenario()).docs["leader"]["holder"] == "a"
+
+
+def test_expired_lease_is_taken_over(clock):
+    async def scenario():
+        leases = FakeLeases()
+        a = Lease(leases, "leader", "a", ttl=30, margin=10)
+        b = Lease(leases, "leader", "b", ttl=30, margin=10)
+        assert await a.acquire()
+        advance(clock, 20)
+        # The holder stops trusting its lease a margin before it expires
+        assert not a.held
+        advance(clock, 10)
+        assert await b.acquire() and b.held
+        assert not await a.acquire()
+        return leases
+
+    assert asyncio.run(scenario()).docs["leader"]["holder"] == "b"
+
+
+def test_released_lease_is_free_at_once(clock):
+    async def scenario():
+        leases = FakeLeases()
+        a = Lease(leases, "leader", "a", ttl=30)
+        b = Lease(leases, "leader", "b", ttl=30)
+        assert await a.acquire()
+        # Only the holder's release counts
+        await b.release()
+        assert not await b.acquire()
+        await a.release()
+        return await b.acquire()
+
+    assert asyncio.run(scenario())
@@ -0,0 +1,40 @@
+import pytest
+
+from geocoder import get_place_index
+
+
+@pytest.fixture(scope="module")
+def index():
+    return get_place_index()
+
+
+@pytest.mark.parametrize("text, name", [
+    ("Москва, Россия", "Moscow"),
+    ("москва", "Moscow"),
+    ("Санкт Петербрг", "Saint Petersburg"),
+    ("Новосиб", "Novosibirsk"),
+    ("Рим", "Rome"),
+    ("Киев, Украина", "Kyiv"),
+])
+def test_resolves_known_places(index, text, name):
+    assert index.resolve(text).name == name
+
+
+@pytest.mark.parametrize("text", [
+    # Kemerovo by prefix, but the user said Turkey
+    "Кемер, Турция",
+    # One edit away from Baku
+    "Бали, Индонезия",
+    "Бали",
+    "Кемер",
+])
+def test_does_not_guess_short_names(index, text):
+    assert index.resolve(text) is None
+
+
+def test_named_country_without_match_is_unresolved(index):
+    assert index.resolve("Москва, Франция") is None
+
+
+def test_named_country_picks_matching_city(index):
+    assert index.resolve("Анталья, Турция").country == "Turkey"
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+STATS_PATHS = ["/api/queue/stats", "/api/cache/stats", "/api/readings/inflight/stats", "/api/llm/stats",
+               "/api/send/stats", "/api/subscriptions/stats", "/api/cluster/status", "/api/ratelimit/stats"]
+
+
+@pytest.fixture
+def client():
+    # No context manager: startup would try to reach Mongo and Telegram
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("path", STATS_PATHS)
+def test_stats_need_the_admin_token(client, monkeypatch, path):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_loop_debug_stacks_need_the_admin_token(client, monkeypatch):
+    # Debug mode includes stack traces of blocking calls
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    assert client.get("/api/debug/loop").status_code == 403
+    assert client.get("/api/debug/loop", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_stats_are_off_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+    assert client.get("/api/llm/stats", headers={"X-Admin-Token": ""}).status_code == 403
@@ -0,0 +1,29 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm_client import EmptyCompletionError, LLMClient
+
+
+def client_returning(*contents, finish_reason="stop"):
+    async def create(**kwargs):
+        choices = [SimpleNamespace(index=i, finish_reason=finish_reason, message=SimpleNamespace(content=content))
+                   for i, content in enumerate(contents)]
+        return SimpleNamespace(choices=choices, usage=None)
+
+    llm = LLMClient(api_key="test")
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return llm
+
+
+def test_complete_strips_text():
+    assert asyncio.run(client_returning("  Звезды благосклонны.\n").complete([])) == "Звезды благосклонны."
+
+
+@pytest.mark.parametrize("content", [None, "", "   "])
+def test_empty_completion_is_a_failure(content):
+    llm = client_returning(content, finish_reason="content_filter")
+    with pytest.raises(EmptyCompletionError, match="content_filter"):
+        asyncio.run(llm.complete([]))
+    assert llm.in_flight == 0
@@ -0,0 +1,130 @@
+import asyncio
+
+import openai
+import pytest
+
+from llm_client import EmptyCompletionError
+from llm_resilience import CircuitBreaker, LLMUnavailableError, ResilientLLM
+
+
+class FakeLLM:
+    """Streams `deltas` with `delay` seconds before each; complete fails with `errors` first"""
+
+    model = "primary"
+    in_flight = 0
+
+    def __init__(self, deltas=(), delay=0.0, errors=()):
+        self.deltas = list(deltas)
+        self.delay = delay
+        self.errors = list(errors)
+        self.calls = []
+
+    async def complete(self, messages, model, max_tokens, temperature, timeout):
+        self.calls.append(model)
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"{model} reading"
+
+    async def stream(self, messages, model, max_tokens, temperature, timeout):
+        self.calls.append(model)
+        for delta in self.deltas:
+            await asyncio.sleep(self.delay)
+            yield delta
+
+
+def timeout_error():
+    return openai.APITimeoutError(request=None)
+
+
+async def collect(stream):
+    return [delta async for delta in stream]
+
+
+def test_breaker_opens_after_threshold_and_probes_once(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("llm_resilience.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock[0] += 31
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock[0] += 31
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def test_released_probe_lets_another_through(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("llm_resilience.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 11
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_retries_then_falls_back():
+    fake = FakeLLM(errors=[timeout_error(), timeout_error()])
+    llm = ResilientLLM(fake, fallback_models=["fallback"], attempts=2, backoff_base=0, breaker_threshold=5)
+
+    assert asyncio.run(llm.complete([], timeout=5)) == "fallback reading"
+    assert fake.calls == ["primary", "primary", "fallback"]
+    assert llm.retries == 1 and llm.fallbacks == 1
+
+
+def test_empty_completion_falls_back_without_retrying():
+    fake = FakeLLM(errors=[EmptyCompletionError("primary returned an empty completion (content_filter)")])
+    llm = ResilientLLM(fake, fallback_models=["fallback"], attempts=3, backoff_base=0)
+
+    assert asyncio.run(llm.complete([], timeout=5)) == "fallback reading"
+    assert fake.calls == ["primary", "fallback"]
+    assert llm.breakers["primary"].failures == 0
+
+
+def test_open_breaker_fast_fails_to_fallback():
+    fake = FakeLLM()
+    llm = ResilientLLM(fake, fallback_models=["fallback"], breaker_threshold=1)
+    llm._breaker("primary").record_failure()
+
+    assert asyncio.run(llm.complete([], timeout=5)) == "fallback reading"
+    assert fake.calls == ["fallback"]
+    assert llm.fast_failures == 1
+
+
+def test_stream_deadline_covers_whole_stream():
+    # The first delta arrives in time, the stream as a whole does not
+    fake = FakeLLM(deltas=["a", "b", "c", "d", "e"], delay=0.05)
+    llm = ResilientLLM(fake, fallback_models=[], breaker_threshold=5)
+
+    async def scenario():
+        received = []
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(LLMUnavailableError):
+            async for delta in llm.stream([], timeout=0.12):
+                received.append(delta)
+        return received, asyncio.get_running_loop().time() - started
+
+    received, elapsed = asyncio.run(scenario())
+    assert received == ["a", "b"]
+    assert elapsed < 0.2
+    assert llm.breakers["primary"].failures == 1
+
+
+def test_stream_within_deadline_completes():
+    fake = FakeLLM(deltas=["a", "b", "c"], delay=0.01)
+    llm = ResilientLLM(fake, fallback_models=[])
+    assert asyncio.run(collect(llm.stream([], timeout=1))) == ["a", "b", "c"]
+    assert llm.breakers["primary"].state == "closed"
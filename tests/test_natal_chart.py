@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from natal_chart import BODIES, birth_window, chart_for_user, compute_angles, interpolate_longitudes, julian_day, natal_chart
+
+# Geocentric longitudes from Meeus, Astronomical Algorithms (examples 25.a, 33.a, 47.a),
+# and for J2000 from the published ephemeris; the engine is good to a few tenths of a degree
+REFERENCE = [
+    (datetime(1992, 10, 13, tzinfo=timezone.utc), "sun", 199.91),
+    (datetime(1992, 12, 20, tzinfo=timezone.utc), "venus", 313.08),
+    (datetime(1992, 4, 12, tzinfo=timezone.utc), "moon", 133.16),
+]
+J2000_CHART = {"sun": 280.37, "moon": 223.3, "mercury": 271.9, "venus": 241.6, "mars": 327.9,
+               "jupiter": 25.2, "saturn": 40.4, "uranus": 314.8, "neptune": 303.2, "pluto": 251.5}
+
+
+def longitudes(when):
+    return interpolate_longitudes(np.array([julian_day(when)]))[0][0]
+
+
+@pytest.mark.parametrize("when, body, expected", REFERENCE)
+def test_matches_reference_positions(when, body, expected):
+    assert longitudes(when)[BODIES.index(body)] == pytest.approx(expected, abs=0.3)
+
+
+def test_matches_j2000_chart():
+    computed = longitudes(datetime(2000, 1, 1, 12, tzinfo=timezone.utc))
+    for body, expected in J2000_CHART.items():
+        assert computed[BODIES.index(body)] == pytest.approx(expected, abs=0.5), body
+
+
+def test_angles_on_the_equator():
+    # With the vernal point on the meridian, Cancer 0° rises at the equator
+    lon = -280.46061837
+    asc, mc = compute_angles(np.array([2451545.0]), np.array([0.0]), np.array([lon]))
+    assert asc[0] == pytest.approx(90.0, abs=1e-6)
+    assert min(mc[0], 360.0 - mc[0]) == pytest.approx(0.0, abs=1e-6)
+
+
+def test_exact_chart_uses_the_birth_time_zone():
+    chart = natal_chart("2000-01-01", "15:00", 55.7558, 37.6173, "Europe/Moscow")
+    assert not chart["approximate"]
+    # 15:00 in Moscow is 12:00 UTC
+    moon = chart["bodies"]["moon"]
+    assert moon["sign"] == "scorpio" and moon["degree"] == pytest.approx(J2000_CHART["moon"] - 210, abs=0.5)
+    assert "ascendant" in chart and len(chart["houses"]) == 12
+
+
+def test_unknown_time_zone_leaves_out_time_sensitive_fields():
+    chart = natal_chart("2000-01-01", "15:00", 55.7558, 37.6173, tz=None)
+    assert chart["approximate"]
+    assert "ascendant" not in chart and "houses" not in chart
+    assert all("degree" not in position and "house" not in position for position in chart["bodies"].values())
+    # The Sun stays in Capricorn whatever the zone; the Moon moves about 14° in the window
+    assert chart["bodies"]["sun"] == {"sign": "capricorn"}
+
+
+def test_moon_is_left_out_when_its_sign_is_uncertain():
+    # The Moon entered Sagittarius a minute after midnight Moscow time, so the day spans two signs
+    assert "moon" not in natal_chart("2000-01-03", None, tz="Europe/Moscow")["bodies"]
+
+
+def test_birth_window():
+    earliest, latest = birth_window("2000-01-01", "15:00", "Europe/Moscow")
+    assert earliest == latest == datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+    earliest, latest = birth_window("2000-01-01", "15:00")
+    assert earliest == datetime(2000, 1, 1, 1, tzinfo=timezone.utc)
+    assert latest == datetime(2000, 1, 2, 3, tzinfo=timezone.utc)
+
+
+def test_missing_time_zone_is_resolved_from_the_birth_place():
+    chart = chart_for_user({"birth_date": "2000-01-01", "birth_time": "15:00", "birth_place": "Москва"})
+    assert not chart["approximate"] and "ascendant" in chart
+    assert chart_for_user({"birth_date": "2000-01-01", "birth_time": "15:00", "birth_place": "Атлантида"})["approximate"]
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from quota import has_readings_left, is_subscribed
+
+NOW = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+
+
+def test_is_subscribed():
+    assert is_subscribed({"subscription_active": True, "subscription_end": NOW + timedelta(days=1)}, NOW)
+    assert not is_subscribed({"subscription_active": True, "subscription_end": NOW - timedelta(days=1)}, NOW)
+    assert not is_subscribed({"subscription_active": False, "subscription_end": NOW + timedelta(days=1)}, NOW)
+    assert not is_subscribed({"subscription_active": True}, NOW)
+
+
+def test_is_subscribed_accepts_naive_and_string_ends():
+    # Mongo returns naive UTC datetimes, JSON round trips give ISO strings
+    assert is_subscribed({"subscription_active": True,
+                          "subscription_end": (NOW + timedelta(days=1)).replace(tzinfo=None)}, NOW)
+    assert is_subscribed({"subscription_active": True, "subscription_end": "2026-10-18T12:00:00Z"}, NOW)
+
+
+def test_has_readings_left():
+    assert has_readings_left({"free_readings_left": 1}, NOW)
+    assert not has_readings_left({"free_readings_left": 0}, NOW)
+    assert not has_readings_left({}, NOW)
+    assert has_readings_left({"free_readings_left": 0, "subscription_active": True,
+                              "subscription_end": NOW + timedelta(days=1)}, NOW)
+    assert not has_readings_left({"free_readings_left": 0, "subscription_active": True,
+                                  "subscription_end": NOW - timedelta(days=1)}, NOW)
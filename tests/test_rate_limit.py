@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from rate_limit import RateLimiter, TokenBucket
+
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=0.5, capacity=3)
+    now = bucket.updated
+    assert [bucket.take(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(now) == pytest.approx(2.0)
+
+
+def test_bucket_refills_at_rate_up_to_capacity():
+    bucket = TokenBucket(rate=1, capacity=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.take(now + 0.5) == pytest.approx(0.5)
+    assert bucket.take(now + 1) == 0.0
+    # A long idle period refills to capacity, not beyond
+    assert [bucket.take(now + 100) for _ in range(3)][-1] > 0
+
+
+def test_zero_rate_never_refills():
+    bucket = TokenBucket(rate=0, capacity=1)
+    bucket.take(bucket.updated)
+    assert bucket.take(bucket.updated + 1000) == float("inf")
+
+
+def test_limiter_applies_tier_per_key_and_global_bucket():
+    async def scenario():
+        limiter = RateLimiter(tiers={"free": (0.001, 2), "premium": (0.001, 4)}, global_rate=0.001, global_burst=4)
+        free = [await limiter.check("a", "free") for _ in range(3)]
+        premium = [await limiter.check("b", "premium") for _ in range(3)]
+        return free, premium, limiter
+
+    free, premium, limiter = asyncio.run(scenario())
+    assert [bool(wait) for wait in free] == [False, False, True]
+    # Premium's own bucket has room, but the global bucket ran out after four
+    assert [bool(wait) for wait in premium] == [False, False, True]
+    assert limiter.stats()["allowed"] == 4 and limiter.stats()["rejected"] == 2
+
+
+def test_limiter_evicts_idle_keys():
+    async def scenario():
+        limiter = RateLimiter(tiers={"free": (0.001, 1)}, global_burst=100, max_keys=2)
+        for key in ("a", "b", "c"):
+            await limiter.check(key)
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.stats()["tracked_keys"] == 2
+
+
+def test_new_bucket_grants_its_burst_to_an_earlier_check_time():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.take(bucket.updated - 0.01) == 0.0
@@ -0,0 +1,68 @@
+from reading_cache import ReadingCache, personal_patterns
+
+ANNA = {"telegram_id": 1, "first_name": "Анна", "birth_date": "1995-08-15", "birth_time": "14:30",
+        "birth_place": "Москва"}
+OLGA = {"telegram_id": 2, "first_name": "Ольга", "birth_date": "1990-08-10", "birth_time": "06:00",
+        "birth_place": "Казань"}
+IVAN = {"telegram_id": 3, "first_name": "Иван", "birth_date": "1988-03-25", "birth_time": "09:15",
+        "birth_place": "Санкт-Петербург"}
+QUESTION = "Что меня ждет в любви?"
+READING = "Львам этой осенью стоит довериться интуиции: Венера обещает теплую встречу."
+
+
+def test_same_sun_sign_shares_readings():
+    cache = ReadingCache(variants=1)
+    cache.put(ANNA, QUESTION, READING)
+
+    assert cache.make_key(ANNA, QUESTION) == cache.make_key(OLGA, "что меня ждет в любви")
+    assert cache.get(OLGA, "что меня ждет в любви") == READING
+    assert cache.get(IVAN, QUESTION) is None
+
+
+def test_personal_readings_are_not_stored():
+    cache = ReadingCache(variants=1)
+    personal = [
+        "Анна, звезды на вашей стороне.",
+        "Анне стоит довериться интуиции.",
+        "Рожденным 15 августа везет в любви.",
+        "В 1995 году Юпитер стоял в Стрельце.",
+        "Рождение в 14:30 дает сильный асцендент.",
+        "Москве и ее жителям везет этой осенью.",
+    ]
+    for reading in personal:
+        cache.put(ANNA, QUESTION, reading)
+
+    assert cache.get(OLGA, QUESTION) is None
+    assert cache.stats()["personal_skips"] == len(personal)
+    assert cache.stats()["keys"] == 0
+
+
+def test_personal_patterns_cover_multiword_places():
+    patterns = personal_patterns(IVAN)
+    assert any(pattern.search("Петербургу свойственна меланхолия") for pattern in patterns)
+    assert not any(pattern.search(READING) for pattern in patterns)
+
+
+def test_variant_is_never_served_back_to_its_author():
+    cache = ReadingCache(variants=1)
+    cache.put(ANNA, QUESTION, READING)
+
+    assert cache.get(ANNA, QUESTION) is None
+
+
+def test_served_variants_are_not_repeated():
+    cache = ReadingCache(variants=2)
+    cache.put(ANNA, QUESTION, "first")
+    cache.put(ANNA, QUESTION, "second")
+
+    served = {cache.get(OLGA, QUESTION), cache.get(OLGA, QUESTION)}
+    assert served == {"first", "second"}
+    assert cache.get(OLGA, QUESTION) is None
+
+
+def test_pool_fills_before_serving():
+    cache = ReadingCache(variants=2)
+    cache.put(ANNA, QUESTION, "first")
+    assert cache.get(OLGA, QUESTION) is None
+    cache.put(ANNA, QUESTION, "second")
+    assert cache.get(OLGA, QUESTION) in {"first", "second"}
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+
+import server
+
+USER_DOC = {"telegram_id": 1, "first_name": "Анна", "free_readings_left": 2}
+
+
+class FakeMessage:
+    def __init__(self, text="Что меня ждет в любви?"):
+        self.text = text
+        self.from_user = SimpleNamespace(id=1)
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    """Records refunds and saves around a reservation that charged a free reading"""
+    ledger = SimpleNamespace(refunds=[], saved=[])
+
+    async def reserve_reading(telegram_id):
+        return dict(USER_DOC), True
+
+    async def refund_reading(telegram_id, charged_free):
+        ledger.refunds.append((telegram_id, charged_free))
+
+    async def save_reading(user_doc, question, reading):
+        ledger.saved.append(reading)
+
+    monkeypatch.setattr(server, "reserve_reading", reserve_reading)
+    monkeypatch.setattr(server, "refund_reading", refund_reading)
+    monkeypatch.setattr(server, "save_reading", save_reading)
+    return ledger
+
+
+def deliver_returning(result=None, error=None):
+    async def deliver_reading(message, user_doc, question, title, keyboard):
+        if error is not None:
+            raise error
+        return result
+    return deliver_reading
+
+
+def test_delivered_reading_is_saved_not_refunded(monkeypatch, ledger):
+    monkeypatch.setattr(server, "deliver_reading", deliver_returning("Звезды благосклонны"))
+    asyncio.run(server.handle_messages(FakeMessage()))
+    assert ledger.saved == ["Звезды благосклонны"]
+    assert ledger.refunds == []
+
+
+def test_failed_generation_is_refunded(monkeypatch, ledger):
+    monkeypatch.setattr(server, "deliver_reading", deliver_returning(None))
+    asyncio.run(server.handle_messages(FakeMessage()))
+    assert ledger.saved == []
+    assert ledger.refunds == [(1, True)]
+
+
+def test_telegram_error_after_reservation_is_refunded(monkeypatch, ledger):
+    error = TelegramBadRequest(EditMessageText(text="x"), "can't parse entities")
+    monkeypatch.setattr(server, "deliver_reading", deliver_returning(error=error))
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(server.handle_messages(FakeMessage()))
+    assert ledger.refunds == [(1, True)]
+
+
+def test_failed_save_is_refunded(monkeypatch, ledger):
+    async def save_reading(user_doc, question, reading):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(server, "save_reading", save_reading)
+    monkeypatch.setattr(server, "deliver_reading", deliver_returning("Звезды благосклонны"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.handle_messages(FakeMessage()))
+    assert ledger.refunds == [(1, True)]
+
+
+def test_pooled_reading_send_failure_is_refunded(monkeypatch, ledger):
+    class FailingMessage(FakeMessage):
+        async def answer(self, text, **kwargs):
+            raise TelegramBadRequest(EditMessageText(text="x"), "can't parse entities")
+
+    async def callback_answer():
+        pass
+
+    callback_query = SimpleNamespace(from_user=SimpleNamespace(id=1), message=FailingMessage(),
+                                     answer=callback_answer)
+    monkeypatch.setattr(server, "READING_POOL_ENABLED", True)
+    monkeypatch.setattr(server.reading_pool, "take", lambda user_doc: "Готовое чтение")
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(server.process_get_reading(callback_query))
+    assert ledger.refunds == [(1, True)]
@@ -0,0 +1,51 @@
+import asyncio
+
+from reading_pool import ReadingPool
+
+FREE_USER = {"telegram_id": 1, "first_name": "Анна", "birth_date": "1995-08-15", "free_readings_left": 1}
+
+
+def run_pool(requested: dict, stored: dict):
+    """Request a refill for `requested` while the database holds `stored`; returns generations"""
+    async def scenario():
+        generated = []
+
+        async def generate(user_doc):
+            generated.append(user_doc["telegram_id"])
+            return "reading"
+
+        async def load_user(telegram_id):
+            return dict(stored)
+
+        pool = ReadingPool(generate, load_user, depth=1, workers=1)
+        pool.start()
+        pool.request(requested)
+        await asyncio.wait_for(pool._refills.join(), 1)
+        await pool.stop()
+        return generated, pool
+
+    return asyncio.run(scenario())
+
+
+def test_refills_for_user_with_readings_left():
+    generated, pool = run_pool(FREE_USER, FREE_USER)
+    assert generated == [1]
+    assert pool.take(FREE_USER) == "reading"
+
+
+def test_no_refill_after_last_free_reading():
+    spent = {**FREE_USER, "free_readings_left": 0}
+    generated, pool = run_pool(spent, spent)
+    assert generated == []
+    assert pool.stats()["pending_refills"] == 0
+
+
+def test_no_refill_if_readings_ran_out_before_generation():
+    generated, _ = run_pool(FREE_USER, {**FREE_USER, "free_readings_left": 0})
+    assert generated == []
+
+
+def test_no_refill_without_birth_data():
+    user = {key: value for key, value in FREE_USER.items() if key != "birth_date"}
+    generated, _ = run_pool(user, user)
+    assert generated == []
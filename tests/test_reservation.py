@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from quota import has_readings_left
+
+NOW = datetime.now(timezone.utc)
+
+
+def bson(x):
+    """Mongo keeps datetimes as UTC and compares them regardless of tzinfo"""
+    if isinstance(x, datetime) and x.tzinfo is not None:
+        return x.astimezone(timezone.utc).replace(tzinfo=None)
+    return x
+
+
+def value(doc, expression):
+    """Evaluate the aggregation operators reserve_reading's pipeline uses"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return doc.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    if operator == "$and":
+        return all(value(doc, arg) for arg in args)
+    left, right = (value(doc, arg) for arg in args[:2])
+    if operator == "$eq":
+        return left == right
+    if operator == "$gt":
+        return left is not None and bson(left) > bson(right)
+    if operator == "$subtract":
+        return left - right
+    if operator == "$cond":
+        return value(doc, args[1]) if value(doc, args[0]) else value(doc, args[2])
+    raise NotImplementedError(operator)
+
+
+def matches(doc, query):
+    for field, expected in query.items():
+        if field == "$or":
+            if not any(matches(doc, branch) for branch in expected):
+                return False
+        elif isinstance(expected, dict):
+            if doc.get(field) is None or not bson(doc[field]) > bson(expected["$gt"]):
+                return False
+        elif doc.get(field) != expected:
+            return False
+    return True
+
+
+class FakeUsers:
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def find_one_and_update(self, query, pipeline, return_document=None):
+        if not matches(self.doc, query):
+            return None
+        for stage in pipeline:
+            self.doc.update({field: value(self.doc, expression) for field, expression in stage["$set"].items()})
+        return dict(self.doc)
+
+    async def update_one(self, query, update):
+        assert matches(self.doc, query)
+        for field, amount in update["$inc"].items():
+            self.doc[field] += amount
+
+
+@pytest.fixture
+def users(monkeypatch):
+    def install(**fields):
+        users = FakeUsers({"telegram_id": 1, "free_readings_left": 0, **fields})
+        monkeypatch.setattr(server, "db", SimpleNamespace(users=users))
+        return users
+    return install
+
+
+def test_free_reading_is_charged_and_refunded(users):
+    users = users(free_readings_left=1)
+    doc, charged_free = asyncio.run(server.reserve_reading(1))
+    assert charged_free and doc["free_readings_left"] == 0
+    asyncio.run(server.refund_reading(1, charged_free))
+    assert users.doc["free_readings_left"] == 1
+
+
+def test_no_quota_reserves_nothing(users):
+    users(free_readings_left=0)
+    assert asyncio.run(server.reserve_reading(1)) == (None, False)
+
+
+def test_active_subscription_keeps_free_readings(users):
+    users = users(free_readings_left=1, subscription_active=True, subscription_end=NOW + timedelta(days=3))
+    doc, charged_free = asyncio.run(server.reserve_reading(1))
+    assert not charged_free and doc["free_readings_left"] == 1
+    # Nothing was charged, so the refund must not hand out an extra reading
+    asyncio.run(server.refund_reading(1, charged_free))
+    assert users.doc["free_readings_left"] == 1
+
+
+def test_naive_subscription_end_is_treated_as_utc(users):
+    # Older documents stored subscription_end without a timezone
+    end = (NOW + timedelta(days=3)).replace(tzinfo=None)
+    users(free_readings_left=1, subscription_active=True, subscription_end=end)
+    _, charged_free = asyncio.run(server.reserve_reading(1))
+    assert not charged_free
+
+
+def test_expired_subscription_falls_back_to_free_readings(users):
+    users = users(free_readings_left=2, subscription_active=True, subscription_end=NOW - timedelta(days=1))
+    doc, charged_free = asyncio.run(server.reserve_reading(1))
+    assert charged_free and doc["free_readings_left"] == 1
+
+
+@pytest.mark.parametrize("fields", [
+    {"free_readings_left": 0},
+    {"free_readings_left": 3},
+    {"free_readings_left": 0, "subscription_active": True, "subscription_end": NOW + timedelta(hours=1)},
+    {"free_readings_left": 0, "subscription_active": True, "subscription_end": NOW - timedelta(hours=1)},
+    {"free_readings_left": 0, "subscription_active": False, "subscription_end": NOW + timedelta(hours=1)},
+])
+def test_reservation_agrees_with_has_readings_left(users, fields):
+    users(**fields)
+    doc, _ = asyncio.run(server.reserve_reading(1))
+    assert (doc is not None) == has_readings_left({"telegram_id": 1, **fields})
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from send_scheduler import LANE_BROADCAST, LANE_PAYMENT, LANE_READING, SendScheduler, SendSchedulerMiddleware
+
+
+def test_urgent_lanes_go_first():
+    async def scenario():
+        scheduler = SendScheduler(global_limit=20, global_period=1)
+        order = []
+
+        async def send(chat_id, lane, name):
+            await scheduler.acquire(chat_id, lane)
+            order.append(name)
+
+        # The first send takes the global slot; the rest queue up behind it
+        await send(1, LANE_BROADCAST, "first")
+        tasks = [
+            asyncio.create_task(send(2, LANE_BROADCAST, "broadcast")),
+            asyncio.create_task(send(3, LANE_READING, "reading")),
+            asyncio.create_task(send(4, LANE_PAYMENT, "payment")),
+        ]
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["first", "payment", "reading", "broadcast"]
+    assert stats["sent"] == {"payment": 1, "interactive": 0, "reading": 1, "broadcast": 2}
+
+
+def test_flood_wait_holds_back_only_that_chat():
+    async def scenario():
+        scheduler = SendScheduler(global_limit=1000)
+        middleware = SendSchedulerMiddleware(scheduler, max_retries=1)
+        sent = []
+
+        async def make_request(bot, method):
+            if method.chat_id == 1 and not any(chat_id == 1 for chat_id, _ in sent):
+                sent.append((1, None))
+                raise TelegramRetryAfter(method, "Too Many Requests", retry_after=0.2)
+            sent.append((method.chat_id, time.monotonic()))
+            return True
+
+        started = time.monotonic()
+        await asyncio.gather(
+            middleware(make_request, None, SendMessage(chat_id=1, text="a")),
+            middleware(make_request, None, SendMessage(chat_id=2, text="b")),
+        )
+        await scheduler.close()
+        return started, dict(sent[1:]), scheduler.flood_waits
+
+    started, sent_at, flood_waits = asyncio.run(scenario())
+    assert flood_waits == 1
+    assert sent_at[1] - started >= 0.2
+    assert sent_at[2] - started < 0.1
+
+
+def test_flood_wait_gives_up_after_retries():
+    async def scenario():
+        scheduler = SendScheduler(global_limit=1000)
+        middleware = SendSchedulerMiddleware(scheduler, max_retries=1)
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append(method)
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=0)
+
+        try:
+            await middleware(make_request, None, SendMessage(chat_id=1, text="a"))
+        finally:
+            await scheduler.close()
+            assert len(calls) == 2
+
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(scenario())
+
+
+def test_calls_without_a_chat_bypass_the_scheduler():
+    async def scenario():
+        scheduler = SendScheduler()
+        middleware = SendSchedulerMiddleware(scheduler)
+
+        async def make_request(bot, method):
+            return True
+
+        await middleware(make_request, None, AnswerCallbackQuery(callback_query_id="1"))
+        return scheduler.stats()
+
+    assert sum(asyncio.run(scenario())["sent"].values()) == 0
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from subscriptions import SubscriptionSweeper
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeUsers:
+    """Just the active/subscription_end/_id queries the sweeper makes"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def matches(self, doc, query):
+        end = query["subscription_end"]
+        return (doc["subscription_active"] == query["subscription_active"]
+                and doc["subscription_end"] <= end["$lte"]
+                and doc["_id"] in query.get("_id", {}).get("$in", [doc["_id"]]))
+
+    def find(self, query, projection=None):
+        return Cursor([doc for doc in self.docs if self.matches(doc, query)])
+
+    async def update_many(self, query, update):
+        matched = [doc for doc in self.docs if self.matches(doc, query)]
+        for doc in matched:
+            doc.update(update["$set"])
+        return SimpleNamespace(modified_count=len(matched))
+
+
+def user(telegram_id, ends_in):
+    end = datetime.now(timezone.utc) + timedelta(seconds=ends_in)
+    return {"_id": telegram_id, "telegram_id": telegram_id, "subscription_active": True, "subscription_end": end}
+
+
+def test_sweeper_expires_in_heap_order():
+    async def scenario():
+        # Stored out of order; one far beyond the lookahead
+        users = FakeUsers([user(3, 0.3), user(1, 0.05), user(4, 3600), user(2, 0.15)])
+        expired = []
+        sweeper = SubscriptionSweeper(SimpleNamespace(users=users), on_expired=expired.append, lookahead=60)
+        task = asyncio.create_task(sweeper.run())
+        await asyncio.sleep(0.1)
+        after_first = list(expired)
+        await asyncio.sleep(0.35)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return after_first, expired, users, sweeper.stats()
+
+    after_first, expired, users, stats = asyncio.run(scenario())
+    # Each user is flipped when their own subscription ends, not on a fixed sweep
+    assert after_first == [[1]]
+    assert expired == [[1], [2], [3]]
+    assert [doc["subscription_active"] for doc in sorted(users.docs, key=lambda doc: doc["_id"])] == [False, False, False, True]
+    assert stats["sweeps"] == 3 and stats["scheduled"] == 0
+
+
+def test_renewal_after_loading_is_not_expired():
+    async def scenario():
+        users = FakeUsers([user(1, 0.05), user(2, 0.1)])
+        expired = []
+        sweeper = SubscriptionSweeper(SimpleNamespace(users=users), on_expired=expired.append, lookahead=60)
+        task = asyncio.create_task(sweeper.run())
+        await asyncio.sleep(0.01)
+        # User 1 renews after the heap was loaded
+        renewed = user(1, 3600)
+        users.docs[0].update(subscription_end=renewed["subscription_end"])
+        sweeper.schedule(1, renewed["subscription_end"])
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return expired, users
+
+    expired, users = asyncio.run(scenario())
+    assert expired == [[2]]
+    assert users.docs[0]["subscription_active"]
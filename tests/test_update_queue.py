@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from update_queue import InMemoryUpdateQueue, MongoUpdateQueue, QueueFullError, UpdateQueue, UpdateWorkerPool
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+class FakeDB:
+    def __getattr__(self, name):
+        collection = FakeCollection()
+        setattr(self, name, collection)
+        return collection
+
+
+def test_pool_rejects_beyond_capacity_for_one_user():
+    async def scenario():
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(item):
+            await release.wait()
+            handled.append(item)
+
+        pool = UpdateWorkerPool(InMemoryUpdateQueue(maxsize=10), handler, workers=2, put_timeout=0)
+        pool.start()
+        rejected = 0
+        for update_id in range(200):
+            try:
+                await pool.submit({"user": 1, "update_id": update_id})
+            except QueueFullError:
+                rejected += 1
+            await asyncio.sleep(0)
+        depth = pool.queue.qsize()
+        release.set()
+        await pool.stop()
+        return rejected, depth, len(handled), pool.stats()
+
+    rejected, depth, handled, stats = asyncio.run(scenario())
+    # Two items are held by the workers, ten wait in the queue
+    assert depth == 10
+    assert handled == 12
+    assert rejected == 188
+    assert stats["rejected"] == 188
+
+
+def test_pool_refuses_items_after_stop():
+    async def scenario():
+        pool = UpdateWorkerPool(InMemoryUpdateQueue(maxsize=10), lambda item: asyncio.sleep(0), workers=1)
+        pool.start()
+        await pool.stop()
+        await pool.submit("late")
+
+    with pytest.raises(QueueFullError):
+        asyncio.run(scenario())
+
+
+def test_mongo_queue_rejects_when_store_is_full():
+    async def scenario():
+        queue = MongoUpdateQueue(FakeDB(), key=lambda item: item["user"], order=lambda item: item["update_id"],
+                                 encode=dict, decode=dict, maxsize=3)
+        for update_id in range(3):
+            await queue.put({"user": 1, "update_id": update_id})
+        assert queue.qsize() == 3
+        with pytest.raises(QueueFullError):
+            await queue.put({"user": 2, "update_id": 3})
+        return queue.collection.docs
+
+    docs = asyncio.run(scenario())
+    assert [doc["order"] for doc in docs] == [0, 1, 2]
+
+
+def test_mongo_queue_shards_are_stable():
+    queue = MongoUpdateQueue(FakeDB(), key=lambda item: item, order=id, encode=dict, decode=dict, shards=64)
+    assert queue.shard_of(130) == 2
+    assert queue.shard_of("user-7") == queue.shard_of("user-7") < 64
+
+
+def test_incomplete_queue_fails_on_creation():
+    class GetOnlyQueue(UpdateQueue):
+        async def get(self):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        GetOnlyQueue()
+
+
+def test_in_memory_queue_refuses_when_full():
+    async def scenario():
+        queue = InMemoryUpdateQueue(maxsize=1)
+        await queue.put("a", timeout=0)
+        with pytest.raises(QueueFullError):
+            await queue.put("b", timeout=0.01)
+        return queue.qsize()
+
+    assert asyncio.run(scenario()) == 1
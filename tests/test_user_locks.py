@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from user_locks import KeyedSerializer, UpdateTurns, UserBusyError, yield_turn
+
+
+async def slow(result, events, delay=0.01):
+    events.append(f"start {result}")
+    await asyncio.sleep(delay)
+    events.append(f"end {result}")
+    return result
+
+
+def test_reject_refuses_second_call_while_busy():
+    async def scenario():
+        serializer = KeyedSerializer("reject")
+        events = []
+        first = asyncio.create_task(serializer.run(1, lambda: slow("a", events)))
+        await asyncio.sleep(0)
+        with pytest.raises(UserBusyError):
+            await serializer.run(1, lambda: slow("b", events))
+        # Other keys are unaffected
+        assert await serializer.run(2, lambda: slow("c", events)) == "c"
+        assert await first == "a"
+        return serializer
+
+    serializer = asyncio.run(scenario())
+    assert serializer.rejected == 1
+    assert serializer.stats()["active_keys"] == 0
+
+
+def test_queue_runs_in_order_up_to_limit():
+    async def scenario():
+        serializer = KeyedSerializer("queue", max_pending=1)
+        events = []
+        first = asyncio.create_task(serializer.run(1, lambda: slow("a", events)))
+        second = asyncio.create_task(serializer.run(1, lambda: slow("b", events)))
+        await asyncio.sleep(0)
+        with pytest.raises(UserBusyError):
+            await serializer.run(1, lambda: slow("c", events))
+        return await asyncio.gather(first, second), events
+
+    results, events = asyncio.run(scenario())
+    assert results == ["a", "b"]
+    # One at a time: b starts only after a ends
+    assert events == ["start a", "end a", "start b", "end b"]
+
+
+def test_coalesce_shares_matching_call():
+    async def scenario():
+        serializer = KeyedSerializer("coalesce", max_pending=2)
+        events = []
+        first = asyncio.create_task(serializer.run(1, lambda: slow("a", events), tag="q"))
+        await asyncio.sleep(0)
+        shared = await serializer.run(1, lambda: slow("b", events), tag="q")
+        return await first, shared, events, serializer
+
+    first, shared, events, serializer = asyncio.run(scenario())
+    assert first == shared == "a"
+    assert events == ["start a", "end a"]
+    assert serializer.coalesced == 1 and serializer.executed == 1
+
+
+def test_coalesced_callers_share_failure():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    async def scenario():
+        serializer = KeyedSerializer("coalesce")
+        first = asyncio.create_task(serializer.run(1, failing, tag="q"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(serializer.run(1, failing, tag="q"))
+        return await asyncio.gather(first, second, return_exceptions=True), serializer
+
+    results, serializer = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert serializer.stats()["active_keys"] == 0
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError):
+        KeyedSerializer("drop")
+
+
+def test_turns_run_a_users_updates_in_order():
+    async def scenario():
+        turns = UpdateTurns()
+        events = []
+        tasks = [asyncio.create_task(turns.run(1, lambda name=name: slow(name, events))) for name in "abc"]
+        # Another user's update doesn't wait behind them
+        await turns.run(2, lambda: slow("other", events, delay=0))
+        await asyncio.gather(*tasks)
+        return turns, events
+
+    turns, events = asyncio.run(scenario())
+    own = [event for event in events if "other" not in event]
+    assert own == ["start a", "end a", "start b", "end b", "start c", "end c"]
+    assert events.index("end other") < events.index("end a")
+    assert turns.stats()["active_keys"] == 0
+
+
+def test_yielded_turn_lets_the_next_update_start():
+    async def scenario():
+        turns = UpdateTurns()
+        events = []
+
+        async def reading():
+            events.append("reserved")
+            yield_turn()
+            await asyncio.sleep(0.01)
+            events.append("reading sent")
+
+        async def edit():
+            events.append("profile edited")
+
+        await asyncio.gather(turns.run(1, reading), turns.run(1, edit))
+        return events
+
+    assert asyncio.run(scenario()) == ["reserved", "profile edited", "reading sent"]
+
+
+def test_turns_beyond_the_limit_run_out_of_turn():
+    async def scenario():
+        turns = UpdateTurns(max_waiting=1)
+        events = []
+        tasks = [asyncio.create_task(turns.run(1, lambda name=name: slow(name, events))) for name in "abc"]
+        await asyncio.gather(*tasks)
+        return turns, events
+
+    turns, events = asyncio.run(scenario())
+    # a runs, b waits, c doesn't fit and starts alongside a
+    assert events[:2] == ["start a", "start c"]
+    assert events.index("start b") > events.index("end a")
+    assert (turns.ordered, turns.unordered) == (2, 1)
+
+
+def test_coalesced_reading_gives_up_its_turn():
+    async def scenario():
+        turns = UpdateTurns()
+        serializer = KeyedSerializer("coalesce")
+        events = []
+
+        async def reading_flow():
+            events.append("reserved")
+            yield_turn()
+            await asyncio.sleep(0.01)
+            events.append("reading sent")
+            return "reading"
+
+        async def ask():
+            return await serializer.run(1, reading_flow, tag="love")
+
+        async def edit():
+            events.append("profile edited")
+
+        # The duplicate shares the first reading; the edit behind it doesn't wait for the reading
+        return await asyncio.gather(turns.run(1, ask), turns.run(1, ask), turns.run(1, edit)), events
+
+    results, events = asyncio.run(scenario())
+    assert results[:2] == ["reading", "reading"]
+    assert events == ["reserved", "profile edited", "reading sent"]
@@ -0,0 +1,84 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import pytest
+
+from webapp_auth import InitDataError, sign_init_data, verify_init_data
+
+BOT_TOKEN = "123456:test-token"
+NOW = 1_700_000_000
+
+
+def init_data(user_id=42, auth_date=NOW, token=BOT_TOKEN, **overrides):
+    fields = {"auth_date": str(auth_date), "query_id": "AAE", "user": json.dumps({"id": user_id, "first_name": "Анна"})}
+    fields["hash"] = sign_init_data(fields, token)
+    fields.update(overrides)
+    return urlencode(fields)
+
+
+def test_valid_init_data_returns_user():
+    assert verify_init_data(init_data(), BOT_TOKEN, now=NOW + 60)["id"] == 42
+
+
+@pytest.mark.parametrize("data", [
+    "",
+    init_data(token="654321:other-bot"),
+    # Signed for user 42, claims to be user 7
+    init_data(user=json.dumps({"id": 7})),
+    "auth_date=1&user=%7B%22id%22%3A7%7D",
+])
+def test_forged_init_data_is_refused(data):
+    with pytest.raises(InitDataError):
+        verify_init_data(data, BOT_TOKEN, now=NOW)
+
+
+def test_expired_init_data_is_refused():
+    with pytest.raises(InitDataError):
+        verify_init_data(init_data(), BOT_TOKEN, max_age=3600, now=NOW + 3601)
+
+
+def test_stream_endpoint_requires_init_data():
+    from fastapi.testclient import TestClient
+
+    import server
+
+    # No context manager: startup would try to reach Mongo and Telegram
+    client = TestClient(server.app)
+    response = client.get("/api/readings/stream", params={"telegram_id": 42})
+    assert response.status_code == 401
+    response = client.get("/api/readings/stream", headers={"X-Telegram-Init-Data": init_data(token="654321:other-bot")})
+    assert response.status_code == 401
+
+
+def test_stream_is_rate_limited_per_signed_user(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+    from rate_limit import RateLimiter
+
+    subscriber = {"telegram_id": 2, "subscription_active": True, "subscription_end": datetime.now(timezone.utc) + timedelta(days=1)}
+
+    async def get_user_doc(telegram_id):
+        return subscriber if telegram_id == 2 else {"telegram_id": telegram_id}
+
+    async def reserve_reading(telegram_id):
+        return None, False
+
+    monkeypatch.setattr(server, "BOT_TOKEN", BOT_TOKEN)
+    monkeypatch.setattr(server, "get_user_doc", get_user_doc)
+    monkeypatch.setattr(server, "reserve_reading", reserve_reading)
+    monkeypatch.setattr(server, "rate_limiter", RateLimiter(tiers={"free": (0.001, 1), "premium": (0.001, 3)}))
+
+    # Every request comes from the same client address
+    client = TestClient(server.app)
+
+    def status(user_id):
+        data = init_data(user_id=user_id, auth_date=int(time.time()))
+        return client.get("/api/readings/stream", headers={"X-Telegram-Init-Data": data}).status_code
+
+    # 402: let through the limiter, then refused for having no readings left
+    assert [status(1), status(1)] == [402, 429]
+    assert status(3) == 402
+    assert [status(2) for _ in range(4)] == [402, 402, 402, 429]